@@ -0,0 +1,108 @@
+"""Архивация старых заказов: размер горячей базы и время чтения заказов до и после.
+
+Заказы профиля распределены по последнему году; --lines дописывает синтетическую историю
+(как benchmarks.recommendations) и растягивает ее на --years лет. Архивация переносит
+заказы старше --days дней в файл архива и возвращает освободившееся место системе
+(копия базы предварительно переводится в режим auto_vacuum = INCREMENTAL).
+
+Запуск из корня проекта:
+    python -m benchmarks.archive --preset medium --lines 1000000 --years 5
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.generate import HEAVY_USER_PHONE, PRESETS, ensure_database, working_copy
+from benchmarks.recommendations import add_orders
+from models.database import ARCHIVE_AFTER_DAYS, ORDERED_STATUS, Database
+
+
+def timed(call, repeat):
+    """Медиана времени вызова, мс"""
+    elapsed = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        elapsed.append((time.perf_counter() - started) * 1000)
+    return statistics.median(elapsed)
+
+
+def file_size(db, path):
+    """Размер файла базы в МБ после переноса журнала WAL в основной файл"""
+    db.conn.execute("PRAGMA main.wal_checkpoint(TRUNCATE)")
+    return os.path.getsize(path) / 2 ** 20
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Архивация старых заказов")
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--db', help="своя база вместо профиля (используется ее копия)")
+    parser.add_argument('--lines', type=int, default=0, help="дописать синтетических позиций заказов")
+    parser.add_argument('--years', type=int, default=3, help="на сколько лет растянуть дописанные заказы")
+    parser.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS, help="архивировать заказы старше, дней")
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    source = args.db or ensure_database(args.preset)
+    directory = tempfile.mkdtemp(prefix='eshop-archive-')
+    try:
+        db_path = working_copy(source, directory)
+        # Копия базы, созданной прежней версией кода, доводится до текущей схемы
+        db = Database(db_path)
+        if args.lines:
+            first_new = (db.get_order_id_range()[1] or 0) + 1
+            written = add_orders(db, args.lines, 4)
+            with db.transaction() as cursor:
+                cursor.execute("UPDATE orders SET status = ?, "
+                               "created_at = datetime('now', '-' || (id * 7919 % ?) || ' days') WHERE id >= ?",
+                               (ORDERED_STATUS, 365 * args.years, first_new))
+            print(f"Дописано позиций: {written}")
+        while db.backfill_sales_summary():
+            pass
+
+        started = time.perf_counter()
+        if db.enable_incremental_vacuum():
+            print(f"Перестройка базы (VACUUM): {time.perf_counter() - started:.1f} с")
+
+        user_id = db.get_user(HEAVY_USER_PHONE).id
+        hot_before = file_size(db, db_path)
+        orders_before = len(db.get_orders(user_id))
+        list_before = timed(lambda: db.get_orders(user_id), args.repeat)
+
+        started = time.perf_counter()
+        moved = db.archive_orders(args.days)
+        elapsed = time.perf_counter() - started
+        print(f"Перенесено заказов: {moved} за {elapsed:.1f} с")
+
+        hot_after = file_size(db, db_path)
+        orders_after = len(db.get_orders(user_id))
+        list_after = timed(lambda: db.get_orders(user_id), args.repeat)
+        archived = db.get_orders(user_id, archived=True)
+        list_archived = timed(lambda: db.get_orders(user_id, archived=True), args.repeat)
+        print(f"Горячая база: {hot_before:.1f} МБ -> {hot_after:.1f} МБ, архив: "
+              f"{os.path.getsize(db.archive_path) / 2 ** 20:.1f} МБ")
+        print(f"Заказы покупателя: {orders_before} -> {orders_after} в горячей базе ({len(archived)} в архиве)")
+        print(f"get_orders: {list_before:.2f} мс -> {list_after:.2f} мс, архив по требованию: {list_archived:.2f} мс")
+
+        if archived:
+            # Заказ из архива с нового соединения: первый запрос подключает архив
+            order_id = archived[-1].id
+            fresh = Database(db_path, setup=False)
+            started = time.perf_counter()
+            fresh.get_order(order_id)
+            first_ms = (time.perf_counter() - started) * 1000
+            print(f"get_order из архива: первый {first_ms:.2f} мс, далее "
+                  f"{timed(lambda: fresh.get_order(order_id), args.repeat):.3f} мс")
+            fresh.conn.close()
+        db.conn.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""Корзина в памяти (CartBuffer) против записи в базу на каждый клик.
+
+Сравнивается время одного клика "Добавить в корзину": прежний путь - транзакция
+Database.add_to_cart на каждый клик, новый - изменение строки в памяти и журнала; для
+нового пути отдельно меряется запись накопленного пакета. --verify проверяет журнал:
+дочерний процесс добавляет товары и падает до записи пакета, после чего новая корзина
+того же пользователя должна восстановить их из журнала. Затем дочерний процесс оформляет
+заказ, добавляет еще один товар и падает сразу после записи заказа, до очистки журнала:
+восстановленная корзина должна содержать только этот товар.
+
+Запуск из корня проекта:
+    python -m benchmarks.cart --preset small --clicks 200 --verify
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt6.QtCore import QCoreApplication
+
+from benchmarks.generate import HEAVY_USER_PHONE, PRESETS, ensure_database, working_copy
+from models.async_database import AsyncDatabase
+from models.cart_buffer import CartBuffer
+from models.database import Database
+
+
+def wait_for(app, condition, timeout=30.0):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        app.processEvents()
+        if time.perf_counter() > deadline:
+            raise TimeoutError("Корзина не ответила за отведенное время")
+        time.sleep(0.0005)
+
+
+def pick_products(db, clicks, distinct, seed=42):
+    """Товары без ограничения остатка для clicks кликов по distinct разным товарам"""
+    cursor = db.conn.cursor()
+    cursor.execute("SELECT id FROM products WHERE stock IS NULL ORDER BY id LIMIT ?", (distinct,))
+    product_ids = [row[0] for row in cursor.fetchall()]
+    rng = random.Random(seed)
+    return [db.get_product(rng.choice(product_ids)) for _ in range(clicks)]
+
+
+def open_cart(app, db_path, user_id):
+    async_db = AsyncDatabase(db_path)
+    cart = CartBuffer(async_db, db_path, user_id, flush_ms=60_000)
+    wait_for(app, lambda: cart.ready)
+    return async_db, cart
+
+
+def crash_process(db_path, user_id, product_ids):
+    """Добавляет товары в корзину и завершается, не дождавшись записи пакета"""
+    app = QCoreApplication([])
+    db = Database(db_path, setup=False)
+    async_db, cart = open_cart(app, db_path, user_id)
+    for product_id in product_ids:
+        cart.add(db.get_product(product_id), 1)
+    os._exit(0)
+
+
+def checkout_crash_process(db_path, user_id, product_ids, extra_id):
+    """Оформляет заказ из товаров, добавляет еще один и завершается, когда заказ записан,
+    но до обработки его результата (очистки журнала)"""
+    app = QCoreApplication([])
+    db = Database(db_path, setup=False)
+    async_db, cart = open_cart(app, db_path, user_id)
+    for product_id in product_ids:
+        cart.add(db.get_product(product_id), 1)
+    cart.checkout()
+    cart.add(db.get_product(extra_id), 1)
+    async_db.wait()
+    os._exit(0)
+
+
+def run_child(target, *args):
+    context = multiprocessing.get_context('spawn')
+    child = context.Process(target=target, args=args)
+    child.start()
+    child.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Корзина в памяти против записи на каждый клик")
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--db', help="своя база вместо профиля (используется ее копия)")
+    parser.add_argument('--clicks', type=int, default=200, help="кликов \"Добавить в корзину\"")
+    parser.add_argument('--distinct', type=int, default=20, help="разных товаров среди кликов")
+    parser.add_argument('--verify', action='store_true', help="проверить восстановление из журнала")
+    args = parser.parse_args(argv)
+
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+    source = args.db or ensure_database(args.preset)
+    directory = tempfile.mkdtemp(prefix='eshop-cart-')
+    failed = False
+    try:
+        db_path = working_copy(source, directory)
+        # Копия базы, созданной прежней версией кода, доводится до текущей схемы
+        db = Database(db_path)
+        user_id = db.get_user(HEAVY_USER_PHONE).id
+        products = pick_products(db, args.clicks, args.distinct)
+
+        with db.transaction() as cursor:
+            cursor.execute("DELETE FROM carts WHERE user_id = ?", (user_id,))
+        clicks = []
+        for product in products:
+            started = time.perf_counter()
+            db.add_to_cart(user_id, product.id, 1)
+            clicks.append((time.perf_counter() - started) * 1000)
+        expected = {line.product_id: line.quantity for line in db.get_cart_items(user_id)}
+        print(f"Запись на каждый клик: медиана {statistics.median(clicks):.3f} мс, "
+              f"всего {sum(clicks):.1f} мс")
+
+        with db.transaction() as cursor:
+            cursor.execute("DELETE FROM carts WHERE user_id = ?", (user_id,))
+        async_db, cart = open_cart(app, db_path, user_id)
+        clicks = []
+        for product in products:
+            started = time.perf_counter()
+            cart.add(product, 1)
+            clicks.append((time.perf_counter() - started) * 1000)
+        started = time.perf_counter()
+        cart.flush()
+        wait_for(app, lambda: not cart.flushing)
+        flush_ms = (time.perf_counter() - started) * 1000
+        print(f"Корзина в памяти: медиана {statistics.median(clicks):.3f} мс, всего {sum(clicks):.1f} мс; "
+              f"пакет из {len(expected)} строк записан за {flush_ms:.1f} мс")
+        saved = {line.product_id: line.quantity for line in db.get_cart_items(user_id)}
+        if saved != expected:
+            print("РАСХОЖДЕНИЕ: корзина в базе после пакета не совпадает с записью на каждый клик")
+            failed = True
+        cart.close()
+        async_db.wait()
+        app.processEvents()
+
+        if args.verify:
+            with db.transaction() as cursor:
+                cursor.execute("DELETE FROM carts WHERE user_id = ?", (user_id,))
+            product_ids = [product.id for product in products[:10]]
+            run_child(crash_process, db_path, user_id, product_ids)
+            unsaved = len(db.get_cart_items(user_id))
+            async_db, cart = open_cart(app, db_path, user_id)
+            recovered = {line.product_id: line.quantity for line in db.get_cart_items(user_id)}
+            wanted = {product_id: product_ids.count(product_id) for product_id in product_ids}
+            in_memory = {product_id: line.quantity for product_id, line in cart.lines.items()}
+            if unsaved == 0 and recovered == wanted and in_memory == wanted:
+                print(f"Восстановлено из журнала строк: {len(recovered)}")
+            else:
+                print("РАСХОЖДЕНИЕ после восстановления из журнала")
+                failed = True
+            cart.close()
+            async_db.wait()
+            app.processEvents()
+
+            orders = len(db.get_orders(user_id))
+            extra_id = next(product.id for product in products if product.id not in wanted)
+            run_child(checkout_crash_process, db_path, user_id, product_ids, extra_id)
+            async_db, cart = open_cart(app, db_path, user_id)
+            recovered = {line.product_id: line.quantity for line in db.get_cart_items(user_id)}
+            in_memory = {product_id: line.quantity for product_id, line in cart.lines.items()}
+            if len(db.get_orders(user_id)) == orders + 1 and recovered == in_memory == {extra_id: 1}:
+                print("После падения сразу за заказом оформленные строки в корзину не вернулись")
+            else:
+                print(f"РАСХОЖДЕНИЕ после падения сразу за заказом: в корзине {recovered}")
+                failed = True
+            cart.close()
+            async_db.wait()
+            app.processEvents()
+        db.conn.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,230 @@
+"""Конкурентные оформления заказов на один товар с ограниченным остатком.
+
+Сотни покупателей (процессы по несколько потоков, у каждого потока свое соединение)
+одновременно кладут в корзину популярный товар и оформляют заказ; часть покупателей
+бросает корзину, оставляя резерв. Спрос больше остатка, поэтому в итоге каждая единица
+должна оказаться ровно в одном месте: в заказе или в резерве брошенной корзины.
+
+Проверяется, что товар не продан сверх остатка, списания совпадают с позициями заказов,
+подтвержденные заказы и резервы не потеряны, оформление после успешного резерва не
+отказывает, а снятие истекших резервов возвращает остаток в продажу.
+
+Запуск из корня проекта:
+    python -m benchmarks.contention --processes 8 --threads 32 --stock 300
+"""
+import argparse
+import multiprocessing
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from collections import Counter
+
+from benchmarks.generate import PRESETS, ensure_database, working_copy
+from models.database import RESERVATION_TTL, Database, OutOfStockError
+
+STARTUP_GRACE = 3.0
+RESULT_TIMEOUT = 300.0
+
+
+def buyer(db_path, user_id, product_id, rounds, abandon, busy_timeout_ms, seed, report, lock):
+    """Один покупатель: rounds раз кладет товар в корзину и оформляет заказ или бросает корзину"""
+    rng = random.Random(seed)
+    local = {'orders': [], 'held': 0, 'rejected': 0, 'latencies_ms': [], 'errors': Counter(), 'retried': 0}
+    db = Database(db_path, setup=False, busy_timeout_ms=busy_timeout_ms)
+    for _ in range(rounds):
+        quantity = rng.randint(1, 2)
+        started = time.perf_counter()
+        try:
+            db.add_to_cart(user_id, product_id, quantity)
+        except OutOfStockError:
+            local['rejected'] += 1
+            continue
+        except Exception as error:
+            local['errors'][f"add_to_cart: {error}"] += 1
+            continue
+        if rng.random() < abandon:
+            # Брошенная корзина держит резерв до истечения срока; больше этот покупатель не придет
+            local['held'] += quantity
+            break
+        try:
+            order_id = db.checkout(user_id)
+        except Exception as error:
+            local['errors'][f"checkout: {error}"] += 1
+            continue
+        local['orders'].append((order_id, quantity))
+        local['latencies_ms'].append((time.perf_counter() - started) * 1000)
+    local['retried'] = db.connections.retried
+    db.conn.close()
+
+    with lock:
+        report['orders'].extend(local['orders'])
+        report['held'] += local['held']
+        report['rejected'] += local['rejected']
+        report['latencies_ms'].extend(local['latencies_ms'])
+        report['errors'].update(local['errors'])
+        report['retried'] += local['retried']
+
+
+def worker(db_path, user_ids, product_id, rounds, abandon, busy_timeout_ms, seed, start_at, results):
+    """Процесс с потоком на каждого покупателя"""
+    report = {'orders': [], 'held': 0, 'rejected': 0, 'latencies_ms': [], 'errors': Counter(), 'retried': 0,
+              'failure': None}
+    lock = threading.Lock()
+    try:
+        threads = [
+            threading.Thread(target=buyer, args=(db_path, user_id, product_id, rounds, abandon, busy_timeout_ms,
+                                                 seed + i, report, lock))
+            for i, user_id in enumerate(user_ids)
+        ]
+        time.sleep(max(0.0, start_at - time.time()))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    except Exception:
+        report['failure'] = traceback.format_exc()
+    report['errors'] = dict(report['errors'])
+    results.put(report)
+
+
+def verify(db, product_id, stock, orders, held, rejected):
+    """Сверяет итог с базой; возвращает список нарушений"""
+    problems = []
+    cursor = db.conn.cursor()
+    cursor.execute("SELECT stock FROM products WHERE id = ?", (product_id,))
+    final_stock = cursor.fetchone()[0]
+    cursor.execute("SELECT COUNT(*), COALESCE(SUM(quantity), 0) FROM order_items WHERE product_id = ?",
+                   (product_id,))
+    order_count, sold = cursor.fetchone()
+    cursor.execute("SELECT COALESCE(SUM(quantity), 0) FROM reservations WHERE product_id = ?", (product_id,))
+    reserved = cursor.fetchone()[0]
+    acknowledged = sum(quantity for _, quantity in orders)
+
+    if final_stock < 0 or sold > stock:
+        problems.append(f"продано сверх остатка: продано {sold} из {stock}")
+    if stock - final_stock != sold:
+        problems.append(f"списано {stock - final_stock}, а в заказах {sold}")
+    if order_count != len(orders) or sold != acknowledged:
+        problems.append(f"в базе {order_count} заказов на {sold} шт., подтверждено {len(orders)} на {acknowledged} шт.")
+    if reserved != held:
+        problems.append(f"в резерве {reserved} шт., брошенные корзины держат {held} шт.")
+    if rejected and sold + reserved != stock:
+        problems.append(f"спрос больше остатка, но продано {sold} и зарезервировано {reserved} из {stock}")
+
+    # Через срок резерва брошенные корзины отпускают товар
+    db.release_expired_reservations(now=time.time() + RESERVATION_TTL + 1)
+    available = db.get_product(product_id).available
+    if available != final_stock:
+        problems.append(f"после снятия резервов доступно {available}, на складе {final_stock}")
+    return problems
+
+
+def run(db_path, processes, threads, rounds, stock, abandon, busy_timeout_ms, seed=42):
+    # Копия базы, созданной прежней версией кода, доводится до текущей схемы
+    db = Database(db_path)
+    cursor = db.conn.cursor()
+    cursor.execute("SELECT MIN(id) FROM categories")
+    product_id = db.add_product(f"Популярный товар {seed}", 990, "Товар для проверки конкуренции", None,
+                                cursor.fetchone()[0], stock=stock)
+    user_ids = [db.add_user(f"Конкурент {i + 1}", f"+7-contention-{seed}-{i + 1}", 'password', 'Покупатель')
+                for i in range(processes * threads)]
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    start_at = time.time() + STARTUP_GRACE
+    children = [
+        context.Process(target=worker, args=(db_path, user_ids[i * threads:(i + 1) * threads], product_id, rounds,
+                                             abandon, busy_timeout_ms, seed + i * threads, start_at, results))
+        for i in range(processes)
+    ]
+    for child in children:
+        child.start()
+    reports = [results.get(timeout=RESULT_TIMEOUT) for _ in children]
+    finished = time.time()
+    for child in children:
+        child.join()
+
+    orders = []
+    latencies = []
+    errors = Counter()
+    problems = []
+    held = rejected = retried = 0
+    for report in reports:
+        if report['failure']:
+            problems.append(f"процесс упал:\n{report['failure']}")
+        orders.extend(report['orders'])
+        latencies.extend(report['latencies_ms'])
+        errors.update(report['errors'])
+        held += report['held']
+        rejected += report['rejected']
+        retried += report['retried']
+    problems.extend(verify(db, product_id, stock, orders, held, rejected))
+    db.conn.close()
+
+    elapsed = max(finished - start_at, 1e-9)
+    latencies.sort()
+    return {
+        'buyers': len(user_ids),
+        'orders': len(orders),
+        'sold': sum(quantity for _, quantity in orders),
+        'held': held,
+        'rejected': rejected,
+        'elapsed_s': elapsed,
+        'checkouts_per_s': len(orders) / elapsed,
+        'p50_ms': statistics.median(latencies) if latencies else 0.0,
+        'p99_ms': latencies[int(len(latencies) * 0.99)] if latencies else 0.0,
+        'retried': retried,
+        'errors': dict(errors),
+        'problems': problems,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Конкурентные оформления заказов на один товар")
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--db', help="своя база вместо профиля (используется ее копия)")
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--threads', type=int, default=32, help="покупателей в каждом процессе")
+    parser.add_argument('--rounds', type=int, default=3, help="попыток купить у каждого покупателя")
+    parser.add_argument('--stock', type=int, default=300, help="остаток популярного товара")
+    parser.add_argument('--abandon', type=float, default=0.1, help="доля брошенных корзин")
+    parser.add_argument('--busy-timeout', type=int, help="busy_timeout соединений, мс")
+    parser.add_argument('--target', type=float, default=0.0, help="минимум оформленных заказов в секунду")
+    args = parser.parse_args(argv)
+
+    source = args.db or ensure_database(args.preset)
+    directory = tempfile.mkdtemp(prefix='eshop-contention-')
+    try:
+        summary = run(working_copy(source, directory), args.processes, args.threads, args.rounds, args.stock,
+                      args.abandon, args.busy_timeout)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"Покупателей: {summary['buyers']}, остаток: {args.stock} шт.")
+    print(f"Заказов: {summary['orders']} на {summary['sold']} шт., в брошенных корзинах {summary['held']} шт., "
+          f"отказов из-за остатка: {summary['rejected']}")
+    print(f"Покупки: {summary['checkouts_per_s']:.0f} заказов/с, "
+          f"резерв и оформление: медиана {summary['p50_ms']:.2f} мс, p99 {summary['p99_ms']:.2f} мс; "
+          f"повторов из-за занятой базы: {summary['retried']}")
+
+    failed = False
+    for error, count in sorted(summary['errors'].items()):
+        print(f"ОШИБКА x{count}: {error}")
+        failed = True
+    for problem in summary['problems']:
+        print(f"НАРУШЕНИЕ: {problem}")
+        failed = True
+    if summary['checkouts_per_s'] < args.target:
+        print(f"Пропускная способность ниже цели {args.target:.0f} заказов/с")
+        failed = True
+    print("Перепродаж и потерянных записей нет" if not failed else "Проверка не пройдена")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""Первая страница каталога и число товаров по подкатегориям при разных фильтрах.
+
+Для корня каталога, раздела верхнего уровня, раздела середины дерева и листовой категории
+перебираются все порядки сортировки с фильтрами: без фильтра, только бесплатные, диапазон
+цен; для каждого сочетания меряется время первой страницы (медиана повторов) и план
+запроса, отдельно - время подсчета товаров по подкатегориям. Сочетания медленнее цели
+перечисляются в конце, и команда завершается с кодом 1.
+
+Запуск из корня проекта:
+    python -m benchmarks.filters --preset large --target 20
+"""
+import argparse
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.generate import PRESETS, ensure_database, working_copy
+from models.database import Database
+from views.catalog_view import LIST_COLUMNS, PAGE_SIZE, SORT_ORDERS
+
+PRICE_FILTERS = [
+    ("без фильтра", None, None),
+    ("бесплатные", 0, 0),
+    ("1000-5000", 1000, 5000),
+    ("от 45000", 45000, None),
+]
+
+
+def timed(call, repeat):
+    elapsed = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        elapsed.append((time.perf_counter() - started) * 1000)
+    return statistics.median(elapsed)
+
+
+def sample_categories(tree):
+    """Корень, раздел верхнего уровня, раздел середины дерева и лист: [(подпись, id)]"""
+    walk = tree.walk()
+    if not walk:
+        return [("корень", None)]
+    depth = max(item[2] for item in walk)
+    middle = next(cat_id for cat_id, _, level in walk if level == depth // 2)
+    leaf = next(cat_id for cat_id, _, level in walk if level == depth)
+    return [("корень", None), ("раздел", walk[0][0]), ("середина", middle), ("лист", leaf)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Фильтры каталога: первая страница и подсчет по подкатегориям")
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--db', help="своя база вместо профиля (используется ее копия)")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--target', type=float, default=0.0, help="предел времени первой страницы, мс")
+    args = parser.parse_args(argv)
+
+    source = args.db or ensure_database(args.preset)
+    directory = tempfile.mkdtemp(prefix='eshop-filters-')
+    slow = []
+    try:
+        # Копия базы, созданной прежней версией кода, доводится до текущей схемы
+        db = Database(working_copy(source, directory))
+        tree = db.get_category_tree()
+        print(f"{'категория':<10} {'порядок':<16} {'цена':<12} {'страница, мс':>13} {'подкатегории, мс':>17}")
+        for category_title, category_id in sample_categories(tree):
+            for price_title, min_price, max_price in PRICE_FILTERS:
+                facets_ms = timed(lambda: db.get_category_facets(category_id, min_price, max_price), args.repeat)
+                for sort_title, sort, descending in SORT_ORDERS:
+                    page_ms = timed(lambda: db.get_products_page(
+                        category_id, sort, descending, limit=PAGE_SIZE, subtree=True, columns=LIST_COLUMNS,
+                        min_price=min_price, max_price=max_price), args.repeat)
+                    print(f"{category_title:<10} {sort_title:<16} {price_title:<12} {page_ms:13.2f} {facets_ms:17.2f}")
+                    if args.target and page_ms > args.target:
+                        slow.append((category_title, sort_title, price_title, page_ms))
+        db.conn.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    for category_title, sort_title, price_title, page_ms in slow:
+        print(f"МЕДЛЕННО: {category_title}, {sort_title}, {price_title}: {page_ms:.2f} мс")
+    return 1 if slow else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""Генерация синтетических баз данных для бенчмарков.
+
+Все данные создаются через models.database.Database, поэтому база получает ту же схему,
+индексы и триггеры, что и рабочая.
+
+Запуск: python -m benchmarks.generate medium [--path benchmarks/data/medium.db]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+
+from models.database import Database
+
+# Профили данных: число товаров, форма дерева категорий, пользователи и их история заказов
+PRESETS = {
+    'small': {'products': 1_000, 'depth': 3, 'fanout': 3, 'users': 10, 'orders_per_user': 20, 'items_per_order': 3},
+    'medium': {'products': 100_000, 'depth': 4, 'fanout': 4, 'users': 50, 'orders_per_user': 100,
+               'items_per_order': 4},
+    'large': {'products': 1_000_000, 'depth': 6, 'fanout': 3, 'users': 100, 'orders_per_user': 500,
+              'items_per_order': 5},
+}
+
+# Телефон пользователя с самой длинной историей заказов - от его имени идут замеры
+HEAVY_USER_PHONE = '+70000000001'
+# Телефон продавца всех товаров - от его имени замеряется экран аналитики
+SELLER_PHONE = '+70000000000'
+BATCH_SIZE = 10_000
+
+
+def default_path(preset):
+    return os.path.join('benchmarks', 'data', f"{preset}.db")
+
+
+def generate_categories(db, depth, fanout):
+    """Строит дерево глубины depth, где у каждой категории fanout подкатегорий; возвращает листья"""
+    level = [db.add_category(f"Раздел {i + 1}") for i in range(fanout)]
+    for d in range(1, depth):
+        next_level = []
+        for parent_id in level:
+            for i in range(fanout):
+                next_level.append(db.add_category(f"Раздел {parent_id}.{d}.{i + 1}", parent_id))
+        level = next_level
+    return level
+
+
+def generate_products(db, count, category_ids, rng, seller_id=None):
+    words = ['Стильный', 'Удобный', 'Классический', 'Новый', 'Детский', 'Большой', 'Компактный', 'Яркий']
+    kinds = ['стул', 'роман', 'свитер', 'чайник', 'пазл', 'фонарь', 'рюкзак', 'плед']
+    batch = []
+    for i in range(count):
+        name = f"{rng.choice(words)} {rng.choice(kinds)} №{i + 1}"
+        price = 0 if rng.random() < 0.05 else round(rng.uniform(50, 50_000), 2)
+        description = f"{rng.choice(words)} товар для дома, артикул {i + 1}"
+        batch.append((name, price, description, rng.choice(category_ids)))
+        if len(batch) == BATCH_SIZE:
+            db.upsert_products(batch, seller_id)
+            batch = []
+    if batch:
+        db.upsert_products(batch, seller_id)
+
+
+def generate_orders(db, users, orders_per_user, items_per_order, product_count, rng):
+    """Создает пользователей и историю заказов; у первого пользователя заказов в 5 раз больше"""
+    cursor = db.conn.cursor()
+    cursor.execute("SELECT MIN(id), MAX(id) FROM products")
+    first_id, last_id = cursor.fetchone()
+
+    for u in range(users):
+        phone = HEAVY_USER_PHONE if u == 0 else f"+7{u + 1:010d}"
+        user_id = db.add_user(f"Покупатель {u + 1}", phone, 'password', 'Покупатель')
+        orders = orders_per_user * (5 if u == 0 else 1)
+        for _ in range(orders):
+            for _ in range(items_per_order):
+                db.add_to_cart(user_id, rng.randint(first_id, last_id), rng.randint(1, 3))
+            db.checkout(user_id)
+        # Оставляем непустую корзину для замеров экрана корзины
+        for _ in range(items_per_order * 3):
+            db.add_to_cart(user_id, rng.randint(first_id, last_id), 1)
+
+    # История растягивается на год назад, чтобы в аналитике продаж были разные дни;
+    # сводки продаж пересчитываются по новым датам
+    with db.transaction() as cursor:
+        cursor.execute("UPDATE orders SET created_at = datetime('now', '-' || (id * 7919 % 365) || ' days')")
+    db.rebuild_sales_summary()
+    while db.backfill_sales_summary():
+        pass
+
+
+def generate_database(path, products, depth, fanout, users, orders_per_user, items_per_order, seed=42):
+    """Создает базу с нуля; существующий файл удаляется"""
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    rng = random.Random(seed)
+    db = Database(path)
+    leaves = generate_categories(db, depth, fanout)
+    seller_id = db.add_user("Продавец", SELLER_PHONE, 'password', 'Продавец')
+    generate_products(db, products, leaves, rng, seller_id)
+    generate_orders(db, users, orders_per_user, items_per_order, products, rng)
+    db.conn.execute("ANALYZE")
+    db.conn.commit()
+    return db
+
+
+def ensure_database(preset, path=None):
+    """Возвращает путь к базе профиля, создавая ее при первом запуске"""
+    path = path or default_path(preset)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        started = time.perf_counter()
+        db = generate_database(path, **PRESETS[preset])
+        db.conn.close()
+        print(f"База {path} создана за {time.perf_counter() - started:.1f} с", file=sys.stderr)
+    return path
+
+
+def working_copy(db_path, directory):
+    """Копия базы для одного запуска: сценарии пишут в базу, а исходная должна остаться прежней"""
+    path = os.path.join(directory, os.path.basename(db_path))
+    source = sqlite3.connect(db_path)
+    target = sqlite3.connect(path)
+    with target:
+        source.backup(target)
+    source.close()
+    target.close()
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Генерация синтетической базы для бенчмарков")
+    parser.add_argument('preset', choices=sorted(PRESETS))
+    parser.add_argument('--path', help="путь к создаваемой базе")
+    args = parser.parse_args(argv)
+
+    path = args.path or default_path(args.preset)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    started = time.perf_counter()
+    generate_database(path, **PRESETS[args.preset]).conn.close()
+    print(f"База {path} создана за {time.perf_counter() - started:.1f} с")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
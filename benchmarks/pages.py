@@ -0,0 +1,107 @@
+"""Листание каталога вглубь: страница N против первой страницы.
+
+Для каждого порядка сортировки (по всему каталогу и по разделу верхнего уровня) курсор
+ставится на 1%, 50% и 99% выборки и в конец самой большой группы товаров с одинаковой
+ценой (бесплатные); время страницы с этим курсором (медиана повторов) сравнивается со
+временем первой страницы. Курсоры вычисляются заранее и в замер не входят. Страницы,
+которые дороже первой больше чем в --ratio раз, перечисляются в конце, и команда
+завершается с кодом 1.
+
+Запуск из корня проекта:
+    python -m benchmarks.pages --preset large --ratio 3
+"""
+import argparse
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.generate import PRESETS, ensure_database, working_copy
+from models.database import Database
+from views.catalog_view import LIST_COLUMNS, PAGE_SIZE, SORT_ORDERS
+
+DEPTHS = (0.01, 0.5, 0.99)
+# Разница с первой страницей, которая считается шумом, мс
+MIN_DELTA_MS = 0.2
+
+
+def timed(call, repeat):
+    elapsed = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        elapsed.append((time.perf_counter() - started) * 1000)
+    return statistics.median(elapsed)
+
+
+def cursors(db, category_id, sort, descending):
+    """Курсоры страниц на глубине DEPTHS выборки и в конце группы бесплатных: [(подпись, курсор)]"""
+    cursor = db.conn.cursor()
+    where, params = "", []
+    if category_id is not None:
+        ids = sorted(db.get_category_tree().subtree_ids(category_id)) or [category_id]
+        where, params = f" WHERE category_id IN ({', '.join('?' * len(ids))})", ids
+    cursor.execute(f"SELECT COUNT(*) FROM products{where}", params)
+    total = cursor.fetchone()[0]
+    order = 'DESC' if descending else 'ASC'
+    result = []
+    for depth in DEPTHS:
+        cursor.execute(f"SELECT {sort}, id FROM products{where} ORDER BY {sort} {order}, id {order} LIMIT 1 OFFSET ?",
+                       params + [int(total * depth)])
+        row = cursor.fetchone()
+        if row is not None:
+            result.append((f"{depth:.0%}", row))
+    if sort == 'price':
+        # Курсор в дальнем конце группы бесплатных: перед ним в порядке листания все ее строки
+        cursor.execute(f"SELECT MIN(id), MAX(id) FROM products{where}{' AND' if where else ' WHERE'} price = 0",
+                       params)
+        first_free, last_free = cursor.fetchone()
+        if last_free is not None:
+            result.append(("бесплатные", (0, first_free + 1 if descending else last_free - 1)))
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Листание каталога вглубь: страница N против первой")
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--db', help="своя база вместо профиля (используется ее копия)")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--ratio', type=float, default=3.0, help="во сколько раз страница может быть дороже первой")
+    args = parser.parse_args(argv)
+
+    source = args.db or ensure_database(args.preset)
+    directory = tempfile.mkdtemp(prefix='eshop-pages-')
+    slow = []
+    try:
+        # Копия базы, созданной прежней версией кода, доводится до текущей схемы
+        db = Database(working_copy(source, directory))
+        tree = db.get_category_tree()
+        sections = [("корень", None)]
+        if tree.walk():
+            sections.append(("раздел", tree.walk()[0][0]))
+        print(f"{'категория':<10} {'порядок':<16} {'курсор':<12} {'первая, мс':>11} {'страница, мс':>13}")
+        for category_title, category_id in sections:
+            for sort_title, sort, descending in SORT_ORDERS:
+                def page(cursor=None):
+                    return db.get_products_page(category_id, sort, descending, cursor, PAGE_SIZE,
+                                                subtree=True, columns=LIST_COLUMNS)
+
+                first_ms = timed(page, args.repeat)
+                for cursor_title, cursor in cursors(db, category_id, sort, descending):
+                    page_ms = timed(lambda: page(cursor), args.repeat)
+                    print(f"{category_title:<10} {sort_title:<16} {cursor_title:<12} {first_ms:11.3f} {page_ms:13.3f}")
+                    if page_ms > first_ms * args.ratio and page_ms - first_ms > MIN_DELTA_MS:
+                        slow.append((category_title, sort_title, cursor_title, first_ms, page_ms))
+        db.conn.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    for category_title, sort_title, cursor_title, first_ms, page_ms in slow:
+        print(f"МЕДЛЕННО: {category_title}, {sort_title}, курсор {cursor_title}: {page_ms:.3f} мс "
+              f"при первой странице {first_ms:.3f} мс")
+    return 1 if slow else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""Подбор стоимости scrypt под время входа на этой машине и вход без замирания окна.
+
+Для N = 2^12, 2^13, ... (r и p заданы) меряется медиана времени проверки пароля, пока
+она не превысит цель вдвое; выбирается наибольшее N, укладывающееся в --target мс, и
+печатается значение ESHOP_SCRYPT_COST. Затем с этой стоимостью выполняется вход
+через AuthController на копии базы: пароль пользователя сначала хранится открытым
+текстом (как в базах прежних версий), и проверяется, что при входе он заменен хэшем,
+а цикл событий GUI за время проверки не замирал дольше --stall мс.
+
+Запуск из корня проекта:
+    python -m benchmarks.passwords --target 100
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt6.QtCore import QCoreApplication, QTimer
+
+from benchmarks.generate import HEAVY_USER_PHONE, PRESETS, ensure_database, working_copy
+from controllers.auth_controller import AuthController
+from models.async_database import AsyncDatabase
+from models.database import Database
+from utils.passwords import SCRYPT_COST_ENV, MAX_MEMORY, hash_password, is_hashed, memory_needed, verify_password
+
+PASSWORD = 'benchmark-password'
+
+
+def verify_ms(cost, repeat):
+    stored = hash_password(PASSWORD, cost)
+    elapsed = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        verify_password(PASSWORD, stored)
+        elapsed.append((time.perf_counter() - started) * 1000)
+    return statistics.median(elapsed)
+
+
+def pick_cost(target_ms, r, p, repeat):
+    """Наибольшая стоимость (N, r, p) с проверкой не дольше target_ms"""
+    chosen = None
+    n = 2 ** 12
+    while memory_needed(n, r, p) <= MAX_MEMORY:
+        elapsed = verify_ms((n, r, p), repeat)
+        print(f"N = 2^{n.bit_length() - 1:<3} {elapsed:8.1f} мс, {memory_needed(n, r, p) / 2 ** 20:6.1f} МБ")
+        if elapsed <= target_ms:
+            chosen = (n, r, p)
+        if elapsed > target_ms * 2:
+            break
+        n *= 2
+    return chosen
+
+
+def login(db_path, phone, password, stall_ms):
+    """Вход через AuthController: (пользователь, мс входа, наибольшая пауза цикла событий, мс)"""
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+    async_db = AsyncDatabase(db_path)
+    auth = AuthController(async_db)
+    result = []
+    gaps = []
+    last = [time.perf_counter()]
+
+    def tick():
+        now = time.perf_counter()
+        gaps.append((now - last[0]) * 1000)
+        last[0] = now
+
+    timer = QTimer()
+    timer.setInterval(int(stall_ms / 4) or 1)
+    timer.timeout.connect(tick)
+    timer.start()
+    started = time.perf_counter()
+    auth.login(phone, password, on_result=result.append, on_error=result.append)
+    while not result:
+        app.processEvents()
+        time.sleep(0.0005)
+    elapsed = (time.perf_counter() - started) * 1000
+    timer.stop()
+    auth.wait()
+    async_db.wait()
+    app.processEvents()
+    return result[0], elapsed, max(gaps, default=0.0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Подбор стоимости scrypt под время входа")
+    parser.add_argument('--target', type=float, default=100.0, help="допустимое время проверки пароля, мс")
+    parser.add_argument('-r', type=int, default=8, help="размер блока scrypt")
+    parser.add_argument('-p', type=int, default=1, help="число проходов scrypt")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--stall', type=float, default=50.0, help="допустимая пауза цикла событий при входе, мс")
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--db', help="своя база вместо профиля (используется ее копия)")
+    args = parser.parse_args(argv)
+
+    cost = pick_cost(args.target, args.r, args.p, args.repeat)
+    if cost is None:
+        print(f"Даже N = 2^12 не укладывается в {args.target:.0f} мс")
+        return 1
+    print(f"{SCRYPT_COST_ENV}={cost[0]},{cost[1]},{cost[2]}")
+    os.environ[SCRYPT_COST_ENV] = f"{cost[0]},{cost[1]},{cost[2]}"
+
+    source = args.db or ensure_database(args.preset)
+    directory = tempfile.mkdtemp(prefix='eshop-passwords-')
+    failed = False
+    try:
+        db_path = working_copy(source, directory)
+        # Копия базы, созданной прежней версией кода, доводится до текущей схемы
+        db = Database(db_path)
+        user_id = db.get_user(HEAVY_USER_PHONE).id
+        with db.transaction() as cursor:
+            cursor.execute("UPDATE users SET password = ? WHERE id = ?", (PASSWORD, user_id))
+        db.clear_cache()
+
+        user, elapsed, stall = login(db_path, HEAVY_USER_PHONE, PASSWORD, args.stall)
+        stored = db.get_user(HEAVY_USER_PHONE).password
+        print(f"Вход с паролем открытым текстом: {elapsed:.1f} мс, пауза цикла событий до {stall:.1f} мс, "
+              f"пароль {'заменен хэшем' if is_hashed(stored) else 'НЕ заменен'}")
+        user_again, elapsed, stall_again = login(db_path, HEAVY_USER_PHONE, PASSWORD, args.stall)
+        print(f"Вход по хэшу: {elapsed:.1f} мс, пауза цикла событий до {stall_again:.1f} мс")
+        wrong, elapsed, _ = login(db_path, HEAVY_USER_PHONE, 'wrong', args.stall)
+        unknown, unknown_ms, _ = login(db_path, '+7-unknown', PASSWORD, args.stall)
+        print(f"Неверный пароль: {elapsed:.1f} мс, неизвестный телефон: {unknown_ms:.1f} мс")
+
+        if getattr(user, 'id', None) != user_id or getattr(user_again, 'id', None) != user_id:
+            print("ОШИБКА: верный пароль не принят")
+            failed = True
+        if wrong is not None or unknown is not None:
+            print("ОШИБКА: принят неверный пароль или телефон")
+            failed = True
+        if not is_hashed(stored) or not verify_password(PASSWORD, stored):
+            print("ОШИБКА: пароль не перехэширован при входе")
+            failed = True
+        if max(stall, stall_again) > args.stall:
+            print(f"ОШИБКА: цикл событий замирал дольше {args.stall:.0f} мс")
+            failed = True
+        db.conn.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""Кэш чтений: повторные просмотры товаров без SQL и сброс после записей.
+
+Просмотры --views карточек из --distinct товаров (часть товаров смотрят чаще, как в
+магазине) выполняются дважды: со сбросом кэша перед каждым просмотром (как без кэша) и
+с кэшем. Для обоих считается время и число выполненных SQL-запросов; затем проверяется,
+что после записи (остаток, профиль, новый товар, заказ) кэш отдает новые данные.
+
+Запуск из корня проекта:
+    python -m benchmarks.read_cache --preset small --views 10000
+"""
+import argparse
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.generate import HEAVY_USER_PHONE, PRESETS, ensure_database, working_copy
+from models.database import Database
+
+
+def pick_views(db, views, distinct, seed=42):
+    cursor = db.conn.cursor()
+    cursor.execute("SELECT id FROM products ORDER BY id LIMIT ?", (distinct,))
+    product_ids = [row[0] for row in cursor.fetchall()]
+    rng = random.Random(seed)
+    # Первые товары списка смотрят намного чаще остальных
+    weights = [1 / (rank + 1) for rank in range(len(product_ids))]
+    return rng.choices(product_ids, weights, k=views)
+
+
+def run_views(db, product_ids, cached):
+    """Просмотр карточки: товар и рекомендации; возвращает (медиана, мс; SQL-запросов)"""
+    statements = []
+    db.conn.set_trace_callback(statements.append)
+    elapsed = []
+    try:
+        for product_id in product_ids:
+            if not cached:
+                db.clear_cache()
+            started = time.perf_counter()
+            db.get_product(product_id)
+            db.get_recommendations(product_id)
+            elapsed.append((time.perf_counter() - started) * 1000)
+    finally:
+        db.conn.set_trace_callback(None)
+    return statistics.median(elapsed), len(statements)
+
+
+def check_invalidation(db, product_id):
+    """Список записей, после которых кэш отдал старые данные"""
+    problems = []
+    db.get_product(product_id)
+    db.set_stock(product_id, 7)
+    if db.get_product(product_id).available != 7:
+        problems.append("остаток после set_stock")
+    db.set_stock(product_id, None)
+
+    user = db.get_user(HEAVY_USER_PHONE)
+    db.update_user(user.id, "Переименован", HEAVY_USER_PHONE)
+    if db.get_user(HEAVY_USER_PHONE).name != "Переименован":
+        problems.append("имя после update_user")
+
+    new_id = db.get_max_product_id() + 1
+    db.get_product(new_id)
+    category_id = db.conn.execute("SELECT MIN(id) FROM categories").fetchone()[0]
+    if db.add_product("Новинка для кэша", 100, "", None, category_id) != new_id or db.get_product(new_id) is None:
+        problems.append("новый товар после add_product")
+
+    db.set_stock(new_id, 5)
+    db.get_product(new_id)
+    db.add_to_cart(user.id, new_id, 2)
+    if db.get_product(new_id).available != 3:
+        problems.append("свободный остаток после add_to_cart")
+    db.checkout(user.id)
+    if db.get_product(new_id).available != 3:
+        problems.append("остаток после checkout")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Кэш чтений товаров и пользователей")
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--db', help="своя база вместо профиля (используется ее копия)")
+    parser.add_argument('--views', type=int, default=10_000, help="просмотров карточек товаров")
+    parser.add_argument('--distinct', type=int, default=500, help="разных товаров среди просмотров")
+    args = parser.parse_args(argv)
+
+    source = args.db or ensure_database(args.preset)
+    directory = tempfile.mkdtemp(prefix='eshop-read-cache-')
+    try:
+        # Копия базы, созданной прежней версией кода, доводится до текущей схемы
+        db = Database(working_copy(source, directory))
+        product_ids = pick_views(db, args.views, args.distinct)
+
+        uncached_ms, uncached_sql = run_views(db, product_ids, cached=False)
+        db.clear_cache()
+        before = db.cache_stats()
+        cached_ms, cached_sql = run_views(db, product_ids, cached=True)
+        stats = db.cache_stats()
+        print(f"Без кэша: {uncached_ms:.3f} мс на просмотр, SQL-запросов {uncached_sql}")
+        print(f"С кэшем:  {cached_ms:.3f} мс на просмотр, SQL-запросов {cached_sql} "
+              f"(разных товаров {len(set(product_ids))})")
+        hits, misses = stats['hits'] - before['hits'], stats['misses'] - before['misses']
+        print(f"Попаданий {hits}, промахов {misses}, доля попаданий {hits / max(hits + misses, 1):.1%}, "
+              f"записей {stats['size']}")
+
+        problems = check_invalidation(db, product_ids[0])
+        for problem in problems:
+            print(f"УСТАРЕЛО: {problem}")
+        db.conn.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""Пересборка рекомендаций "С этим товаром покупают" и чтение их на странице товара.
+
+К истории заказов профиля можно дописать синтетические заказы (--lines), чтобы проверить
+пересборку на миллионах позиций; популярность товаров в них неравномерная, как в жизни.
+Пересборка идет в отдельном процессе, поэтому ее пиковый RSS не смешивается с генерацией.
+--max-pairs уменьшает раздел матрицы в памяти и заставляет пересборку делить ее на разделы;
+--verify сравнивает результат с наивным подсчетом пар на Python.
+
+Запуск из корня проекта:
+    python -m benchmarks.recommendations --preset small --verify
+    python -m benchmarks.recommendations --preset medium --lines 3000000
+"""
+import argparse
+import multiprocessing
+import random
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+from benchmarks.generate import HEAVY_USER_PHONE, PRESETS, ensure_database, working_copy
+from models.database import RECOMMENDATIONS_STORED, Database
+from models.recommendations import MAX_PAIRS_IN_MEMORY, rebuild
+
+ORDERS_PER_TRANSACTION = 10_000
+
+
+def add_orders(db, lines, items_per_order, seed=42):
+    """Дописывает заказы примерно на lines позиций от имени покупателя замеров"""
+    rng = random.Random(seed)
+    cursor = db.conn.cursor()
+    cursor.execute("SELECT MIN(id), MAX(id) FROM products")
+    first_id, last_id = cursor.fetchone()
+    count = last_id - first_id + 1
+    user_id = db.get_user(HEAVY_USER_PHONE).id
+    written = 0
+    while written < lines:
+        with db.transaction() as cursor:
+            for _ in range(ORDERS_PER_TRANSACTION):
+                cursor.execute("INSERT INTO orders (user_id, status, total) VALUES (?, 'new', 0)", (user_id,))
+                order_id = cursor.lastrowid
+                # Номер по закону Парето: немногие товары покупают часто
+                products = {first_id + int(rng.paretovariate(1.1) * 7) % count
+                            for _ in range(rng.randint(1, items_per_order * 2 - 1))}
+                cursor.executemany("INSERT INTO order_items (order_id, product_id, quantity, price, total_price) "
+                                   "VALUES (?, ?, 1, 0, 0)", [(order_id, product_id) for product_id in products])
+                written += len(products)
+                if written >= lines:
+                    break
+    return written
+
+
+def rebuild_process(db_path, max_pairs, results):
+    db = Database(db_path, setup=False)
+    started = time.perf_counter()
+    stats = rebuild(db, max_pairs=max_pairs)
+    stats['elapsed_s'] = time.perf_counter() - started
+    # В Linux ru_maxrss уже в килобайтах
+    stats['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    db.conn.close()
+    results.put(stats)
+
+
+def naive_recommendations(db, limit=RECOMMENDATIONS_STORED):
+    """Те же рекомендации прямым подсчетом пар по заказам"""
+    cursor = db.conn.cursor()
+    cursor.execute("SELECT DISTINCT order_id, product_id FROM order_items ORDER BY order_id")
+    orders = defaultdict(list)
+    for order_id, product_id in cursor.fetchall():
+        orders[order_id].append(product_id)
+    pairs = Counter()
+    for items in orders.values():
+        for a in items:
+            for b in items:
+                if a != b:
+                    pairs[a, b] += 1
+    neighbours = defaultdict(list)
+    for (a, b), score in pairs.items():
+        neighbours[a].append((-score, b))
+    return {(a, b, -score) for a, items in neighbours.items() for score, b in sorted(items)[:limit]}
+
+
+def measure_lookups(db, count, seed=42):
+    """Время чтения рекомендаций для случайных товаров, мс"""
+    rng = random.Random(seed)
+    cursor = db.conn.cursor()
+    cursor.execute("SELECT MIN(id), MAX(id) FROM products")
+    product_range = cursor.fetchone()
+    latencies = []
+    for _ in range(count):
+        product_id = rng.randint(*product_range)
+        # Меряется чтение из базы, а не из кэша чтений
+        db.clear_cache()
+        started = time.perf_counter()
+        db.get_recommendations(product_id)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.99)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пересборка и чтение рекомендаций")
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--db', help="своя база вместо профиля (используется ее копия)")
+    parser.add_argument('--lines', type=int, default=0, help="дописать синтетических позиций заказов")
+    parser.add_argument('--items-per-order', type=int, default=4, help="среднее число товаров в синтетическом заказе")
+    parser.add_argument('--max-pairs', type=int, default=MAX_PAIRS_IN_MEMORY, help="пар в памяти на раздел")
+    parser.add_argument('--lookups', type=int, default=1000, help="чтений рекомендаций для замера")
+    parser.add_argument('--verify', action='store_true', help="сравнить с наивным подсчетом")
+    args = parser.parse_args(argv)
+
+    source = args.db or ensure_database(args.preset)
+    directory = tempfile.mkdtemp(prefix='eshop-recommendations-')
+    failed = False
+    try:
+        db_path = working_copy(source, directory)
+        # Копия базы, созданной прежней версией кода, доводится до текущей схемы
+        db = Database(db_path)
+        if args.lines:
+            started = time.perf_counter()
+            written = add_orders(db, args.lines, args.items_per_order)
+            print(f"Дописано позиций: {written} за {time.perf_counter() - started:.1f} с")
+
+        context = multiprocessing.get_context('spawn')
+        results = context.Queue()
+        child = context.Process(target=rebuild_process, args=(db_path, args.max_pairs, results))
+        child.start()
+        stats = results.get()
+        child.join()
+        print(f"Заказов: {stats['orders']}, позиций: {stats['lines']}, пар: {stats['pairs']}, "
+              f"разделов: {stats['partitions']}, рекомендаций: {stats['rows']}")
+        speed = f"{stats['lines'] / max(stats['elapsed_s'], 1e-9):,.0f}".replace(',', ' ')
+        print(f"Пересборка: {stats['elapsed_s']:.2f} с ({speed} позиций/с), "
+              f"пиковый RSS {stats['peak_rss_kb'] / 1024:.0f} МБ")
+
+        p50, p99 = measure_lookups(db, args.lookups)
+        print(f"Рекомендации товара: медиана {p50:.3f} мс, p99 {p99:.3f} мс")
+
+        if args.verify:
+            cursor = db.conn.cursor()
+            cursor.execute("SELECT product_id, neighbour_id, score FROM product_recommendations")
+            if set(cursor.fetchall()) == naive_recommendations(db):
+                print("Совпадает с наивным подсчетом")
+            else:
+                print("РАСХОЖДЕНИЕ с наивным подсчетом")
+                failed = True
+        db.conn.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""Память и время загрузки строк товаров: кортежи против строк Product.
+
+Загружается одно и то же число товаров тремя способами: кортежами всех столбцов списка
+(как раньше возвращал get_products_page), строками Product тех же столбцов и строками
+Product только со столбцами карточки каталога (LIST_COLUMNS, без описания). Память -
+прирост выделений tracemalloc, пока строки живы, в пересчете на одну строку.
+
+Запуск из корня проекта:
+    python -m benchmarks.rows --preset medium --rows 100000
+"""
+import argparse
+import gc
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.generate import PRESETS, ensure_database, working_copy
+from models.database import Database
+from views.catalog_view import LIST_COLUMNS
+
+
+def load_tuples(db, count):
+    cursor = db.conn.cursor()
+    cursor.execute("SELECT id, name, price, description, image_path FROM products ORDER BY id LIMIT ?", (count,))
+    return cursor.fetchall()
+
+
+def load_products(db, count, columns=None):
+    return db.get_products_page(limit=count, columns=columns)[0]
+
+
+def measure(load, repeat=3):
+    """Возвращает (строк, байт на строку, мс на загрузку)"""
+    elapsed = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = load()
+        elapsed.append((time.perf_counter() - started) * 1000)
+        del rows
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    rows = load()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return len(rows), size / max(len(rows), 1), min(elapsed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Память строк товаров: кортежи и Product")
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--db', help="своя база вместо профиля (используется ее копия)")
+    parser.add_argument('--rows', type=int, default=100_000, help="сколько товаров загружать")
+    args = parser.parse_args(argv)
+
+    source = args.db or ensure_database(args.preset)
+    directory = tempfile.mkdtemp(prefix='eshop-rows-')
+    try:
+        db = Database(working_copy(source, directory))
+        cases = [
+            ("кортежи, все столбцы", lambda: load_tuples(db, args.rows)),
+            ("Product, все столбцы", lambda: load_products(db, args.rows)),
+            ("Product, столбцы каталога", lambda: load_products(db, args.rows, LIST_COLUMNS)),
+        ]
+        baseline = None
+        for title, load in cases:
+            count, per_row, elapsed_ms = measure(load)
+            baseline = baseline or per_row
+            print(f"{title:<28} {count} строк: {per_row:7.1f} байт/строку ({per_row / baseline:.0%}), "
+                  f"загрузка {elapsed_ms:.1f} мс")
+        db.conn.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
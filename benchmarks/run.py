@@ -0,0 +1,329 @@
+"""Безголовые бенчмарки экранов каталога, корзины, заказов и оформления заказа.
+
+Главное окно работает под QT_QPA_PLATFORM=offscreen, поэтому запуск возможен на любой
+Linux-машине без дисплея. Для каждого сценария измеряются время (медиана повторов),
+пиковый RSS процесса и число живых виджетов окна; результаты сравниваются с базовой
+линией в benchmarks/baseline.json. Время до первого окна и до первого экрана каталога
+меряется в отдельных процессах (benchmarks.startup).
+
+Запуск из корня проекта:
+    python -m benchmarks.run --preset small
+    python -m benchmarks.run --preset small --update-baseline
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt6.QtCore import QCoreApplication, QEvent, qInstallMessageHandler
+from PyQt6.QtWidgets import QApplication, QMessageBox, QWidget
+
+import views.main_window
+from benchmarks import startup
+from benchmarks.generate import HEAVY_USER_PHONE, PRESETS, SELLER_PHONE, ensure_database, working_copy
+from benchmarks.startup import qt_message_handler
+from models.database import Database
+from views.main_window import MainWindow
+
+DEFAULT_BASELINE = os.path.join('benchmarks', 'baseline.json')
+# Допустимое замедление относительно базовой линии и порог, ниже которого разница считается шумом
+DEFAULT_TOLERANCE = 0.25
+MIN_WALL_DELTA_MS = 5.0
+RSS_TOLERANCE = 0.15
+SETTLE_TIMEOUT = 120.0
+# Глубина листания каталога для замера keyset-пагинации
+DEEP_PAGE = 200
+PAGE_SIZE = 50
+# Размер окна, заданный в MainWindow.init_ui
+WINDOW_WIDTH = 800
+WINDOW_HEIGHT = 600
+
+
+class SilentMessageBox(QMessageBox):
+    """Модальные окна сообщений блокировали бы сценарий - вместо показа они запоминаются"""
+
+    messages = []
+
+    @staticmethod
+    def information(parent, title, text, *args, **kwargs):
+        SilentMessageBox.messages.append((title, text))
+        return QMessageBox.StandardButton.Ok
+
+    @staticmethod
+    def warning(parent, title, text, *args, **kwargs):
+        SilentMessageBox.messages.append((title, text))
+        return QMessageBox.StandardButton.Ok
+
+
+def current_rss_kb():
+    with open('/proc/self/statm') as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf('SC_PAGE_SIZE') // 1024
+
+
+def peak_rss_kb():
+    # В Linux ru_maxrss уже в килобайтах
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def is_idle(window):
+    async_db = window.async_db
+    return (not async_db.reads and window.placeholder is None
+            and async_db.read_pool.activeThreadCount() == 0
+            and async_db.write_pool.activeThreadCount() == 0)
+
+
+def settle(app, window, timeout=SETTLE_TIMEOUT):
+    """Крутит цикл событий, пока окно не дорисует экран и фоновые запросы не закончатся"""
+    deadline = time.perf_counter() + timeout
+    idle_passes = 0
+    while idle_passes < 3:
+        app.processEvents()
+        QCoreApplication.sendPostedEvents(None, QEvent.Type.DeferredDelete)
+        if is_idle(window):
+            idle_passes += 1
+        else:
+            idle_passes = 0
+            time.sleep(0.0005)
+        if time.perf_counter() > deadline:
+            raise TimeoutError("Экран не загрузился за отведенное время")
+
+
+def widget_count(window):
+    return len(window.findChildren(QWidget))
+
+
+class Bench:
+    def __init__(self, preset, db_path, repeat):
+        self.preset = preset
+        self.repeat = repeat
+        qInstallMessageHandler(qt_message_handler)
+        self.app = QApplication.instance() or QApplication(sys.argv)
+        views.main_window.QMessageBox = SilentMessageBox
+
+        # Копия базы, созданной прежней версией кода, доводится до текущей схемы
+        self.db = Database(db_path)
+        self.user = self.db.get_user(HEAVY_USER_PHONE)
+        # В базах, созданных до появления продавца в генераторе, его нет - замер аналитики пропускается
+        self.seller = self.db.get_user(SELLER_PHONE)
+        self.deep_category = self.find_deep_category()
+
+        started = time.perf_counter()
+        self.window = MainWindow(Database(db_path, setup=False))
+        self.window.set_user(self.user)
+        self.window.show()
+        settle(self.app, self.window)
+        self.startup_ms = (time.perf_counter() - started) * 1000
+
+    def find_deep_category(self):
+        tree = self.db.get_category_tree()
+        deepest = max(tree.walk(), key=lambda item: item[2], default=None)
+        return deepest[0] if deepest else None
+
+    def reset_window(self):
+        # Экран без прокрутки (например, длинный список заказов) растягивает окно по высоте,
+        # и следующий экран рисовался бы в окне высотой в тысячи пикселей
+        self.window.resize(WINDOW_WIDTH, WINDOW_HEIGHT)
+        settle(self.app, self.window)
+
+    def measure(self, action, cold=True):
+        """Выполняет действие repeat раз и возвращает медиану времени в миллисекундах.
+
+        cold=True - перед каждым повтором кэш экранов сбрасывается, и экран строится с нуля.
+        """
+        timings = []
+        for _ in range(self.repeat):
+            if cold:
+                self.window.reset_pages()
+            self.reset_window()
+            started = time.perf_counter()
+            action()
+            settle(self.app, self.window)
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
+
+    def fill_cart(self):
+        cursor = self.db.conn.cursor()
+        cursor.execute("SELECT id FROM products ORDER BY id LIMIT 10")
+        for (product_id,) in cursor.fetchall():
+            self.db.add_to_cart(self.user.id, product_id, 1)
+
+    def checkout(self):
+        # Наполнение корзины не входит в замер
+        timings = []
+        for _ in range(self.repeat):
+            self.fill_cart()
+            self.reset_window()
+            started = time.perf_counter()
+            self.window.checkout()
+            settle(self.app, self.window)
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
+
+    def catalog_back(self):
+        """Возврат из карточки товара в уже построенный каталог"""
+        product_id = self.db.get_products_page(self.deep_category, limit=1, subtree=True)[0][0].id
+        self.window.show_catalog(self.deep_category)
+        settle(self.app, self.window)
+        timings = []
+        for _ in range(self.repeat):
+            self.window.show_product(product_id)
+            settle(self.app, self.window)
+            started = time.perf_counter()
+            self.window.show_catalog(self.window.catalog_category)
+            settle(self.app, self.window)
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
+
+    def deep_page(self):
+        """Время выборки полной страницы DEEP_PAGE при листании каталога по цене; в маленьком
+        каталоге - последней полной страницы"""
+        count, _ = self.db.estimate_product_count(cap=(DEEP_PAGE + 1) * PAGE_SIZE)
+        depth = max(min(DEEP_PAGE, count // PAGE_SIZE - 1), 0)
+        cursor = None
+        for _ in range(depth):
+            rows, cursor = self.db.get_products_page(sort='price', cursor=cursor, limit=PAGE_SIZE)
+        timings = []
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            self.db.get_products_page(sort='price', cursor=cursor, limit=PAGE_SIZE)
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
+
+    def analytics(self):
+        """Экран аналитики продавца всех товаров за период по умолчанию"""
+        self.window.current_user = self.seller
+        try:
+            return self.measure(self.window.show_analytics)
+        finally:
+            self.window.current_user = self.user
+
+    def scenarios(self):
+        scenarios = [
+            ('catalog_root', lambda: self.measure(lambda: self.window.show_catalog())),
+            ('catalog_deep_category', lambda: self.measure(lambda: self.window.show_catalog(self.deep_category))),
+            ('cart', lambda: self.measure(self.window.show_cart)),
+            ('orders', lambda: self.measure(self.window.show_orders)),
+            ('checkout', self.checkout),
+            ('catalog_back', self.catalog_back),
+            ('catalog_deep_page', self.deep_page),
+        ]
+        if self.seller:
+            scenarios.append(('analytics', self.analytics))
+        return scenarios
+
+    def run(self, only=None):
+        results = {'startup': {'wall_ms': round(self.startup_ms, 2), 'widgets': widget_count(self.window),
+                               'peak_rss_kb': peak_rss_kb()}}
+        for name, scenario in self.scenarios():
+            if only and name not in only:
+                continue
+            wall_ms = scenario()
+            results[name] = {
+                'wall_ms': round(wall_ms, 2),
+                'widgets': widget_count(self.window),
+                'rss_kb': current_rss_kb(),
+                'peak_rss_kb': peak_rss_kb(),
+            }
+        return results
+
+
+def compare(results, baseline, tolerance):
+    """Возвращает список регрессий относительно базовой линии"""
+    regressions = []
+    for name, current in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        wall, base_wall = current['wall_ms'], expected['wall_ms']
+        if wall > base_wall * (1 + tolerance) and wall - base_wall > MIN_WALL_DELTA_MS:
+            regressions.append(f"{name}: время {wall:.1f} мс, базовое {base_wall:.1f} мс")
+        if current['widgets'] > expected['widgets']:
+            regressions.append(f"{name}: виджетов {current['widgets']}, базовое {expected['widgets']}")
+        if current['peak_rss_kb'] > expected['peak_rss_kb'] * (1 + RSS_TOLERANCE):
+            regressions.append(f"{name}: пиковый RSS {current['peak_rss_kb']} КБ, "
+                               f"базовое {expected['peak_rss_kb']} КБ")
+    return regressions
+
+
+def print_table(results, baseline):
+    print(f"{'сценарий':<24}{'время, мс':>12}{'база, мс':>12}{'виджеты':>10}{'пик RSS, МБ':>14}")
+    for name, current in results.items():
+        expected = baseline.get(name, {}).get('wall_ms')
+        base = f"{expected:.2f}" if expected is not None else '-'
+        print(f"{name:<24}{current['wall_ms']:>12.2f}{base:>12}{current['widgets']:>10}"
+              f"{current['peak_rss_kb'] / 1024:>14.1f}")
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(path, baselines):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(baselines, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write('\n')
+    os.replace(tmp_path, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарки экранов магазина")
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small', help="объем синтетических данных")
+    parser.add_argument('--db', help="путь к базе (по умолчанию benchmarks/data/<preset>.db)")
+    parser.add_argument('--repeat', type=int, default=5, help="повторов каждого сценария")
+    parser.add_argument('--scenario', action='append', help="запустить только указанные сценарии")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="файл базовой линии")
+    parser.add_argument('--update-baseline', action='store_true', help="записать результаты как базовую линию")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help="допустимое замедление, доля")
+    parser.add_argument('--json', help="сохранить результаты в файл")
+    args = parser.parse_args(argv)
+
+    db_path = ensure_database(args.preset, args.db)
+    directory = tempfile.mkdtemp(prefix='eshop-bench-')
+    try:
+        path = working_copy(db_path, directory)
+        results = Bench(args.preset, path, args.repeat).run(args.scenario)
+        # Холодный старт меряется в отдельных процессах на той же копии базы
+        for name, result in startup.measure(path, HEAVY_USER_PHONE, args.repeat).items():
+            if not args.scenario or name in args.scenario:
+                results[name] = result
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    baselines = load_baseline(args.baseline)
+    baseline = baselines.get(args.preset, {})
+    print_table(results, baseline)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.update_baseline:
+        baselines[args.preset] = results
+        save_baseline(args.baseline, baselines)
+        print(f"Базовая линия {args.preset} записана в {args.baseline}")
+        return 0
+
+    if not baseline:
+        print(f"Базовой линии для {args.preset} нет: запустите с --update-baseline")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"РЕГРЕССИЯ {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""Поиск по мере набора: время запроса на каждое нажатие клавиши.
+
+Каждый запрос набирается по одной букве: для каждого набранного начала строки меряется
+первая страница поиска (медиана повторов), для полной строки - еще и вторая. Среди
+запросов есть частые слова, которые встречаются во всех описаниях товаров. Нажатия
+медленнее цели перечисляются в конце, и команда завершается с кодом 1.
+
+Запуск из корня проекта:
+    python -m benchmarks.search --preset large --target 20
+"""
+import argparse
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.generate import PRESETS, ensure_database, working_copy
+from models.database import Database
+from views.catalog_view import LIST_COLUMNS, PAGE_SIZE
+
+QUERIES = ['удобный стул', 'товар для', 'артикул 12', 'стильный', 'роман №42']
+
+
+def timed(call, repeat):
+    elapsed = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        elapsed.append((time.perf_counter() - started) * 1000)
+    return statistics.median(elapsed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Поиск по мере набора: время на нажатие клавиши")
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--db', help="своя база вместо профиля (используется ее копия)")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--target', type=float, default=20.0, help="предел времени запроса на нажатие, мс")
+    parser.add_argument('--query', action='append', help="свои запросы вместо набора по умолчанию")
+    args = parser.parse_args(argv)
+
+    source = args.db or ensure_database(args.preset)
+    directory = tempfile.mkdtemp(prefix='eshop-search-')
+    slow = []
+    try:
+        # Копия базы, созданной прежней версией кода, доводится до текущей схемы
+        db = Database(working_copy(source, directory))
+        for query in args.query or QUERIES:
+            timings = []
+            for length in range(1, len(query) + 1):
+                typed = query[:length]
+                elapsed = timed(lambda: db.search_products(typed, PAGE_SIZE, columns=LIST_COLUMNS), args.repeat)
+                timings.append(elapsed)
+                if elapsed > args.target:
+                    slow.append((typed, 1, elapsed))
+
+            rows, cursor = db.search_products(query, PAGE_SIZE, columns=LIST_COLUMNS)
+            next_ms = 0.0
+            if cursor is not None:
+                next_ms = timed(lambda: db.search_products(query, PAGE_SIZE, cursor, LIST_COLUMNS), args.repeat)
+                if next_ms > args.target:
+                    slow.append((query, 2, next_ms))
+            print(f"«{query}»: нажатие до {max(timings):.2f} мс (медиана {statistics.median(timings):.2f}), "
+                  f"вторая страница {next_ms:.2f} мс, найдено на первой странице {len(rows)}")
+        db.conn.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    for typed, page, elapsed in slow:
+        print(f"МЕДЛЕННО: «{typed}», страница {page}: {elapsed:.2f} мс")
+    return 1 if slow else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""Товары продавца: страницы таблицы, пакетное изменение цены и выгрузка в CSV.
+
+Меряются первая и следующая страницы таблицы при каждом порядке сортировки, изменение
+цены --products товаров одной транзакцией (executemany) против отдельной транзакции на
+товар (замер на --single товарах с пересчетом на все), перенос тех же товаров в другую
+категорию и выгрузка всех товаров продавца в CSV: время и прирост памяти (tracemalloc),
+который не должен зависеть от числа товаров. Отдельно новая база заполняется как
+python -m models.seed --items items.txt, и проверяется, что выгрузка тестового продавца
+(python -m models.exporter) не пуста и содержит все его товары.
+
+Запуск из корня проекта:
+    python -m benchmarks.seller --preset medium --products 50000
+"""
+import argparse
+import csv
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.generate import PRESETS, SELLER_PHONE, ensure_database, working_copy
+from models import exporter, seed
+from models.database import SEED_SELLER_PHONE, SELLER_SORT_INDEXES, Database
+from models.exporter import export_seller_products
+from views.seller_products import PAGE_SIZE
+
+
+def timed(call, repeat):
+    elapsed = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        elapsed.append((time.perf_counter() - started) * 1000)
+    return statistics.median(elapsed)
+
+
+def check_seeded(directory):
+    """Выгрузка тестового продавца из новой базы с каталогом items.txt; возвращает текст ошибки или None"""
+    db_path = os.path.join(directory, 'seeded.db')
+    path = os.path.join(directory, 'seeded.csv')
+    seed.main(['--db', db_path, '--items', 'items.txt'])
+    if exporter.main([SEED_SELLER_PHONE, path, '--db', db_path]) != 0:
+        return "выгрузка тестового продавца не выполнена"
+    db = Database(db_path)
+    cursor = db.conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM products")
+    total = cursor.fetchone()[0]
+    db.conn.close()
+    with open(path, encoding='utf-8', newline='') as f:
+        lines = sum(1 for _ in csv.reader(f)) - 1
+    print(f"Выгрузка тестового продавца новой базы: {lines} из {total} товаров")
+    if lines == 0 or lines != total:
+        return f"у тестового продавца выгружено {lines} из {total} товаров"
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Товары продавца: таблица, пакетные изменения, выгрузка")
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--db', help="своя база вместо профиля (используется ее копия)")
+    parser.add_argument('--products', type=int, default=50_000, help="сколько товаров переоценить")
+    parser.add_argument('--single', type=int, default=200, help="товаров для замера по одной транзакции")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    source = args.db or ensure_database(args.preset)
+    directory = tempfile.mkdtemp(prefix='eshop-seller-')
+    failed = False
+    try:
+        # Копия базы, созданной прежней версией кода, доводится до текущей схемы
+        db = Database(working_copy(source, directory))
+        seller_id = db.get_user(SELLER_PHONE).id
+        total = db.count_seller_products(seller_id)
+        print(f"Товаров продавца: {total}")
+
+        for sort in SELLER_SORT_INDEXES:
+            for descending in (False, True):
+                rows, cursor = db.get_seller_products_page(seller_id, sort, descending, limit=PAGE_SIZE)
+                first_ms = timed(lambda: db.get_seller_products_page(seller_id, sort, descending, limit=PAGE_SIZE),
+                                 args.repeat)
+                next_ms = timed(lambda: db.get_seller_products_page(seller_id, sort, descending, cursor, PAGE_SIZE),
+                                args.repeat)
+                print(f"Страница по {sort}{' (убыв.)' if descending else ''}: первая {first_ms:.2f} мс, "
+                      f"следующая {next_ms:.2f} мс")
+
+        cursor = db.conn.cursor()
+        cursor.execute("SELECT id, price FROM products WHERE seller_id = ? ORDER BY id LIMIT ?",
+                       (seller_id, args.products))
+        before = dict(cursor.fetchall())
+        product_ids = list(before)
+
+        single_ids = product_ids[:args.single]
+        started = time.perf_counter()
+        for product_id in single_ids:
+            db.update_seller_products(seller_id, [product_id], price_percent=10)
+        single_s = (time.perf_counter() - started) / max(len(single_ids), 1) * len(product_ids)
+
+        started = time.perf_counter()
+        changed = db.update_seller_products(seller_id, product_ids, price_percent=-10)
+        batch_s = time.perf_counter() - started
+        print(f"Переоценка {changed} товаров одной транзакцией: {batch_s:.2f} с "
+              f"(по транзакции на товар было бы около {single_s:.1f} с)")
+        cursor.execute("SELECT id, price FROM products WHERE id IN (?, ?)", (product_ids[-1], product_ids[0]))
+        after = dict(cursor.fetchall())
+        if changed != len(product_ids) or after[product_ids[-1]] != round(before[product_ids[-1]] * 0.9, 2):
+            print("ОШИБКА: переоценены не все товары")
+            failed = True
+
+        category_id = cursor.execute("SELECT MAX(id) FROM categories").fetchone()[0]
+        started = time.perf_counter()
+        db.update_seller_products(seller_id, product_ids, category_id=category_id)
+        print(f"Перенос {len(product_ids)} товаров в другую категорию: {time.perf_counter() - started:.2f} с")
+
+        path = os.path.join(directory, 'products.csv')
+        tracemalloc.start()
+        started = time.perf_counter()
+        exported = export_seller_products(db, seller_id, path)
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        with open(path, encoding='utf-8', newline='') as f:
+            lines = sum(1 for _ in csv.reader(f)) - 1
+        print(f"Выгрузка {exported} товаров: {elapsed:.2f} с, {os.path.getsize(path) / 2 ** 20:.1f} МБ, "
+              f"пик памяти {peak / 2 ** 20:.2f} МБ")
+        if exported != total or lines != total:
+            print(f"ОШИБКА: выгружено {exported} ({lines} строк в файле) из {total}")
+            failed = True
+        db.conn.close()
+
+        problem = check_seeded(directory)
+        if problem:
+            print(f"ОШИБКА: {problem}")
+            failed = True
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""Замер холодного старта: время до первого окна и до первого экрана каталога.
+
+Каждый замер - отдельный процесс, как при настоящем запуске: интерпретатор, импорты,
+открытие базы и показ окна авторизации, затем вход и корневой каталог с товарами.
+Каталог меряется дважды: без снимка первого экрана и со снимком прошлого запуска.
+
+Запуск из корня проекта: python -m benchmarks.startup benchmarks/data/small.db
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+STARTUP_TIMEOUT = 60.0
+
+
+def qt_message_handler(mode, context, message):
+    # Платформа offscreen предупреждает об этом при каждом показе окна - это шум
+    if 'propagateSizeHints' not in message:
+        print(message, file=sys.stderr)
+
+
+def run_child(db_path, phone, started):
+    """Тело дочернего процесса: печатает JSON с замерами"""
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt6.QtCore import qInstallMessageHandler
+    from PyQt6.QtWidgets import QApplication, QWidget
+
+    qInstallMessageHandler(qt_message_handler)
+
+    from main import EShopApp
+
+    app = EShopApp(db_path)
+    app.show_auth_window()
+    QApplication.processEvents()
+    first_window = time.time() - started
+
+    app.current_user = app.db.get_user(phone)
+    login = time.time()
+    app.show_main_window()
+
+    window = app.main_window
+    deadline = time.perf_counter() + STARTUP_TIMEOUT
+    while True:
+        QApplication.processEvents()
+        page = window.page
+        if page is not None and page.ready and page.catalog is not None and page.catalog.model().rowCount():
+            break
+        if time.perf_counter() > deadline:
+            raise TimeoutError("Каталог не загрузился")
+        time.sleep(0.0005)
+    QApplication.processEvents()
+    first_catalog = time.time() - login
+
+    # Даем фоновой сверке сохранить снимок для следующего запуска
+    window.async_db.wait()
+    QApplication.processEvents()
+
+    print(json.dumps({
+        'first_window_ms': first_window * 1000,
+        'first_catalog_ms': first_catalog * 1000,
+        'widgets': len(window.findChildren(QWidget)),
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }))
+
+
+def spawn(db_path, phone, snapshot):
+    from models.snapshot import snapshot_path
+
+    if not snapshot and os.path.exists(snapshot_path(db_path)):
+        os.remove(snapshot_path(db_path))
+    started = time.time()
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.startup', db_path, '--child', '--phone', phone, '--started', repr(started)],
+        check=True, capture_output=True, text=True, timeout=STARTUP_TIMEOUT * 2,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure(db_path, phone, repeat):
+    """Возвращает замеры в формате benchmarks.run: сценарий -> {wall_ms, widgets, peak_rss_kb}"""
+    runs = {'cold': [], 'snapshot': []}
+    for _ in range(repeat):
+        runs['cold'].append(spawn(db_path, phone, snapshot=False))
+        # Холодный запуск только что сохранил снимок - следующий запуск рисует каталог из него
+        runs['snapshot'].append(spawn(db_path, phone, snapshot=True))
+
+    def summary(samples, key):
+        return {
+            'wall_ms': round(statistics.median(sample[key] for sample in samples), 2),
+            'widgets': max(sample['widgets'] for sample in samples),
+            'peak_rss_kb': max(sample['peak_rss_kb'] for sample in samples),
+        }
+
+    return {
+        'time_to_first_window': summary(runs['cold'], 'first_window_ms'),
+        'first_catalog_cold': summary(runs['cold'], 'first_catalog_ms'),
+        'first_catalog_snapshot': summary(runs['snapshot'], 'first_catalog_ms'),
+    }
+
+
+def main(argv=None):
+    from benchmarks.generate import HEAVY_USER_PHONE
+
+    parser = argparse.ArgumentParser(description="Замер холодного старта приложения")
+    parser.add_argument('db', help="путь к базе")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--phone', default=HEAVY_USER_PHONE, help="телефон пользователя, от имени которого вход")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--started', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        run_child(args.db, args.phone, args.started)
+        return 0
+
+    for name, result in measure(args.db, args.phone, args.repeat).items():
+        print(f"{name:<24}{result['wall_ms']:>10.1f} мс")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
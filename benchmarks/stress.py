@@ -0,0 +1,213 @@
+"""Нагрузочная проверка общей базы: несколько процессов-копий приложения пишут в один файл.
+
+Каждый процесс работает от имени своего покупателя и в течение заданного времени вперемешку
+читает каталог, корзину и заказы, кладет товары в корзину и оформляет заказы. Процесс
+записывает, какие записи база подтвердила; после завершения все подтвержденное сверяется
+с содержимым базы. Проверка проходит, если ни одна операция не упала, ни одна
+подтвержденная запись не потеряна и пропускная способность не ниже заданной.
+
+Запуск из корня проекта:
+    python -m benchmarks.stress --preset small --processes 8 --duration 10 --target 200
+"""
+import argparse
+import multiprocessing
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import traceback
+from collections import Counter
+
+from benchmarks.generate import PRESETS, ensure_database, working_copy
+from models.database import Database
+
+# Доли операций: чтение, добавление в корзину, оформление заказа
+READ_SHARE = 0.5
+ADD_SHARE = 0.35
+STARTUP_GRACE = 2.0
+RESULT_TIMEOUT = 60.0
+
+
+def read_once(db, user_id, product_range, rng):
+    kind = rng.randrange(4)
+    if kind == 0:
+        db.get_products_page(limit=50)
+    elif kind == 1:
+        db.get_product(rng.randint(*product_range))
+    elif kind == 2:
+        db.get_cart_items(user_id)
+    else:
+        db.get_orders(user_id)
+
+
+def worker(db_path, user_id, duration, busy_timeout_ms, seed, start_at, results):
+    """Тело процесса: кладет в очередь отчет о подтвержденных записях и ошибках"""
+    rng = random.Random(seed)
+    report = {
+        'user_id': user_id, 'ops': Counter(), 'errors': Counter(), 'latencies_ms': [],
+        'orders': [], 'cart': Counter(), 'retried': 0, 'failure': None,
+    }
+    try:
+        db = Database(db_path, setup=False, busy_timeout_ms=busy_timeout_ms)
+        cursor = db.conn.cursor()
+        cursor.execute("SELECT MIN(id), MAX(id) FROM products")
+        product_range = cursor.fetchone()
+
+        # Процессы стартуют по-разному, нагрузка начинается у всех одновременно
+        time.sleep(max(0.0, start_at - time.time()))
+        deadline = time.time() + duration
+        while time.time() < deadline:
+            roll = rng.random()
+            started = time.perf_counter()
+            try:
+                if roll < READ_SHARE:
+                    op = 'read'
+                    read_once(db, user_id, product_range, rng)
+                elif roll < READ_SHARE + ADD_SHARE:
+                    op = 'add_to_cart'
+                    product_id = rng.randint(*product_range)
+                    quantity = rng.randint(1, 3)
+                    db.add_to_cart(user_id, product_id, quantity)
+                    report['cart'][product_id] += quantity
+                else:
+                    op = 'checkout'
+                    order_id = db.checkout(user_id)
+                    if order_id is not None:
+                        report['orders'].append((order_id, dict(report['cart'])))
+                        report['cart'] = Counter()
+            except Exception as error:
+                report['errors'][f"{op}: {error}"] += 1
+                continue
+            report['ops'][op] += 1
+            if op != 'read':
+                report['latencies_ms'].append((time.perf_counter() - started) * 1000)
+        report['retried'] = db.connections.retried
+        db.conn.close()
+    except Exception:
+        report['failure'] = traceback.format_exc()
+    report['ops'] = dict(report['ops'])
+    report['errors'] = dict(report['errors'])
+    report['cart'] = dict(report['cart'])
+    results.put(report)
+
+
+def verify(db, report):
+    """Сверяет подтвержденные записи процесса с базой; возвращает список расхождений"""
+    problems = []
+    user_id = report['user_id']
+    cursor = db.conn.cursor()
+    for order_id, expected in report['orders']:
+        cursor.execute("SELECT user_id FROM orders WHERE id = ?", (order_id,))
+        row = cursor.fetchone()
+        if row is None or row[0] != user_id:
+            problems.append(f"заказ {order_id} пользователя {user_id} потерян")
+            continue
+        cursor.execute("SELECT product_id, quantity FROM order_items WHERE order_id = ?", (order_id,))
+        if dict(cursor.fetchall()) != expected:
+            problems.append(f"позиции заказа {order_id} не совпадают с подтвержденными")
+
+    cursor.execute("SELECT COUNT(*) FROM orders WHERE user_id = ?", (user_id,))
+    count = cursor.fetchone()[0]
+    if count != len(report['orders']):
+        problems.append(f"у пользователя {user_id} заказов {count}, подтверждено {len(report['orders'])}")
+
+    cursor.execute("SELECT product_id, quantity FROM carts WHERE user_id = ?", (user_id,))
+    if dict(cursor.fetchall()) != report['cart']:
+        problems.append(f"корзина пользователя {user_id} не совпадает с подтвержденной")
+    return problems
+
+
+def run(db_path, processes, duration, busy_timeout_ms, seed=42):
+    """Запускает процессы на базе db_path и возвращает сводку"""
+    # Копия базы, созданной прежней версией кода, доводится до текущей схемы
+    db = Database(db_path)
+    user_ids = []
+    for i in range(processes):
+        user_ids.append(db.add_user(f"Нагрузка {i + 1}", f"+7-stress-{seed}-{i + 1}", 'password', 'Покупатель'))
+
+    # Отдельные интерпретаторы, как у настоящих копий приложения
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    start_at = time.time() + STARTUP_GRACE
+    children = [
+        context.Process(target=worker, args=(db_path, user_id, duration, busy_timeout_ms, seed + i, start_at, results))
+        for i, user_id in enumerate(user_ids)
+    ]
+    for child in children:
+        child.start()
+    reports = [results.get(timeout=duration + STARTUP_GRACE + RESULT_TIMEOUT) for _ in children]
+    for child in children:
+        child.join()
+
+    ops = Counter()
+    errors = Counter()
+    latencies = []
+    problems = []
+    retried = 0
+    for report in reports:
+        if report['failure']:
+            problems.append(f"процесс пользователя {report['user_id']} упал:\n{report['failure']}")
+            continue
+        ops.update(report['ops'])
+        errors.update(report['errors'])
+        latencies.extend(report['latencies_ms'])
+        retried += report['retried']
+        problems.extend(verify(db, report))
+    db.conn.close()
+
+    latencies.sort()
+    return {
+        'ops': dict(ops),
+        'ops_per_s': sum(ops.values()) / duration,
+        'writes_per_s': (ops['add_to_cart'] + ops['checkout']) / duration,
+        'write_p50_ms': statistics.median(latencies) if latencies else 0.0,
+        'write_p99_ms': latencies[int(len(latencies) * 0.99)] if latencies else 0.0,
+        'retried': retried,
+        'errors': dict(errors),
+        'problems': problems,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочная проверка общей базы несколькими процессами")
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--db', help="своя база вместо профиля (используется ее копия)")
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help="секунд нагрузки")
+    parser.add_argument('--busy-timeout', type=int, help="busy_timeout соединений, мс")
+    parser.add_argument('--target', type=float, default=0.0, help="минимальная пропускная способность, операций/с")
+    args = parser.parse_args(argv)
+
+    source = args.db or ensure_database(args.preset)
+    directory = tempfile.mkdtemp(prefix='eshop-stress-')
+    try:
+        summary = run(working_copy(source, directory), args.processes, args.duration, args.busy_timeout)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    ops = summary['ops']
+    print(f"Процессов: {args.processes}, {args.duration:.0f} с")
+    print(f"Операций: {sum(ops.values())} (чтений {ops.get('read', 0)}, добавлений {ops.get('add_to_cart', 0)}, "
+          f"оформлений {ops.get('checkout', 0)})")
+    print(f"Пропускная способность: {summary['ops_per_s']:.0f} опер./с, записей {summary['writes_per_s']:.0f}/с")
+    print(f"Запись: медиана {summary['write_p50_ms']:.2f} мс, p99 {summary['write_p99_ms']:.2f} мс; "
+          f"повторов из-за занятой базы: {summary['retried']}")
+
+    failed = False
+    for error, count in sorted(summary['errors'].items()):
+        print(f"ОШИБКА x{count}: {error}")
+        failed = True
+    for problem in summary['problems']:
+        print(f"ПОТЕРЯ: {problem}")
+        failed = True
+    if summary['ops_per_s'] < args.target:
+        print(f"Пропускная способность ниже цели {args.target:.0f} опер./с")
+        failed = True
+    print("Ошибок и потерянных записей нет" if not failed else "Проверка не пройдена")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
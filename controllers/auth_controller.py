@@ -1,13 +1,87 @@
-from models.database import Database
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool
 
+from models.async_database import QueryHandle
+from utils.passwords import hash_password, needs_rehash, verify_password
 
-class AuthController:
-    def __init__(self, db):
-        self.db = db
 
-    def login(self, phone, password):
-        # Логика авторизации
-        user = self.db.get_user(phone)
-        if user and user[2] == password:
-            return user
-        return None
\ No newline at end of file
+class VerifyTask(QRunnable):
+    """Проверка пароля в рабочем потоке: результат (пароль верен, новый хэш или None)"""
+
+    def __init__(self, handle, password, stored):
+        super().__init__()
+        self.handle = handle
+        self.password = password
+        self.stored = stored
+
+    def run(self):
+        try:
+            if self.stored is None:
+                # Неизвестный телефон проверяется столько же, сколько известный, чтобы по
+                # времени ответа нельзя было узнать, зарегистрирован ли он
+                hash_password(self.password)
+                result = (False, None)
+            elif verify_password(self.password, self.stored):
+                # Пароль открытым текстом или хэш прежней стоимости заменяется при входе
+                result = (True, hash_password(self.password) if needs_rehash(self.stored) else None)
+            else:
+                result = (False, None)
+        except Exception as error:
+            self.emit(self.handle.failed, error)
+        else:
+            self.emit(self.handle.finished, result)
+
+    def emit(self, signal, value):
+        try:
+            signal.emit(value)
+        except RuntimeError:
+            # Контроллер удален, пока шла проверка
+            pass
+
+
+class AuthController(QObject):
+    """Вход по телефону и паролю без блокировки GUI.
+
+    Пользователь читается через AsyncDatabase, пароль проверяется scrypt в отдельном
+    потоке, новый хэш записывается обычной фоновой записью. Проверки идут по одной:
+    каждая занимает десятки МБ памяти и ядро процессора, и повторные попытки входа не
+    должны их умножать.
+    """
+
+    def __init__(self, async_db, parent=None):
+        super().__init__(parent)
+        self.async_db = async_db
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+
+    def login(self, phone, password, on_result, on_error):
+        """Вызывает on_result(User без пароля) или on_result(None), если телефон или пароль
+        неверны; on_error(ошибка) - если проверить не удалось"""
+
+        def verify(user):
+            handle = QueryHandle(self)
+            handle.finished.connect(lambda result: checked(handle, user, result))
+            handle.failed.connect(lambda error: failed(handle, error))
+            self.pool.start(VerifyTask(handle, password, user.password if user else None))
+
+        def checked(handle, user, result):
+            handle.deleteLater()
+            valid, new_hash = result
+            if not valid:
+                on_result(None)
+                return
+            if new_hash is not None:
+                # Вход от неудачной замены хэша не зависит: она повторится при следующем
+                self.async_db.write('rehash_password', user.id, user.password, new_hash)
+            # Пароль после проверки в памяти сеанса не держим
+            user.password = None
+            on_result(user)
+
+        def failed(handle, error):
+            handle.deleteLater()
+            on_error(error)
+
+        self.async_db.read('get_user', phone, cancellable=False, on_result=verify, on_error=on_error)
+
+    def wait(self, msecs=-1):
+        """Дожидается незавершенной проверки (при закрытии приложения)"""
+        return self.pool.waitForDone(msecs)
@@ -1,24 +1,64 @@
 import sys
-from PyQt5.QtWidgets import QApplication
+from PyQt6.QtWidgets import QApplication, QStackedWidget
 from models.database import Database
-from controllers.auth_controller import AuthController
-from views.auth_window import AuthWindow
+from models.jobs import JOB_STOP_TIMEOUT, order_archiver, reservation_sweeper, sales_backfill
+from views.auth_window import AuthWindow, RegisterWindow
 from utils.paths import resource_path
 
 
 class EShopApp:
-    def __init__(self):
-        db_path = resource_path('data/database.db')
-        self.db = Database(db_path)
-        self.auth_controller = AuthController(self.db)
+    def __init__(self, db_path=None):
+        self.app = QApplication.instance() or QApplication(sys.argv)
+        # Схема проверяется по версии, DDL выполняется только для новой или старой базы
+        self.db = Database(db_path or resource_path('data/database.db'))
+        # Резервы брошенных корзин снимаются в фоне; с общей базой так делает каждая копия
+        # приложения, удаление истекших резервов от этого не ломается
+        self.sweeper = reservation_sweeper(self.db.db_path)
+        self.sweeper.start()
+        self.app.aboutToQuit.connect(self.sweeper.stop)
+        # Сводки продаж по заказам, оформленным до их появления, досчитываются пакетами
+        self.backfill = sales_backfill(self.db.db_path)
+        self.backfill.start()
+        self.app.aboutToQuit.connect(self.backfill.stop)
+        # Старые заказы раз в сутки переносятся в архив, чтобы горячая база оставалась маленькой
+        self.archiver = order_archiver(self.db.db_path)
+        self.archiver.start()
+        self.app.aboutToQuit.connect(lambda: self.archiver.stop(JOB_STOP_TIMEOUT))
+        self.async_db = None
+        self.current_user = None
+        self.main_window = None
         self.init_ui()
 
     def init_ui(self):
-        self.app = QApplication(sys.argv)
-        self.auth_window = AuthWindow(self.auth_controller)
-        self.auth_window.show()
-        sys.exit(self.app.exec())
+        self.stacked_widget = QStackedWidget()
+        self.stacked_widget.setWindowTitle("Уютный ДОМ")
+        self.stacked_widget.addWidget(AuthWindow(self))
+        self.stacked_widget.addWidget(RegisterWindow(self))
+
+    def show_auth_window(self):
+        if self.main_window is not None:
+            self.main_window.hide()
+        self.stacked_widget.setCurrentIndex(0)
+        self.stacked_widget.show()
+
+    def show_main_window(self):
+        # Модули главного окна (каталог, миниатюры, Pillow) загружаются только после входа,
+        # поэтому окно авторизации появляется раньше
+        from views.main_window import MainWindow
+
+        if self.main_window is None:
+            self.main_window = MainWindow(self.db)
+            self.main_window.main_app = self
+        else:
+            self.main_window.show_catalog()
+        self.main_window.set_user(self.current_user)
+        self.main_window.show()
+        self.stacked_widget.hide()
+
+    def run(self):
+        self.show_auth_window()
+        return self.app.exec()
 
 
 if __name__ == '__main__':
-    app = EShopApp()
\ No newline at end of file
+    sys.exit(EShopApp().run())
@@ -0,0 +1,201 @@
+import threading
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from models.database import Database
+from models.events import changes
+from utils.paths import resource_path
+from utils.profiler import profiler
+
+
+class ConnectionPool:
+    """Соединения с БД по одному на поток: sqlite3-соединение нельзя делить между потоками.
+
+    Соединения хранятся по идентификатору потока, а не в threading.local: Python-состояние
+    потока QThreadPool создается на время одной задачи, и threading.local терялся бы вместе
+    с открытым соединением и его кэшем после каждого запроса.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.databases = {}
+
+    def connection(self):
+        thread_id = threading.get_ident()
+        with self.lock:
+            db = self.databases.get(thread_id)
+        if db is None:
+            # Схема уже создана основным соединением, рабочим потокам DDL не нужен
+            db = Database(self.db_path, setup=False)
+            with self.lock:
+                self.databases[thread_id] = db
+        else:
+            # Профилировщик выключали, пока поток простаивал
+            profiler.release(db)
+        return db
+
+
+class QueryHandle(QObject):
+    """Запрос, выполняемый в пуле потоков; результат приходит сигналами в поток GUI"""
+
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.cancelled = False
+        self.lock = threading.Lock()
+        self.db = None
+
+    def cancel(self):
+        """Отменяет запрос: ожидающий не начнется, выполняющийся будет прерван"""
+        with self.lock:
+            self.cancelled = True
+            if self.db is not None:
+                self.db.conn.interrupt()
+
+    def attach(self, db):
+        with self.lock:
+            if self.cancelled:
+                return False
+            self.db = db
+            return True
+
+    def detach(self):
+        with self.lock:
+            self.db = None
+
+
+class QueryTask(QRunnable):
+    def __init__(self, connections, handle, method, args, kwargs):
+        super().__init__()
+        self.connections = connections
+        self.handle = handle
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+
+    def run(self):
+        db = self.connections.connection()
+        if not self.handle.attach(db):
+            return
+        try:
+            result = getattr(db, self.method)(*self.args, **self.kwargs)
+        except Exception as error:
+            if db.conn.in_transaction:
+                db.conn.rollback()
+            self.emit(self.handle.failed, error)
+        else:
+            self.emit(self.handle.finished, result)
+        finally:
+            self.handle.detach()
+
+    def emit(self, signal, value):
+        if self.handle.cancelled:
+            return
+        try:
+            signal.emit(value)
+        except RuntimeError:
+            # Запрос отменили и удалили, пока он выполнялся
+            pass
+
+
+class ChangeNotifier(QObject):
+    """Переносит события ChangeBus своей базы в поток GUI сигналом changed(тема, данные)"""
+
+    changed = pyqtSignal(str, object)
+
+    def __init__(self, db_path, bus=changes, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.bus = bus
+        bus.subscribe(self.on_change)
+        self.destroyed.connect(lambda: bus.unsubscribe(self.on_change))
+
+    def on_change(self, db_path, topic, payload):
+        if db_path != self.db_path:
+            return
+        try:
+            # Из рабочего потока сигнал доставляется в поток GUI через очередь событий
+            self.changed.emit(topic, payload)
+        except RuntimeError:
+            # Объект уже удален, а отписка еще не дошла
+            pass
+
+
+class AsyncDatabase(QObject):
+    """Асинхронный доступ к Database из GUI.
+
+    Методы Database вызываются по имени в пуле потоков, у каждого потока свое соединение.
+    Чтения выполняются параллельно и отменяются cancel_reads() при уходе с экрана;
+    записи идут в один поток строго по очереди и не отменяются. Об изменениях, сделанных
+    через эту базу, сообщает сигнал changed.
+    """
+
+    changed = pyqtSignal(str, object)
+
+    def __init__(self, db_path, max_readers=4, parent=None):
+        super().__init__(parent)
+        self.connections = ConnectionPool(db_path)
+        self.notifier = ChangeNotifier(resource_path(db_path), parent=self)
+        self.notifier.changed.connect(self.changed)
+
+        # Потоки пулов не завершаются по простою: соединение принадлежит потоку, и его
+        # идентификатор не должен достаться новому потоку
+        self.read_pool = QThreadPool(self)
+        self.read_pool.setMaxThreadCount(max_readers)
+        self.read_pool.setExpiryTimeout(-1)
+        self.write_pool = QThreadPool(self)
+        self.write_pool.setMaxThreadCount(1)
+        self.write_pool.setExpiryTimeout(-1)
+
+        self.reads = set()
+
+    def read(self, method, *args, on_result=None, on_error=None, cancellable=True, **kwargs):
+        """cancellable=False - чтение не отменяется cancel_reads(), например, когда его
+        результат нужен экрану, который остается в кэше"""
+        handle = self.submit(self.read_pool, method, args, kwargs, on_result, on_error)
+        if cancellable:
+            self.reads.add(handle)
+        return handle
+
+    def write(self, method, *args, on_result=None, on_error=None, **kwargs):
+        return self.submit(self.write_pool, method, args, kwargs, on_result, on_error)
+
+    def cancel(self, handle):
+        """Отменяет один запрос"""
+        if handle.cancelled:
+            return
+        handle.cancel()
+        self.forget(handle)
+
+    def cancel_reads(self):
+        """Отменяет все незавершенные чтения - их результаты больше никому не нужны"""
+        for handle in list(self.reads):
+            self.cancel(handle)
+
+    def wait(self, msecs=-1):
+        """Дожидается завершения всех запросов (при закрытии приложения)"""
+        return self.write_pool.waitForDone(msecs) and self.read_pool.waitForDone(msecs)
+
+    def submit(self, pool, method, args, kwargs, on_result, on_error):
+        handle = QueryHandle(self)
+
+        def deliver(callback, value):
+            # Отмена могла произойти, пока сигнал шел в поток GUI
+            if handle.cancelled:
+                return
+            self.forget(handle)
+            if callback is not None:
+                callback(value)
+
+        handle.finished.connect(lambda result: deliver(on_result, result))
+        handle.failed.connect(lambda error: deliver(on_error, error))
+        pool.start(QueryTask(self.connections, handle, method, args, kwargs))
+        return handle
+
+    def forget(self, handle):
+        if handle in self.reads:
+            self.reads.discard(handle)
+        handle.deleteLater()
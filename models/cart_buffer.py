@@ -0,0 +1,296 @@
+"""Корзина пользователя в памяти с отложенной записью в базу.
+
+Добавление и удаление товара меняют только строки в памяти: повторное добавление товара
+сливается с его строкой, сумма пересчитывается на месте, экран обновляется сигналом
+changed. В базу изменения уходят одним пакетом (Database.apply_cart_changes) по таймеру,
+перед оформлением заказа и при выходе.
+
+Пока пакет не записан, каждое изменение дописывается строкой в журнал рядом с базой.
+Это буферизованная запись в кэш ОС без fsync, поэтому клик не ждет диска, а изменения
+переживают падение приложения: при следующем входе пользователя журнал применяется до
+чтения корзины (если база не ответила - повторно, пока не получится; так же повторяется
+чтение корзины). В пакете и в журнале
+количество задается целиком, поэтому повтор уже записанных изменений безопасен. Строки
+журнала пронумерованы, и заказ сохраняет номер последней строки, которую он оформил:
+после падения между заказом и очисткой журнала оформленные товары в корзину не вернутся.
+"""
+import json
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+from models.rows import CartLine
+
+# Через сколько миллисекунд после первого несохраненного изменения пакет уходит в базу
+CART_FLUSH_MS = 2000
+
+
+def journal_path(db_path, user_id):
+    """Журнал несохраненных изменений корзины пользователя рядом с файлом базы"""
+    return str(Path(db_path).with_suffix(f'.cart-{user_id}.journal'))
+
+
+def read_journal(path):
+    """Номер журнала и последнее количество каждого товара в нем:
+    (номер, {product_id: (количество, номер строки)}).
+
+    Первая строка журнала - его номер, следующие - [product_id, количество, номер строки].
+    В журнале прежней версии номеров нет (номер журнала None). Строка, оборванная падением
+    на середине записи, пропускается.
+    """
+    journal = None
+    changes = {}
+    try:
+        with open(path, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                    if isinstance(entry, str):
+                        journal = entry
+                        continue
+                    product_id, quantity, *seq = entry
+                except (ValueError, TypeError):
+                    continue
+                changes[product_id] = (quantity, seq[0] if seq else 0)
+    except FileNotFoundError:
+        pass
+    return journal, changes
+
+
+class CartBuffer(QObject):
+    """Корзина пользователя в памяти, см. описание модуля.
+
+    lines - строки CartLine по product_id в порядке добавления (у новой строки id нет, пока
+    она не записана). Сигналы: loaded - корзина прочитана из базы, changed(product_id) -
+    строка изменилась или удалена, cleared - оформленные строки убраны после заказа,
+    shortage(название, доступно) - при записи товара не хватило и строка уменьшена,
+    failed(ошибка) - пакет не записан и будет отправлен снова со следующим (журнал прошлого
+    сеанса и чтение корзины - снова через flush_ms).
+    """
+
+    loaded = pyqtSignal()
+    changed = pyqtSignal(int)
+    cleared = pyqtSignal()
+    shortage = pyqtSignal(str, int)
+    failed = pyqtSignal(object)
+
+    def __init__(self, async_db, db_path, user_id, flush_ms=CART_FLUSH_MS, parent=None):
+        super().__init__(parent)
+        self.async_db = async_db
+        self.user_id = user_id
+        self.lines = OrderedDict()
+        self.ready = False
+        self.closed = False
+        # Изменения, еще не отправленные в базу, и число пакетов, которые пишутся сейчас
+        self.dirty = {}
+        self.flushing = 0
+        # Счетчик изменений (не сбрасывается вместе с журналом), номер последнего изменения
+        # каждой строки и значение счетчика в момент оформления заказа
+        self.version = 0
+        self.versions = {}
+        self.ordered_version = None
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(flush_ms)
+        self.timer.timeout.connect(self.flush)
+        self.retry = QTimer(self)
+        self.retry.setSingleShot(True)
+        self.retry.setInterval(flush_ms)
+        self.retry.timeout.connect(self.resume)
+
+        self.journal_path = journal_path(db_path, user_id)
+        # Номер текущего журнала и номер последней строки в нем
+        self.journal_id = None
+        self.seq = 0
+        self.recovered_journal, self.recovered = read_journal(self.journal_path)
+        self.journal = open(self.journal_path, 'a', encoding='utf-8')
+        if self.recovered:
+            # Изменения прошлого сеанса, не дошедшие до базы, записываются до чтения корзины
+            self.replay()
+        else:
+            self.start_journal()
+            self.load()
+
+    def start_journal(self):
+        """Очищает журнал и начинает его под новым номером"""
+        self.journal.truncate(0)
+        self.journal_id = uuid.uuid4().hex
+        self.seq = 0
+        self.journal.write(json.dumps(self.journal_id) + '\n')
+        self.journal.flush()
+
+    def resume(self):
+        """Повторяет то, что не удалось при входе: запись журнала или чтение корзины"""
+        if self.recovered:
+            self.replay()
+        else:
+            self.load()
+
+    def replay(self):
+        """Записывает в базу изменения из журнала прошлого сеанса"""
+        if self.closed:
+            return
+        if self.recovered_journal is None:
+            changes = [(product_id, quantity) for product_id, (quantity, _) in self.recovered.items()]
+        else:
+            changes = [(product_id, quantity, seq) for product_id, (quantity, seq) in self.recovered.items()]
+        self.flushing += 1
+        self.async_db.write('apply_cart_changes', self.user_id, changes, self.recovered_journal,
+                            on_result=self.on_replayed, on_error=self.on_replay_failed)
+
+    def on_replayed(self, shortages):
+        self.flushing -= 1
+        self.recovered = {}
+        for _, name, available in shortages:
+            self.shortage.emit(name, available)
+        self.settle()
+        if not self.closed:
+            self.load()
+
+    def on_replay_failed(self, error):
+        # Журнал остается на диске, и он применяется снова; товары, добавленные до чтения
+        # корзины, хранятся в lines и прибавятся к ней после чтения (on_loaded)
+        self.flushing -= 1
+        self.failed.emit(error)
+        if not self.closed:
+            self.retry.start()
+        self.settle()
+
+    def load(self):
+        if self.closed:
+            return
+        self.async_db.read('get_cart_items', self.user_id, cancellable=False,
+                           on_result=self.on_loaded, on_error=self.on_load_failed)
+
+    def on_load_failed(self, error):
+        # Пока корзина не прочитана, изменения не журналируются, поэтому чтение повторяется
+        self.failed.emit(error)
+        if not self.closed:
+            self.retry.start()
+
+    def on_loaded(self, items):
+        # Товары, добавленные, пока корзина читалась, прибавляются к строкам из базы
+        early = self.lines
+        self.lines = OrderedDict((item.product_id, item) for item in items)
+        self.ready = True
+        for line in early.values():
+            saved = self.lines.get(line.product_id)
+            self.put(line.product_id, line.name, line.price, line.quantity + (saved.quantity if saved else 0))
+        self.loaded.emit()
+
+    def quantity(self, product_id):
+        line = self.lines.get(product_id)
+        return line.quantity if line else 0
+
+    def total(self):
+        return sum(line.total for line in self.lines.values())
+
+    def add(self, product, quantity):
+        """Добавляет quantity штук товара (Product) к его строке"""
+        self.put(product.id, product.name, product.price, self.quantity(product.id) + quantity)
+
+    def remove(self, product_id):
+        line = self.lines.get(product_id)
+        if line is not None:
+            self.put(product_id, line.name, line.price, 0)
+
+    def put(self, product_id, name, price, quantity):
+        """Задает количество товара в корзине (0 - удалить строку) и ставит его в запись"""
+        if quantity > 0:
+            saved = self.lines.get(product_id)
+            self.lines[product_id] = CartLine(saved.id if saved else None, name, quantity, price,
+                                              quantity * price, product_id)
+        else:
+            self.lines.pop(product_id, None)
+        self.version += 1
+        self.versions[product_id] = self.version
+        if self.ready:
+            self.dirty[product_id] = quantity
+            self.seq += 1
+            self.journal.write(json.dumps([product_id, quantity, self.seq]) + '\n')
+            self.journal.flush()
+            if not self.timer.isActive():
+                self.timer.start()
+        self.changed.emit(product_id)
+
+    def flush(self):
+        """Отправляет несохраненные изменения в базу одним пакетом"""
+        self.timer.stop()
+        if not self.dirty:
+            return
+        batch, self.dirty = self.dirty, {}
+        self.write(batch)
+
+    def write(self, batch):
+        def done(shortages):
+            self.flushing -= 1
+            for product_id, name, available in shortages:
+                # Более новое изменение товара проверится следующим пакетом
+                line = self.lines.get(product_id)
+                if product_id not in self.dirty and line is not None:
+                    self.lines[product_id] = CartLine(line.id, line.name, available, line.price,
+                                                      available * line.price, product_id)
+                    if not available:
+                        del self.lines[product_id]
+                    self.changed.emit(product_id)
+                self.shortage.emit(name, available)
+            self.settle()
+
+        def failed(error):
+            self.flushing -= 1
+            # Журнал хранит пакет, пока он не записан; более новые изменения важнее
+            for product_id, quantity in batch.items():
+                self.dirty.setdefault(product_id, quantity)
+            self.failed.emit(error)
+            self.settle()
+
+        self.flushing += 1
+        self.async_db.write('apply_cart_changes', self.user_id, list(batch.items()),
+                            on_result=done, on_error=failed)
+
+    def checkout(self, on_result=None, on_error=None):
+        """Отправляет несохраненные изменения и оформляет заказ следующей записью.
+
+        Вместе с заказом сохраняется номер последней строки журнала: если приложение упадет
+        до очистки журнала, оформленные строки при восстановлении будут пропущены.
+        """
+        self.flush()
+        self.ordered_version = self.version
+        journal = (self.journal_id, self.seq) if self.journal_id is not None else None
+        self.async_db.write('checkout', self.user_id, journal, on_result=on_result, on_error=on_error)
+
+    def settle(self):
+        """Очищает журнал, когда все изменения в базе; после close() закрывает его"""
+        if self.flushing or self.journal is None:
+            return
+        if not self.dirty and not self.recovered:
+            self.start_journal()
+        if self.closed:
+            self.journal.close()
+            self.journal = None
+            self.deleteLater()
+
+    def clear_ordered(self):
+        """Убирает строки, вошедшие в оформленный заказ.
+
+        Строки, измененные после checkout(), остаются, даже если их пакет уже записан:
+        он записан после заказа, и товар снова в корзине в базе. Остаются и строки, пакет
+        которых не записался до заказа (они снова в dirty).
+        """
+        if self.ordered_version is None:
+            return
+        for product_id in list(self.lines):
+            if self.versions.get(product_id, 0) <= self.ordered_version and product_id not in self.dirty:
+                del self.lines[product_id]
+                self.versions.pop(product_id, None)
+        self.cleared.emit()
+
+    def close(self):
+        """Отправляет несохраненные изменения и закрывает журнал, когда они записаны"""
+        self.retry.stop()
+        self.flush()
+        self.closed = True
+        self.settle()
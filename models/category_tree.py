@@ -0,0 +1,107 @@
+from models.rows import Category
+
+
+class CategoryTree:
+    """Неизменяемое дерево категорий.
+
+    Строится один раз по таблице categories. Для каждой категории заранее считаются
+    множество id всего поддерева и интервал обхода в глубину, поэтому подкатегории,
+    хлебные крошки и проверки вложенности не требуют запросов к БД.
+    """
+
+    def __init__(self, rows):
+        """rows - строки (id, name, parent_id) таблицы categories"""
+        names = {}
+        parents = {}
+        children = {None: []}
+        for cat_id, name, parent_id in sorted(rows):
+            names[cat_id] = name
+            parents[cat_id] = parent_id
+            children.setdefault(cat_id, [])
+        for cat_id, parent_id in parents.items():
+            # Категория с несуществующим родителем считается корневой
+            children[parent_id if parent_id in names else None].append(cat_id)
+
+        self._names = names
+        self._parents = parents
+        self._children = {cat_id: tuple(ids) for cat_id, ids in children.items()}
+        self._ranges = {}
+        self._subtrees = {}
+        self._depths = {}
+        self._order = []
+
+        # Итеративный обход в глубину: глубина дерева не ограничена стеком Python
+        counter = 0
+        stack = [(cat_id, 0, False) for cat_id in reversed(self._children[None])]
+        while stack:
+            cat_id, depth, visited = stack.pop()
+            if visited:
+                subtree = {cat_id}
+                for child_id in self._children[cat_id]:
+                    subtree |= self._subtrees[child_id]
+                self._subtrees[cat_id] = frozenset(subtree)
+                self._ranges[cat_id] = (self._ranges[cat_id][0], counter)
+                continue
+
+            self._ranges[cat_id] = (counter, None)
+            self._depths[cat_id] = depth
+            self._order.append(cat_id)
+            counter += 1
+            stack.append((cat_id, depth, True))
+            stack.extend((child_id, depth + 1, False) for child_id in reversed(self._children[cat_id]))
+
+    @classmethod
+    def load(cls, conn):
+        """Загружает дерево одним запросом"""
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, name, parent_id FROM categories")
+        return cls(cursor.fetchall())
+
+    def __contains__(self, category_id):
+        return category_id in self._names
+
+    def __len__(self):
+        return len(self._names)
+
+    def name(self, category_id):
+        return self._names[category_id]
+
+    def parent(self, category_id):
+        return self._parents[category_id]
+
+    def children(self, category_id=None):
+        """Подкатегории (Category); при category_id=None - корневые категории"""
+        return [Category(cat_id, self._names[cat_id], category_id) for cat_id in self._children.get(category_id, ())]
+
+    def path(self, category_id):
+        """Путь от корня до категории включительно (Category) - для хлебных крошек"""
+        path = []
+        while category_id in self._depths:
+            path.append(Category(category_id, self._names[category_id], self._parents[category_id]))
+            category_id = self._parents[category_id]
+        path.reverse()
+        return path
+
+    def depth(self, category_id):
+        return self._depths[category_id]
+
+    def subtree_ids(self, category_id):
+        """Множество id категории и всех ее потомков"""
+        return self._subtrees.get(category_id, frozenset())
+
+    def contains(self, ancestor_id, category_id):
+        """Входит ли category_id в поддерево ancestor_id (None - корень всего каталога)"""
+        if ancestor_id is None:
+            return category_id in self._names
+        if ancestor_id not in self._ranges or category_id not in self._ranges:
+            return False
+        start, end = self._ranges[ancestor_id]
+        return start <= self._ranges[category_id][0] < end
+
+    def rows(self):
+        """Строки (id, name, parent_id) в порядке обхода - из них дерево строится заново"""
+        return [(cat_id, self._names[cat_id], self._parents[cat_id]) for cat_id in self._order]
+
+    def walk(self):
+        """Все категории в порядке обхода в глубину: [(id, name, глубина)]"""
+        return [(cat_id, self._names[cat_id], self._depths[cat_id]) for cat_id in self._order]
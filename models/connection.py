@@ -0,0 +1,112 @@
+"""Соединения с файлом БД, с которым одновременно работают несколько копий приложения.
+
+SQLite допускает одного писателя, поэтому конкурирующие записи должны ждать, а не падать
+с "database is locked":
+
+- журнал WAL: читатели не блокируют писателя, писатель - читателей;
+- busy_timeout: SQLite сам ждет освобождения блокировки заданное время;
+- транзакции на запись начинаются с BEGIN IMMEDIATE, то есть берут блокировку сразу.
+  Отложенная транзакция, которая сначала читает, а потом пишет, при конкуренции получает
+  SQLITE_BUSY немедленно, без ожидания, и повторить ее внутри SQLite нельзя;
+- если блокировку не удалось взять и за busy_timeout, BEGIN повторяется с экспоненциальной
+  задержкой со случайным разбросом, чтобы ждущие процессы не просыпались одновременно.
+
+Время ожидания задается аргументом или переменной окружения ESHOP_BUSY_TIMEOUT_MS.
+"""
+import os
+import random
+import sqlite3
+import time
+from contextlib import contextmanager
+
+BUSY_TIMEOUT_ENV = 'ESHOP_BUSY_TIMEOUT_MS'
+DEFAULT_BUSY_TIMEOUT_MS = 5000
+# Попыток взять блокировку на запись после истечения busy_timeout
+RETRY_ATTEMPTS = 6
+RETRY_BASE_DELAY = 0.05
+RETRY_MAX_DELAY = 2.0
+
+# Настройки каждого соединения: WAL-журнал, кэш страниц, отображение файла в память.
+# auto_vacuum идет первым: он действует, только пока файл базы пуст (WAL-журнал уже
+# записывает его заголовок), и позволяет возвращать системе место по частям
+CONNECTION_PRAGMAS = [
+    "PRAGMA auto_vacuum = INCREMENTAL",
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA mmap_size = 268435456",  # 256 МБ
+    "PRAGMA cache_size = -65536",  # 64 МБ
+    "PRAGMA temp_store = MEMORY",
+]
+
+SQLITE_BUSY = 5
+SQLITE_LOCKED = 6
+
+
+def is_busy(error):
+    """Ошибка означает, что база занята другим соединением"""
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is not None:
+        # Расширенные коды (SQLITE_BUSY_SNAPSHOT и т.п.) в младшем байте содержат основной
+        return code & 0xff in (SQLITE_BUSY, SQLITE_LOCKED)
+    message = str(error)
+    return 'locked' in message or 'busy' in message
+
+
+def default_busy_timeout():
+    value = os.environ.get(BUSY_TIMEOUT_ENV)
+    return int(value) if value else DEFAULT_BUSY_TIMEOUT_MS
+
+
+class ConnectionManager:
+    """Открывает соединения с файлом БД и выполняет в них транзакции на запись"""
+
+    def __init__(self, db_path, busy_timeout_ms=None, attempts=RETRY_ATTEMPTS,
+                 base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+        self.db_path = db_path
+        self.busy_timeout_ms = default_busy_timeout() if busy_timeout_ms is None else busy_timeout_ms
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # Сколько раз пришлось повторять из-за занятой базы
+        self.retried = 0
+
+    def open(self):
+        # timeout модуля sqlite3 - это busy_timeout соединения, он действует и на PRAGMA ниже
+        conn = sqlite3.connect(str(self.db_path), timeout=self.busy_timeout_ms / 1000)
+        cursor = conn.cursor()
+        for pragma in CONNECTION_PRAGMAS:
+            cursor.execute(pragma)
+        return conn
+
+    def delay(self, attempt):
+        """Задержка перед повтором: половина - гарантированное ожидание, половина - разброс"""
+        ceiling = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return random.uniform(ceiling / 2, ceiling)
+
+    def retry(self, operation):
+        """Выполняет operation(), повторяя ее, пока база занята"""
+        for attempt in range(self.attempts):
+            try:
+                return operation()
+            except sqlite3.OperationalError as error:
+                if not is_busy(error) or attempt == self.attempts - 1:
+                    raise
+                self.retried += 1
+                time.sleep(self.delay(attempt))
+
+    @contextmanager
+    def transaction(self, conn):
+        """Транзакция на запись: BEGIN IMMEDIATE, по выходу COMMIT, при исключении ROLLBACK.
+
+        Повторяются только BEGIN и COMMIT, тело блока выполняется один раз: с блокировкой
+        на запись, взятой в BEGIN, операторы внутри транзакции занятой базы уже не встретят.
+        """
+        self.retry(lambda: conn.execute("BEGIN IMMEDIATE"))
+        try:
+            yield conn.cursor()
+            # Без WAL COMMIT ждет ухода читателей и тоже может получить SQLITE_BUSY;
+            # транзакция при этом остается открытой, и COMMIT можно повторить
+            self.retry(conn.commit)
+        except BaseException:
+            conn.rollback()
+            raise
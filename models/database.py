@@ -1,23 +1,394 @@
-import sqlite3
 import os
+import re
+import threading
+import time
 from pathlib import Path
+from models.category_tree import CategoryTree
+from models.connection import ConnectionManager
+from models import events
+from models.read_cache import ReadCache
+from models.rows import CartLine, KeyedCursor, Order, OrderLine, Product, SellerProduct, User, keyed_factory
+from utils.passwords import hash_password
 from utils.paths import resource_path
 
+# Допустимые ключи сортировки товаров для постраничной выборки
+PRODUCT_SORT_KEYS = ('id', 'price', 'name', 'created_at')
+# Индексы, по которым страница товаров идет прямо в порядке сортировки, проверяя категорию
+# и цену в самом индексе (None - обход таблицы в порядке id), и индексы поиска по категории
+PRODUCT_WALK_INDEXES = {'id': None, 'price': 'idx_products_price_category',
+                        'name': 'idx_products_name_category_price',
+                        'created_at': 'idx_products_created_category_price'}
+# Ключи сортировки таблицы товаров продавца и индексы (seller_id, ключ, id), по которым страница
+# идет прямо в порядке сортировки. Индекс указывается явно: без статистики по новым индексам
+# планировщик выбирает любой индекс по seller_id и сортирует все товары продавца
+SELLER_SORT_INDEXES = {'id': 'idx_products_seller', 'name': 'idx_products_seller_name',
+                       'price': 'idx_products_seller_price'}
+PRODUCT_CATEGORY_INDEXES = {'id': 'idx_products_category', 'price': 'idx_products_category_price',
+                            'name': 'idx_products_category_name', 'created_at': 'idx_products_category_created'}
+# С какого числа подходящих товаров страницу выгоднее набирать обходом в порядке сортировки,
+# чем выбирать все подходящие и сортировать
+PRODUCT_WALK_THRESHOLD = 5000
+# Столбцы товара, которые можно выбрать в списках (columns=...); id выбирается всегда
+PRODUCT_COLUMNS = ('id', 'name', 'price', 'description', 'image_path')
+# Сколько первых совпадений поиска ранжируется: время запроса не растет с числом совпадений
+SEARCH_CANDIDATES = 1000
+# Вес совпадения в названии относительно совпадения в описании при ранжировании поиска
+SEARCH_NAME_WEIGHT = 10
+# Последнее слово запроса короче этого ищется целиком: префиксы из одной буквы не входят в
+# префиксный индекс, и FTS5 собрал бы в памяти совпадения всех слов на эту букву
+SEARCH_MIN_PREFIX = 2
+
+# Деревья категорий, общие для всех соединений процесса с одним файлом БД
+_category_trees = {}
+_category_trees_lock = threading.Lock()
+# Кэши чтений товаров, пользователей и рекомендаций, тоже общие для соединений с одним файлом
+_read_caches = {}
+_read_caches_lock = threading.Lock()
+
+# Тестовый продавец начальных данных (initialize_data) - владелец их товаров
+SEED_SELLER_PHONE = '+79161234567'
+# Первый продавец: ему отдаются товары без продавца
+FIRST_SELLER = "(SELECT MIN(id) FROM users WHERE role = 'Продавец')"
+
+# Статус корзины в исходной схеме, где корзина хранилась в orders
+CART_STATUS = 'В корзине'
+# Статус нового заказа
+ORDERED_STATUS = 'Оформлен'
+# Сколько секунд строка корзины держит резерв товара с ограниченным остатком
+RESERVATION_TTL = 15 * 60
+
+# Сколько заказов пересчитывается в сводки продаж за одну транзакцию дозаполнения
+SALES_BACKFILL_BATCH = 5000
+# Соседей "покупают вместе" хранится на товар и показывается на странице товара
+RECOMMENDATIONS_STORED = 20
+RECOMMENDATIONS_SHOWN = 5
+
+# Архив заказов: оформленные заказы старше ARCHIVE_AFTER_DAYS дней переносятся в отдельный
+# файл рядом с базой (database.archive.db), который подключается (ATTACH) только по требованию
+ARCHIVE_AFTER_DAYS = 180
+# Статусы, в которых заказ больше не меняется; других статусов у заказов пока нет
+ARCHIVE_STATUSES = (ORDERED_STATUS,)
+# Сколько заказов переносится в архив за одну транзакцию
+ARCHIVE_BATCH = 1000
+# Сколько свободных страниц горячей базы возвращается системе за одну транзакцию
+VACUUM_PAGES = 2000
+# PRAGMA auto_vacuum: свободные страницы возвращаются по запросу (PRAGMA incremental_vacuum)
+AUTO_VACUUM_INCREMENTAL = 2
+
+# Таблицы архива повторяют orders и order_items горячей базы; номер заказа сохраняется
+ARCHIVE_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS archive.orders
+       (
+           id         INTEGER PRIMARY KEY,
+           user_id    INTEGER NOT NULL,
+           status     TEXT    NOT NULL,
+           total      REAL    NOT NULL,
+           created_at TIMESTAMP
+       )''',
+    '''CREATE TABLE IF NOT EXISTS archive.order_items
+       (
+           order_id    INTEGER NOT NULL,
+           product_id  INTEGER NOT NULL,
+           quantity    INTEGER NOT NULL,
+           price       REAL    NOT NULL,
+           total_price REAL    NOT NULL
+       )''',
+    "CREATE INDEX IF NOT EXISTS archive.idx_orders_user_created ON orders (user_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS archive.idx_order_items_order ON order_items (order_id)",
+]
+
+# Таблица рекомендаций: для каждого товара не больше RECOMMENDATIONS_STORED соседей с числом
+# заказов, где они куплены вместе. Полная пересборка (models.recommendations) пишет новую
+# таблицу под другим именем и подменяет ею текущую
+RECOMMENDATIONS_TABLE = '''CREATE TABLE {name}
+                           (
+                               product_id   INTEGER NOT NULL,
+                               neighbour_id INTEGER NOT NULL,
+                               score        INTEGER NOT NULL,
+                               PRIMARY KEY (product_id, neighbour_id)
+                           ) WITHOUT ROWID'''
+
+# Ставит на дозаполнение сводок продаж все заказы, если они есть
+SALES_BACKFILL_ALL_ORDERS = '''INSERT INTO sales_backfill (id, next_order_id, last_order_id)
+                               SELECT 1, (SELECT MIN(id) FROM orders), (SELECT MAX(id) FROM orders)
+                               WHERE (SELECT MAX(id) FROM orders) IS NOT NULL'''
+
+# Сколько товара зарезервировано в чужих корзинах: (product_id, now, user_id)
+RESERVED_BY_OTHERS = '''SELECT COALESCE(SUM(quantity), 0)
+                         FROM reservations
+                         WHERE product_id = ? AND expires_at > ? AND user_id <> ?'''
+
+# Версионированные изменения схемы: (версия, инструкции).
+# Текущая версия хранится в PRAGMA user_version; новые версии только дописываются в конец.
+SCHEMA_MIGRATIONS = [
+    (1, [
+        "CREATE INDEX IF NOT EXISTS idx_categories_parent ON categories (parent_id)",
+        "CREATE INDEX IF NOT EXISTS idx_products_category ON products (category_id)",
+        "CREATE INDEX IF NOT EXISTS idx_products_category_price ON products (category_id, price)",
+        "CREATE INDEX IF NOT EXISTS idx_products_category_name ON products (category_id, name)",
+        "CREATE INDEX IF NOT EXISTS idx_products_category_created ON products (category_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_products_price ON products (price)",
+        "CREATE INDEX IF NOT EXISTS idx_products_created ON products (created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_orders_user_status ON orders (user_id, status, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_orders_product ON orders (product_id)",
+    ]),
+    (2, [
+        # Размеры сохраненного изображения товара
+        "ALTER TABLE products ADD COLUMN image_width INTEGER",
+        "ALTER TABLE products ADD COLUMN image_height INTEGER",
+    ]),
+    (3, [
+        # Полнотекстовый индекс по названию и описанию товаров, синхронизируемый триггерами
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+               name, description,
+               content='products', content_rowid='id',
+               tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+           )''',
+        # Совпадение в названии весит в 10 раз больше, чем в описании
+        "INSERT INTO products_fts (products_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0)')",
+        '''CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+               INSERT INTO products_fts (rowid, name, description) VALUES (new.id, new.name, new.description);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+               INSERT INTO products_fts (products_fts, rowid, name, description)
+               VALUES ('delete', old.id, old.name, old.description);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE OF name, description ON products BEGIN
+               INSERT INTO products_fts (products_fts, rowid, name, description)
+               VALUES ('delete', old.id, old.name, old.description);
+               INSERT INTO products_fts (rowid, name, description) VALUES (new.id, new.name, new.description);
+           END''',
+        "INSERT INTO products_fts (products_fts) VALUES ('rebuild')",
+    ]),
+    (4, [
+        # Корзина, заказы и позиции заказов в отдельных таблицах вместо строк orders по статусам
+        "ALTER TABLE orders RENAME TO orders_legacy",
+        '''CREATE TABLE carts
+           (
+               id         INTEGER PRIMARY KEY AUTOINCREMENT,
+               user_id    INTEGER NOT NULL REFERENCES users (id),
+               product_id INTEGER NOT NULL REFERENCES products (id),
+               quantity   INTEGER NOT NULL CHECK (quantity > 0),
+               created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+               UNIQUE (user_id, product_id)
+           )''',
+        '''CREATE TABLE orders
+           (
+               id         INTEGER PRIMARY KEY AUTOINCREMENT,
+               user_id    INTEGER NOT NULL REFERENCES users (id),
+               status     TEXT    NOT NULL DEFAULT 'Оформлен',
+               total      REAL    NOT NULL CHECK (total >= 0),
+               created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+           )''',
+        '''CREATE TABLE order_items
+           (
+               order_id    INTEGER NOT NULL REFERENCES orders (id),
+               product_id  INTEGER NOT NULL REFERENCES products (id),
+               quantity    INTEGER NOT NULL CHECK (quantity > 0),
+               price       REAL    NOT NULL CHECK (price >= 0),
+               total_price REAL    NOT NULL CHECK (total_price >= 0)
+           )''',
+        # Перенос корзин: повторные строки одного товара сливаются
+        '''INSERT INTO carts (user_id, product_id, quantity, created_at)
+           SELECT user_id, product_id, SUM(quantity), MIN(created_at)
+           FROM orders_legacy
+           WHERE status = 'В корзине'
+           GROUP BY user_id, product_id''',
+        # Заказом в старой схеме были строки одного оформления; номер заказа сохраняется
+        '''INSERT INTO orders (id, user_id, status, total, created_at)
+           SELECT MIN(id), user_id, status, SUM(total_price), created_at
+           FROM orders_legacy
+           WHERE status <> 'В корзине'
+           GROUP BY user_id, status, created_at''',
+        '''INSERT INTO order_items (order_id, product_id, quantity, price, total_price)
+           SELECT o.id, l.product_id, l.quantity, l.total_price / l.quantity, l.total_price
+           FROM orders_legacy l
+                    JOIN orders o ON o.user_id = l.user_id AND o.status = l.status AND o.created_at = l.created_at
+           WHERE l.status <> 'В корзине'
+           ORDER BY l.id''',
+        "DROP TABLE orders_legacy",
+        "CREATE INDEX idx_orders_user_created ON orders (user_id, created_at)",
+        "CREATE INDEX idx_order_items_order ON order_items (order_id)",
+        "CREATE INDEX idx_order_items_product ON order_items (product_id)",
+    ]),
+    (5, [
+        # Остаток на складе; NULL - количество не ограничено, как у товаров до учета остатков
+        "ALTER TABLE products ADD COLUMN stock INTEGER CHECK (stock IS NULL OR stock >= 0)",
+        # Резерв товара строкой корзины до expires_at (Unix-время в секундах)
+        '''CREATE TABLE reservations
+           (
+               cart_item_id INTEGER PRIMARY KEY,
+               user_id      INTEGER NOT NULL,
+               product_id   INTEGER NOT NULL,
+               quantity     INTEGER NOT NULL CHECK (quantity > 0),
+               expires_at   REAL    NOT NULL
+           )''',
+        "CREATE INDEX idx_reservations_product ON reservations (product_id, expires_at, user_id, quantity)",
+        "CREATE INDEX idx_reservations_expires ON reservations (expires_at)",
+    ]),
+    (6, [
+        # Продавец товара; товары, добавленные до учета продавцов, отдаются первому продавцу
+        "ALTER TABLE products ADD COLUMN seller_id INTEGER",
+        "UPDATE products SET seller_id = (SELECT MIN(id) FROM users WHERE role = 'Продавец')",
+        "CREATE INDEX idx_products_seller ON products (seller_id)",
+        # Сводки продаж по дням (UTC-дата оформления заказа): по товарам и по категориям продавца.
+        # Пополняются триггером при каждой позиции заказа, поэтому экран аналитики читает
+        # O(дней x товаров) строк, а не всю историю заказов
+        '''CREATE TABLE sales_daily_products
+           (
+               product_id INTEGER NOT NULL,
+               day        TEXT    NOT NULL,
+               quantity   INTEGER NOT NULL,
+               revenue    REAL    NOT NULL,
+               orders     INTEGER NOT NULL,
+               PRIMARY KEY (product_id, day)
+           ) WITHOUT ROWID''',
+        '''CREATE TABLE sales_daily_categories
+           (
+               seller_id   INTEGER NOT NULL,
+               category_id INTEGER NOT NULL,
+               day         TEXT    NOT NULL,
+               quantity    INTEGER NOT NULL,
+               revenue     REAL    NOT NULL,
+               PRIMARY KEY (seller_id, category_id, day)
+           ) WITHOUT ROWID''',
+        '''CREATE TRIGGER order_items_sales_daily
+               AFTER INSERT
+               ON order_items
+           BEGIN
+               INSERT INTO sales_daily_products (product_id, day, quantity, revenue, orders)
+               SELECT NEW.product_id, date(o.created_at), NEW.quantity, NEW.total_price, 1
+               FROM orders o
+               WHERE o.id = NEW.order_id
+               ON CONFLICT (product_id, day) DO UPDATE SET quantity = quantity + excluded.quantity,
+                                                           revenue  = revenue + excluded.revenue,
+                                                           orders   = orders + 1;
+               INSERT INTO sales_daily_categories (seller_id, category_id, day, quantity, revenue)
+               SELECT COALESCE(p.seller_id, 0), p.category_id, date(o.created_at), NEW.quantity, NEW.total_price
+               FROM orders o,
+                    products p
+               WHERE o.id = NEW.order_id
+                 AND p.id = NEW.product_id
+               ON CONFLICT (seller_id, category_id, day) DO UPDATE SET quantity = quantity + excluded.quantity,
+                                                                       revenue  = revenue + excluded.revenue;
+           END''',
+        # Заказы, оформленные до появления триггера, досчитываются пакетами (backfill_sales_summary):
+        # единственная строка хранит следующий и последний номер заказа, после дозаполнения удаляется
+        '''CREATE TABLE sales_backfill
+           (
+               id            INTEGER PRIMARY KEY CHECK (id = 1),
+               next_order_id INTEGER NOT NULL,
+               last_order_id INTEGER NOT NULL
+           )''',
+        SALES_BACKFILL_ALL_ORDERS,
+    ]),
+    (7, [
+        RECOMMENDATIONS_TABLE.format(name='product_recommendations'),
+    ]),
+    (8, [
+        # Фильтры каталога: индексы порядков сортировки (ключ, id) несут категорию и цену, чтобы
+        # страница с фильтром набиралась обходом индекса без чтения отброшенных строк.
+        # (category_id, price) уже есть - rowid в нем последний ключ, то есть это (category_id, price, id)
+        "DROP INDEX IF EXISTS idx_products_price",
+        "DROP INDEX IF EXISTS idx_products_created",
+        "CREATE INDEX idx_products_price_category ON products (price, id, category_id)",
+        "CREATE INDEX idx_products_name_category_price ON products (name, id, category_id, price)",
+        "CREATE INDEX idx_products_created_category_price ON products (created_at, id, category_id, price)",
+    ]),
+    (9, [
+        # Отбор старых заказов для переноса в архив
+        "CREATE INDEX idx_orders_created_status ON orders (created_at, status)",
+    ]),
+    (10, [
+        # Таблица товаров продавца по страницам в порядке цены и названия; порядок id дает
+        # idx_products_seller, в котором rowid - последний ключ
+        "CREATE INDEX idx_products_seller_price ON products (seller_id, price)",
+        "CREATE INDEX idx_products_seller_name ON products (seller_id, name)",
+    ]),
+    (11, [
+        # Товары без продавца (начальные данные и импорт до появления продавца в них) отдаются
+        # первому продавцу вместе с их продажами по категориям, учтенными за продавцом 0
+        f"UPDATE products SET seller_id = {FIRST_SELLER} WHERE seller_id IS NULL",
+        f'''INSERT INTO sales_daily_categories (seller_id, category_id, day, quantity, revenue)
+            SELECT {FIRST_SELLER}, category_id, day, quantity, revenue
+            FROM sales_daily_categories
+            WHERE seller_id = 0
+              AND {FIRST_SELLER} IS NOT NULL
+            ON CONFLICT (seller_id, category_id, day) DO UPDATE SET quantity = quantity + excluded.quantity,
+                                                                    revenue  = revenue + excluded.revenue''',
+        f"DELETE FROM sales_daily_categories WHERE seller_id = 0 AND {FIRST_SELLER} IS NOT NULL",
+    ]),
+    (12, [
+        # Последняя строка журнала корзины (CartBuffer), вошедшая в оформленный заказ: пишется
+        # в транзакции заказа, и при восстановлении журнала после падения строки до нее пропускаются
+        '''CREATE TABLE cart_checkouts
+           (
+               user_id INTEGER PRIMARY KEY,
+               journal TEXT    NOT NULL,
+               seq     INTEGER NOT NULL
+           )''',
+    ]),
+]
+# Версия схемы, которую создает текущий код
+SCHEMA_VERSION = SCHEMA_MIGRATIONS[-1][0]
+
+
+def _product_columns(columns=None, table=''):
+    """Список выборки для Product: невыбранные столбцы и остаток заменяются NULL"""
+    if columns is None:
+        columns = PRODUCT_COLUMNS
+    unknown = set(columns).difference(PRODUCT_COLUMNS)
+    if unknown:
+        raise ValueError(f"Неизвестные столбцы товара: {', '.join(sorted(unknown))}")
+    selected = [f"{table}{name}" if name == 'id' or name in columns else 'NULL' for name in PRODUCT_COLUMNS]
+    return ', '.join(selected + ['NULL'])
+
+
+def _archived_only(schema, column):
+    """Условие для строк архива: заказ, оставшийся после сбоя архивации и в горячей базе,
+    читается только оттуда (в режиме WAL файлы базы и архива фиксируются по отдельности)"""
+    if schema == 'main':
+        return ''
+    return f" AND NOT EXISTS (SELECT 1 FROM main.orders h WHERE h.id = {column})"
+
+
+class OutOfStockError(Exception):
+    """Свободного остатка товара не хватает: он продан или зарезервирован в чужих корзинах"""
+
+    def __init__(self, name, available):
+        self.name = name
+        self.available = max(available, 0)
+        super().__init__(f"Товара «{name}» недостаточно на складе: доступно {self.available} шт.")
+
 
 class Database:
-    def __init__(self, db_path='data/database.db'):
+    def __init__(self, db_path='data/database.db', setup=True, busy_timeout_ms=None):
         self.db_path = resource_path(db_path)
+        self.archive_path = str(Path(self.db_path).with_suffix('.archive.db'))
+        self.connections = ConnectionManager(self.db_path, busy_timeout_ms)
         self.conn = None
-        self.connect()
+        self.archive_attached = False
+        with _read_caches_lock:
+            self.cache = _read_caches.setdefault(self.db_path, ReadCache())
+        self.connect(setup)
+
+    def connect(self, setup=True):
+        """Создает все необходимые папки для БД; setup=False пропускает проверку схемы.
 
-    def connect(self):
-        """Создает все необходимые папки для БД"""
+        Если схема уже последней версии, DDL не выполняется вовсе. Начальные данные
+        не добавляются - для этого есть python -m models.seed.
+        """
         abs_path = Path(self.db_path)
         os.makedirs(abs_path.parent, exist_ok=True)  # Создаем папку data если нет
 
-        self.conn = sqlite3.connect(str(abs_path))
-        self.create_tables()
-        self.initialize_data()
+        self.conn = self.connections.open()
+        self.archive_attached = False
+        if setup and self.schema_version() < SCHEMA_VERSION:
+            self.create_tables()
+
+    def transaction(self):
+        """Транзакция на запись (BEGIN IMMEDIATE) с повтором, пока база занята другой копией приложения"""
+        return self.connections.transaction(self.conn)
 
     def create_tables(self):
         """Создает все необходимые таблицы"""
@@ -173,19 +544,42 @@ class Database:
                        ''')
 
         self.conn.commit()
+        self.apply_migrations()
 
-    def initialize_data(self):
-        """Заполняет БД начальными данными"""
+    def schema_version(self):
         cursor = self.conn.cursor()
+        cursor.execute("PRAGMA user_version")
+        return cursor.fetchone()[0]
+
+    def apply_migrations(self):
+        """Применяет недостающие версии схемы, каждую в отдельной транзакции"""
+        version = self.schema_version()
+
+        for target, statements in SCHEMA_MIGRATIONS:
+            if target <= version:
+                continue
+            with self.transaction() as cursor:
+                # Пока ждали блокировку, эту версию могла применить другая копия приложения
+                if self.schema_version() >= target:
+                    continue
+                for statement in statements:
+                    cursor.execute(statement)
+                cursor.execute(f"PRAGMA user_version = {target}")
+
+    def initialize_data(self):
+        """Заполняет пустую БД начальными данными; в непустой ничего не делает"""
+        with self.transaction() as cursor:
+            # Проверяем, есть ли уже данные
+            cursor.execute("SELECT 1 FROM users LIMIT 1")
+            if cursor.fetchone() is not None:
+                return
 
-        # Проверяем, есть ли уже данные
-        cursor.execute("SELECT COUNT(*) FROM users")
-        if cursor.fetchone()[0] == 0:
             # Добавляем тестового пользователя
             cursor.execute(
                 "INSERT INTO users (phone, password, role, name) VALUES (?, ?, ?, ?)",
-                ('+79161234567', 'password123', 'Продавец', 'Иван Иванов')
+                (SEED_SELLER_PHONE, hash_password('password123'), 'Продавец', 'Иван Иванов')
             )
+            seller_id = cursor.lastrowid
 
             # Добавляем категории
             categories = [
@@ -211,8 +605,9 @@ class Database:
                 "INSERT INTO categories (name, parent_id) VALUES (?, ?)",
                 categories
             )
+            self.invalidate_category_tree()
 
-            # Добавляем тестовые товары
+            # Добавляем тестовые товары тестового продавца
             products = [
                 ('Куртка KL', 11235, 'Стильная куртка для холодной погоды', None, 5),
                 ('Шляпа MW', 799, 'Модная шляпа для любого сезона', None, 5),
@@ -226,26 +621,1078 @@ class Database:
             ]
 
             cursor.executemany(
-                "INSERT INTO products (name, price, description, image_path, category_id) VALUES (?, ?, ?, ?, ?)",
-                products
+                '''INSERT INTO products (name, price, description, image_path, category_id, seller_id)
+                   VALUES (?, ?, ?, ?, ?, ?)''',
+                [(*product, seller_id) for product in products]
             )
 
-            self.conn.commit()
+    def get_category_tree(self):
+        """Возвращает дерево категорий; оно читается из БД один раз на процесс"""
+        with _category_trees_lock:
+            tree = _category_trees.get(self.db_path)
+            if tree is None:
+                tree = CategoryTree.load(self.conn)
+                _category_trees[self.db_path] = tree
+            return tree
 
-import sys
-import os
+    def invalidate_category_tree(self):
+        """Сбрасывает дерево категорий после изменения таблицы categories"""
+        with _category_trees_lock:
+            _category_trees.pop(self.db_path, None)
+
+    def cache_stats(self):
+        """Счетчики кэша чтений (ReadCache.stats) для подбора его размера и времени жизни"""
+        return self.cache.stats()
+
+    def clear_cache(self):
+        """Сбрасывает кэш чтений, например после изменения базы в обход методов Database"""
+        self.cache.clear()
+
+    def get_categories(self, parent_id=None):
+        """Возвращает подкатегории указанной категории (корневые при parent_id=None)"""
+        return self.get_category_tree().children(parent_id)
+
+    def add_category(self, name, parent_id=None):
+        """Добавляет категорию"""
+        with self.transaction() as cursor:
+            cursor.execute("INSERT INTO categories (name, parent_id) VALUES (?, ?)", (name, parent_id))
+        self.invalidate_category_tree()
+        return cursor.lastrowid
+
+    def _category_filter(self, category_id, subtree=False):
+        """Условие WHERE и параметры для товаров категории (или всего ее поддерева)"""
+        if category_id is None:
+            return None, []
+        if not subtree:
+            return "category_id = ?", [category_id]
+
+        ids = sorted(self.get_category_tree().subtree_ids(category_id)) or [category_id]
+        if len(ids) == 1:
+            return "category_id = ?", ids
+        return f"category_id IN ({', '.join('?' * len(ids))})", ids
+
+    @staticmethod
+    def _price_filter(min_price=None, max_price=None, column='price'):
+        """Условия WHERE и параметры для диапазона цен; None - граница не задана"""
+        conditions = []
+        params = []
+        if min_price is not None and min_price == max_price:
+            return [f"{column} = ?"], [min_price]
+        if min_price is not None:
+            conditions.append(f"{column} >= ?")
+            params.append(min_price)
+        if max_price is not None:
+            conditions.append(f"{column} <= ?")
+            params.append(max_price)
+        return conditions, params
+
+    def get_products_page(self, category_id=None, sort='id', descending=False, cursor=None, limit=50,
+                          subtree=False, columns=None, min_price=None, max_price=None):
+        """Возвращает страницу товаров (Product) и курсор следующей страницы.
+
+        Курсор - пара (значение ключа сортировки, id) последней строки страницы,
+        поэтому выборка любой страницы стоит столько же, сколько выборка первой.
+        Когда страниц больше нет, вместо курсора возвращается None. Продолжение страницы
+        выбирается двумя частями: строки с тем же значением ключа после id курсора и строки
+        с большим значением. Условие ({sort}, id) > (?, ?) SQLite ищет в индексе только по
+        ключу и перебирает все строки с равным значением (например, десятки тысяч бесплатных
+        товаров); в каждой из частей поиск в индексе идет сразу к нужной строке.
+        При subtree=True выбираются товары категории и всех ее подкатегорий.
+        columns - выбираемые столбцы из PRODUCT_COLUMNS, остальные поля строк равны None.
+        min_price и max_price ограничивают цену включительно (min_price=max_price=0 - бесплатные).
+        """
+        if sort not in PRODUCT_SORT_KEYS:
+            raise ValueError(f"Неизвестный порядок сортировки: {sort}")
+
+        order = 'DESC' if descending else 'ASC'
+        conditions, params = self._price_filter(min_price, max_price)
+        category_condition, category_params = self._category_filter(category_id, subtree)
+        if category_condition:
+            conditions.append(category_condition)
+            params.extend(category_params)
+        index = self._products_page_index(sort, category_id, subtree, min_price, max_price, len(category_params))
+        select = f"SELECT {_product_columns(columns)}, {sort} FROM products{index}"
+        after = '<' if descending else '>'
+
+        def part(extra_conditions):
+            where = conditions + extra_conditions
+            return (select + (" WHERE " + " AND ".join(where) if where else "")
+                    + f" ORDER BY {sort} {order}, id {order} LIMIT ?")
+
+        if cursor is None or sort == 'id':
+            if cursor is not None:
+                conditions.append(f"id {after} ?")
+                params.append(cursor[1])
+            query = part([])
+            params.append(limit)
+        else:
+            # Ключ сортировки - последний столбец выборки, id - первый
+            key_column = len(PRODUCT_COLUMNS) + 2
+            query = (f"SELECT * FROM ({part([f'{sort} = ?', f'id {after} ?'])})"
+                     f" UNION ALL SELECT * FROM ({part([f'{sort} {after} ?'])})"
+                     f" ORDER BY {key_column} {order}, 1 {order} LIMIT ?")
+            params = params + [cursor[0], cursor[1], limit] + params + [cursor[0], limit, limit]
+
+        sql_cursor = self.conn.cursor(KeyedCursor)
+        sql_cursor.row_factory = keyed_factory(Product)
+        sql_cursor.execute(query, params)
+        rows = sql_cursor.fetchall()
+
+        next_cursor = (sql_cursor.key, rows[-1].id) if len(rows) == limit else None
+        return rows, next_cursor
+
+    def _products_page_index(self, sort, category_id, subtree, min_price, max_price, categories):
+        """Подсказка индекса для страницы товаров: " INDEXED BY ...", " NOT INDEXED" или "".
+
+        Для одной категории лучший план очевиден, весь каталог без цены всегда идет обходом
+        индекса сортировки. Для поддерева и для диапазона цен план зависит от числа подходящих
+        товаров: если их много, страница быстрее набирается обходом индекса сортировки, если
+        мало - поиском по категориям или цене с сортировкой найденного. Число считается не
+        дальше PRODUCT_WALK_THRESHOLD.
+        """
+        priced = min_price is not None or max_price is not None
+        if categories == 1:
+            return ""
+        exact = False
+        if categories or priced:
+            _, exact = self.estimate_product_count(category_id, PRODUCT_WALK_THRESHOLD, subtree, min_price,
+                                                   max_price)
+        if not exact:
+            walk = PRODUCT_WALK_INDEXES[sort]
+            return f" INDEXED BY {walk}" if walk else " NOT INDEXED"
+        if categories:
+            return f" INDEXED BY {'idx_products_category_price' if priced else PRODUCT_CATEGORY_INDEXES[sort]}"
+        return " INDEXED BY idx_products_price_category"
+
+    def iter_products(self, category_id=None, sort='id', descending=False, page_size=500, subtree=False,
+                      columns=None, min_price=None, max_price=None):
+        """Потоково перебирает товары категории, не загружая их все в память"""
+        cursor = None
+        while True:
+            rows, cursor = self.get_products_page(category_id, sort, descending, cursor, page_size, subtree,
+                                                  columns, min_price, max_price)
+            yield from rows
+            if cursor is None:
+                return
+
+    def estimate_product_count(self, category_id=None, cap=10000, subtree=False, min_price=None, max_price=None):
+        """Дешевая оценка числа товаров: возвращает (количество, точное ли оно).
+
+        Подсчет останавливается на cap строках, поэтому стоимость не растет с размером каталога.
+        """
+        cursor = self.conn.cursor()
+        conditions, params = self._price_filter(min_price, max_price)
+        condition, category_params = self._category_filter(category_id, subtree)
+        if condition:
+            conditions.append(condition)
+            params.extend(category_params)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        cursor.execute(f"SELECT COUNT(*) FROM (SELECT 1 FROM products{where} LIMIT ?)", params + [cap + 1])
+        count = cursor.fetchone()[0]
+        if count > cap:
+            return cap, False
+        return count, True
+
+    def search_products(self, query, limit=20, cursor=None, columns=None, min_price=None, max_price=None):
+        """Полнотекстовый поиск товаров по названию и описанию.
+
+        Законченные слова запроса ищутся целиком, последнее (его еще набирают) - как префикс
+        не короче SEARCH_MIN_PREFIX; префиксы из 2-3 букв читаются из префиксного индекса. Ранжируются только первые
+        SEARCH_CANDIDATES совпадений: по числу найденных слов в названии (с весом
+        SEARCH_NAME_WEIGHT) и в описании. bm25 для этого не подходит: перед ранжированием он
+        перебирает все документы с каждым словом запроса, и частое слово стоит десятки мс
+        на миллионе товаров. Возвращает (строки, курсор следующей страницы) так же, как
+        get_products_page; страницы листаются внутри тех же совпадений.
+        """
+        terms = re.findall(r'\w+', query)
+        if not terms:
+            return [], None
+        match = ' '.join(f'"{term}"' for term in terms)
+        if re.search(r'\w$', query) and len(terms[-1]) >= SEARCH_MIN_PREFIX:
+            match += '*'
+
+        sql = f'''
+              SELECT {_product_columns(columns, 'p.')}, m.score
+              FROM (SELECT id,
+                           -({SEARCH_NAME_WEIGHT} * (length(name_marks) - length(replace(name_marks, char(1), '')))
+                               + length(description_marks) - length(replace(description_marks, char(1), ''))) AS score
+                    FROM (SELECT f.rowid AS id,
+                                 highlight(products_fts, 0, char(1), '') AS name_marks,
+                                 highlight(products_fts, 1, char(1), '') AS description_marks
+                          FROM products_fts f
+                                   JOIN products p ON p.id = f.rowid
+                          WHERE products_fts MATCH ?'''
+        params = [match]
+        conditions, price_params = self._price_filter(min_price, max_price, 'p.price')
+        for condition in conditions:
+            sql += f" AND {condition}"
+        params.extend(price_params)
+        sql += """
+                          LIMIT ?)) m
+                       JOIN products p ON p.id = m.id"""
+        params.append(SEARCH_CANDIDATES)
+        if cursor is not None:
+            sql += " WHERE (m.score, m.id) > (?, ?)"
+            params.extend(cursor)
+        sql += " ORDER BY m.score, m.id LIMIT ?"
+        params.append(limit)
+
+        sql_cursor = self.conn.cursor(KeyedCursor)
+        sql_cursor.row_factory = keyed_factory(Product)
+        sql_cursor.execute(sql, params)
+        rows = sql_cursor.fetchall()
+
+        next_cursor = (sql_cursor.key, rows[-1].id) if len(rows) == limit else None
+        return rows, next_cursor
+
+    def get_category_facets(self, category_id=None, min_price=None, max_price=None):
+        """Число товаров в каждой подкатегории (с ее поддеревом) при заданном диапазоне цен.
+
+        Возвращает [(Category, количество)] в порядке tree.children(category_id). Товары
+        считаются одним запросом GROUP BY по всему поддереву, сумма по поддеревьям
+        подкатегорий - по дереву категорий в памяти.
+        """
+        tree = self.get_category_tree()
+        children = tree.children(category_id)
+        if not children:
+            return []
+        conditions, params = self._price_filter(min_price, max_price)
+        condition, category_params = self._category_filter(category_id, subtree=True)
+        if condition:
+            conditions.append(condition)
+            params.extend(category_params)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        cursor = self.conn.cursor()
+        cursor.execute(f"SELECT category_id, COUNT(*) FROM products{where} GROUP BY category_id", params)
+        counts = dict(cursor.fetchall())
+        return [(child, sum(counts.get(cat_id, 0) for cat_id in tree.subtree_ids(child.id))) for child in children]
+
+    def get_user(self, phone):
+        """Возвращает пользователя (User) по телефону или None; читается через кэш"""
+        def load():
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT id, phone, password, role, name FROM users WHERE phone = ?", (phone,))
+            return cursor.fetchone()
+
+        # В кэше хранится кортеж: вызывающий получает свой объект и может его менять
+        row = self.cache.get(('user', phone), load)
+        return User(*row) if row is not None else None
+
+    def add_user(self, name, phone, password, role):
+        """Регистрирует пользователя; пароль сохраняется хэшем scrypt"""
+        # Хэш считается до транзакции, чтобы не держать блокировку базы на время scrypt
+        password = hash_password(password)
+        with self.transaction() as cursor:
+            cursor.execute(
+                "INSERT INTO users (phone, password, role, name) VALUES (?, ?, ?, ?)",
+                (phone, password, role, name)
+            )
+        self.cache.invalidate(('user', phone))
+        return cursor.lastrowid
+
+    def update_user(self, user_id, name, phone, password=None):
+        """Обновляет профиль; пустой пароль оставляет прежний"""
+        if password:
+            password = hash_password(password)
+        with self.transaction() as cursor:
+            cursor.execute("SELECT phone FROM users WHERE id = ?", (user_id,))
+            old_phones = cursor.fetchall()
+            if password:
+                cursor.execute(
+                    "UPDATE users SET name = ?, phone = ?, password = ? WHERE id = ?",
+                    (name, phone, password, user_id)
+                )
+            else:
+                cursor.execute("UPDATE users SET name = ?, phone = ? WHERE id = ?", (name, phone, user_id))
+        self.cache.invalidate(('user', phone), *(('user', old_phone) for (old_phone,) in old_phones))
+
+    def rehash_password(self, user_id, stored, new_hash):
+        """Заменяет хранимый пароль stored новым хэшем (после входа по старому хэшу или
+        открытому тексту). Если пароль успели сменить, ничего не делает; возвращает True,
+        если хэш заменен"""
+        with self.transaction() as cursor:
+            cursor.execute("UPDATE users SET password = ? WHERE id = ? AND password = ? RETURNING phone",
+                           (new_hash, user_id, stored))
+            rows = cursor.fetchall()
+        self.cache.invalidate(*(('user', phone) for (phone,) in rows))
+        return bool(rows)
+
+    def get_product(self, product_id):
+        """Возвращает товар (Product) или None.
+
+        available - остаток за вычетом действующих резервов, None - количество не ограничено.
+        Товар читается через кэш: повторный просмотр карточки обходится без запроса, а
+        остаток, измененный резервом в другой копии приложения, устаревает не дольше CACHE_TTL.
+        """
+        def load():
+            cursor = self.conn.cursor()
+            cursor.execute(
+                '''SELECT id, name, price, description, image_path,
+                          stock - (SELECT COALESCE(SUM(r.quantity), 0)
+                                   FROM reservations r
+                                   WHERE r.product_id = products.id AND r.expires_at > ?)
+                   FROM products
+                   WHERE id = ?''',
+                (time.time(), product_id)
+            )
+            return cursor.fetchone()
+
+        row = self.cache.get(('product', product_id), load)
+        return Product(*row) if row is not None else None
+
+    def set_stock(self, product_id, stock):
+        """Задает остаток товара; None снимает ограничение"""
+        with self.transaction() as cursor:
+            cursor.execute("UPDATE products SET stock = ? WHERE id = ?", (stock, product_id))
+        self.cache.invalidate(('product', product_id))
+
+    def add_product(self, name, price, description, image_path, category_id, image_width=None, image_height=None,
+                    stock=None, seller_id=None):
+        """Добавляет товар; stock=None - количество не ограничено"""
+        with self.transaction() as cursor:
+            cursor.execute(
+                '''INSERT INTO products (name, price, description, image_path, category_id, image_width, image_height,
+                                       stock, seller_id)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                (name, price, description, image_path or None, category_id, image_width, image_height, stock,
+                 seller_id)
+            )
+        # В кэше мог остаться промах по этому номеру
+        self.cache.invalidate(('product', cursor.lastrowid))
+        events.changes.publish(self.db_path, events.PRODUCT_ADDED, product_id=cursor.lastrowid,
+                               category_id=category_id)
+        return cursor.lastrowid
+
+    def upsert_products(self, rows, seller_id=None):
+        """Пакетно добавляет товары одной транзакцией; существующие (по названию) обновляет.
+
+        rows - последовательность (name, price, description, category_id); seller_id - продавец
+        новых товаров, у существующих продавец не меняется.
+        """
+        with self.transaction() as cursor:
+            cursor.executemany(
+                '''INSERT INTO products (name, price, description, category_id, seller_id)
+                   VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT (name) DO UPDATE SET price       = excluded.price,
+                                                    description = excluded.description,
+                                                    category_id = excluded.category_id''',
+                ((*row, seller_id) for row in rows)
+            )
+        # Какие товары обновлены, неизвестно: сбрасываются все товары и рекомендации с их ценами
+        self.cache.invalidate_kind('product')
+        self.cache.invalidate_kind('recommendations')
+
+    def get_seller_products_page(self, seller_id, sort='id', descending=False, cursor=None, limit=100,
+                                 description=False):
+        """Страница товаров продавца (SellerProduct) и курсор следующей, как в get_products_page
+        (продолжение страницы так же выбирается двумя частями);
+        description=True - вместе с описанием (для выгрузки)"""
+        if sort not in SELLER_SORT_INDEXES:
+            raise ValueError(f"Неизвестный порядок сортировки: {sort}")
+        order = 'DESC' if descending else 'ASC'
+        after = '<' if descending else '>'
+
+        def part(extra_conditions):
+            return f'''SELECT p.id, p.name, p.price, p.stock, p.category_id, c.name,
+                              {'p.description' if description else 'NULL'}, p.{sort}
+                       FROM products p INDEXED BY {SELLER_SORT_INDEXES[sort]}
+                                LEFT JOIN categories c ON c.id = p.category_id
+                       WHERE {' AND '.join(['p.seller_id = ?'] + extra_conditions)}
+                       ORDER BY p.{sort} {order}, p.id {order} LIMIT ?'''
+
+        if cursor is None:
+            query, params = part([]), [seller_id, limit]
+        elif sort == 'id':
+            query, params = part([f"p.id {after} ?"]), [seller_id, cursor[1], limit]
+        else:
+            # Ключ сортировки - последний (восьмой) столбец выборки, id - первый
+            query = (f"SELECT * FROM ({part([f'p.{sort} = ?', f'p.id {after} ?'])})"
+                     f" UNION ALL SELECT * FROM ({part([f'p.{sort} {after} ?'])})"
+                     f" ORDER BY 8 {order}, 1 {order} LIMIT ?")
+            params = [seller_id, cursor[0], cursor[1], limit, seller_id, cursor[0], limit, limit]
+
+        sql_cursor = self.conn.cursor(KeyedCursor)
+        sql_cursor.row_factory = keyed_factory(SellerProduct)
+        sql_cursor.execute(query, params)
+        rows = sql_cursor.fetchall()
+        next_cursor = (sql_cursor.key, rows[-1].id) if len(rows) == limit else None
+        return rows, next_cursor
+
+    def iter_seller_products(self, seller_id, page_size=1000, description=True):
+        """Потоково перебирает товары продавца в порядке id, не загружая их все в память"""
+        cursor = None
+        while True:
+            rows, cursor = self.get_seller_products_page(seller_id, cursor=cursor, limit=page_size,
+                                                         description=description)
+            yield from rows
+            if cursor is None:
+                return
 
-def resource_path(relative_path):
-    """ Получает абсолютный путь к ресурсу """
-    try:
-        base_path = sys._MEIPASS
-    except Exception:
-        base_path = os.path.abspath(".")
-    return os.path.join(base_path, relative_path)
+    def count_seller_products(self, seller_id):
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM products WHERE seller_id = ?", (seller_id,))
+        return cursor.fetchone()[0]
+
+    def update_seller_products(self, seller_id, product_ids=None, price=None, price_percent=None,
+                               category_id=None):
+        """Меняет цену и/или категорию товаров продавца одной транзакцией; возвращает число
+        измененных товаров.
+
+        product_ids - номера товаров (None - все товары продавца); чужие товары не меняются.
+        price задает новую цену, price_percent меняет текущую на столько процентов
+        (-10 - скидка 10%), category_id переносит в категорию. Выделенные товары
+        обновляются одним executemany по первичному ключу.
+        """
+        assignments = []
+        values = []
+        if price is not None:
+            assignments.append("price = ?")
+            values.append(price)
+        elif price_percent is not None:
+            assignments.append("price = ROUND(price * ?, 2)")
+            values.append(1 + price_percent / 100)
+        if category_id is not None:
+            assignments.append("category_id = ?")
+            values.append(category_id)
+        if not assignments:
+            return 0
+        if (price is not None and price < 0) or (price_percent is not None and price_percent <= -100):
+            raise ValueError("Цена не может быть отрицательной")
+
+        query = f"UPDATE products SET {', '.join(assignments)} WHERE seller_id = ?"
+        with self.transaction() as cursor:
+            if product_ids is None:
+                cursor.execute(query, (*values, seller_id))
+            else:
+                cursor.executemany(query + " AND id = ?",
+                                   ((*values, seller_id, product_id) for product_id in product_ids))
+            count = cursor.rowcount
+        # Цены есть в карточках и рекомендациях; номеров при обновлении всех товаров нет под рукой
+        if product_ids is None or len(product_ids) > self.cache.max_entries:
+            self.cache.invalidate_kind('product')
+        else:
+            self.cache.invalidate(*(('product', product_id) for product_id in product_ids))
+        self.cache.invalidate_kind('recommendations')
+        events.changes.publish(self.db_path, events.PRODUCTS_UPDATED, seller_id=seller_id, count=count)
+        return count
+
+    def add_to_cart(self, user_id, product_id, quantity):
+        """Кладет товар в корзину; повторное добавление увеличивает количество в той же строке.
+
+        Товар с ограниченным остатком резервируется строкой корзины на RESERVATION_TTL секунд
+        (каждое добавление продлевает резерв); если свободного остатка не хватает, корзина не
+        меняется и выбрасывается OutOfStockError.
+        """
+        now = time.time()
+        with self.transaction() as cursor:
+            cursor.execute(
+                '''INSERT INTO carts (user_id, product_id, quantity)
+                   VALUES (?, ?, ?)
+                   ON CONFLICT (user_id, product_id) DO UPDATE SET quantity = quantity + excluded.quantity
+                   RETURNING id, quantity''',
+                (user_id, product_id, quantity)
+            )
+            item_id, reserved = cursor.fetchone()
+
+            cursor.execute("SELECT name, stock FROM products WHERE id = ?", (product_id,))
+            product = cursor.fetchone()
+            if product is not None and product[1] is not None:
+                available = self._available_stock(cursor, product_id, user_id, now)
+                if reserved > available:
+                    raise OutOfStockError(product[0], available)
+                cursor.execute(
+                    '''INSERT INTO reservations (cart_item_id, user_id, product_id, quantity, expires_at)
+                       VALUES (?, ?, ?, ?, ?)
+                       ON CONFLICT (cart_item_id) DO UPDATE SET quantity   = excluded.quantity,
+                                                                expires_at = excluded.expires_at''',
+                    (item_id, user_id, product_id, reserved, now + RESERVATION_TTL)
+                )
+        # Резерв уменьшил свободный остаток товара
+        self.cache.invalidate(('product', product_id))
+        events.changes.publish(self.db_path, events.CART_ITEM_CHANGED, user_id=user_id, item_id=item_id)
+        return item_id
+
+    def apply_cart_changes(self, user_id, changes, journal=None):
+        """Записывает пакет изменений корзины одной транзакцией; changes - пары (product_id,
+        количество), 0 - удалить строку. Количество задается целиком, а не прибавляется,
+        поэтому повтор пакета (восстановление из журнала CartBuffer) ничего не портит.
+
+        При восстановлении journal - номер журнала, а changes - тройки (product_id, количество,
+        номер строки): строки, которые уже вошли в заказ этого журнала (checkout), пропускаются.
+
+        Товар с ограниченным остатком резервируется, как в add_to_cart; если свободного
+        остатка не хватает, строка уменьшается до доступного количества (или удаляется),
+        а товар попадает в возвращаемый список нехваток [(product_id, название, доступно)].
+        """
+        now = time.time()
+        shortages = []
+        changed = []
+        removed = []
+        with self.transaction() as cursor:
+            if journal is not None:
+                cursor.execute("SELECT seq FROM cart_checkouts WHERE user_id = ? AND journal = ?", (user_id, journal))
+                row = cursor.fetchone()
+                ordered = row[0] if row else 0
+                changes = [(product_id, quantity) for product_id, quantity, seq in changes if seq > ordered]
+            for product_id, quantity in changes:
+                cursor.execute("SELECT name, stock FROM products WHERE id = ?", (product_id,))
+                product = cursor.fetchone()
+                if product is None:
+                    quantity = 0
+                elif product[1] is not None:
+                    available = max(self._available_stock(cursor, product_id, user_id, now), 0)
+                    if quantity > available:
+                        shortages.append((product_id, product[0], available))
+                        quantity = available
+
+                if quantity > 0:
+                    cursor.execute(
+                        '''INSERT INTO carts (user_id, product_id, quantity)
+                           VALUES (?, ?, ?)
+                           ON CONFLICT (user_id, product_id) DO UPDATE SET quantity = excluded.quantity
+                           RETURNING id''',
+                        (user_id, product_id, quantity)
+                    )
+                    item_id = cursor.fetchall()[0][0]
+                    changed.append(item_id)
+                    if product[1] is not None:
+                        cursor.execute(
+                            '''INSERT INTO reservations (cart_item_id, user_id, product_id, quantity, expires_at)
+                               VALUES (?, ?, ?, ?, ?)
+                               ON CONFLICT (cart_item_id) DO UPDATE SET quantity   = excluded.quantity,
+                                                                        expires_at = excluded.expires_at''',
+                            (item_id, user_id, product_id, quantity, now + RESERVATION_TTL)
+                        )
+                else:
+                    cursor.execute("DELETE FROM carts WHERE user_id = ? AND product_id = ? RETURNING id",
+                                   (user_id, product_id))
+                    for (item_id,) in cursor.fetchall():
+                        cursor.execute("DELETE FROM reservations WHERE cart_item_id = ?", (item_id,))
+                        removed.append(item_id)
+        self.cache.invalidate(*(('product', product_id) for product_id, _ in changes))
+        for item_id in changed:
+            events.changes.publish(self.db_path, events.CART_ITEM_CHANGED, user_id=user_id, item_id=item_id)
+        for item_id in removed:
+            events.changes.publish(self.db_path, events.CART_ITEM_REMOVED, user_id=user_id, item_id=item_id)
+        return shortages
+
+    def get_cart_items(self, user_id):
+        """Возвращает корзину: строки CartLine"""
+        cursor = self.conn.cursor()
+        cursor.row_factory = CartLine.factory
+        cursor.execute('''
+                       SELECT c.id, p.name, c.quantity, p.price, c.quantity * p.price, c.product_id
+                       FROM carts c
+                                JOIN products p ON p.id = c.product_id
+                       WHERE c.user_id = ?
+                       ORDER BY c.id
+                       ''', (user_id,))
+        return cursor.fetchall()
+
+    def get_cart_item(self, item_id):
+        """Возвращает одну строку корзины (CartLine) или None"""
+        cursor = self.conn.cursor()
+        cursor.row_factory = CartLine.factory
+        cursor.execute('''
+                       SELECT c.id, p.name, c.quantity, p.price, c.quantity * p.price, c.product_id
+                       FROM carts c
+                                JOIN products p ON p.id = c.product_id
+                       WHERE c.id = ?
+                       ''', (item_id,))
+        return cursor.fetchone()
+
+    def get_cart_total(self, user_id):
+        """Возвращает сумму корзины"""
+        cursor = self.conn.cursor()
+        cursor.execute('''
+                       SELECT COALESCE(SUM(c.quantity * p.price), 0)
+                       FROM carts c
+                                JOIN products p ON p.id = c.product_id
+                       WHERE c.user_id = ?
+                       ''', (user_id,))
+        return cursor.fetchone()[0]
+
+    def remove_from_cart(self, item_id):
+        """Удаляет строку из корзины"""
+        with self.transaction() as cursor:
+            cursor.execute("DELETE FROM carts WHERE id = ? RETURNING user_id, product_id", (item_id,))
+            row = cursor.fetchone()
+            cursor.execute("DELETE FROM reservations WHERE cart_item_id = ?", (item_id,))
+        if row is not None:
+            self.cache.invalidate(('product', row[1]))
+            events.changes.publish(self.db_path, events.CART_ITEM_REMOVED, user_id=row[0], item_id=item_id)
+
+    def checkout(self, user_id, journal=None):
+        """Оформляет корзину в заказ одной транзакцией; возвращает номер заказа или None.
+
+        Сумма заказа сохраняется в orders.total, позиции переносятся одним INSERT ... SELECT
+        с ценами на момент оформления. Остатки списываются условным UPDATE по каждой позиции
+        с ограниченным остатком: он не может уйти ниже резервов чужих корзин, иначе заказ
+        целиком откатывается с OutOfStockError. journal - пара (номер журнала CartBuffer,
+        номер его последней записанной строки), она сохраняется вместе с заказом.
+        """
+        now = time.time()
+        with self.transaction() as cursor:
+            cursor.execute('''
+                           SELECT c.product_id, c.quantity, p.name
+                           FROM carts c
+                                    JOIN products p ON p.id = c.product_id
+                           WHERE c.user_id = ?
+                             AND p.stock IS NOT NULL
+                           ''', (user_id,))
+            limited = cursor.fetchall()
+            for product_id, quantity, name in limited:
+                cursor.execute(
+                    f"UPDATE products SET stock = stock - ? WHERE id = ? AND stock - ? >= ({RESERVED_BY_OTHERS})",
+                    (quantity, product_id, quantity, product_id, now, user_id)
+                )
+                if cursor.rowcount == 0:
+                    raise OutOfStockError(name, self._available_stock(cursor, product_id, user_id, now))
+
+            cursor.execute('''
+                           INSERT INTO orders (user_id, status, total)
+                           SELECT ?, ?, SUM(c.quantity * p.price)
+                           FROM carts c
+                                    JOIN products p ON p.id = c.product_id
+                           WHERE c.user_id = ?
+                           HAVING COUNT(*) > 0
+                           ''', (user_id, ORDERED_STATUS, user_id))
+            if cursor.rowcount == 0:
+                return None
+            order_id = cursor.lastrowid
+
+            cursor.execute('''
+                           INSERT INTO order_items (order_id, product_id, quantity, price, total_price)
+                           SELECT ?, c.product_id, c.quantity, p.price, c.quantity * p.price
+                           FROM carts c
+                                    JOIN products p ON p.id = c.product_id
+                           WHERE c.user_id = ?
+                           ORDER BY c.id
+                           ''', (order_id, user_id))
+            self._add_order_to_recommendations(cursor, order_id)
+            cursor.execute("DELETE FROM reservations WHERE cart_item_id IN (SELECT id FROM carts WHERE user_id = ?)",
+                           (user_id,))
+            cursor.execute("DELETE FROM carts WHERE user_id = ?", (user_id,))
+            if journal is not None:
+                cursor.execute(
+                    '''INSERT INTO cart_checkouts (user_id, journal, seq)
+                       VALUES (?, ?, ?)
+                       ON CONFLICT (user_id) DO UPDATE SET journal = excluded.journal,
+                                                           seq     = excluded.seq''',
+                    (user_id, *journal)
+                )
+        # Списание изменило остатки, заказ - рекомендации его товаров и их соседей
+        self.cache.invalidate(*(('product', product_id) for product_id, _, _ in limited))
+        self.cache.invalidate_kind('recommendations')
+        events.changes.publish(self.db_path, events.CART_CLEARED, user_id=user_id)
+        events.changes.publish(self.db_path, events.ORDER_CREATED, user_id=user_id, order_id=order_id)
+        return order_id
+
+    def _available_stock(self, cursor, product_id, user_id, now):
+        """Остаток товара за вычетом действующих резервов других пользователей"""
+        cursor.execute(f"SELECT stock - ({RESERVED_BY_OTHERS}) FROM products WHERE id = ?",
+                       (product_id, now, user_id, product_id))
+        return cursor.fetchone()[0]
+
+    def release_expired_reservations(self, now=None):
+        """Снимает истекшие резервы брошенных корзин; возвращает их число.
+
+        На расчет свободного остатка истекший резерв и так не влияет - удаление лишь не дает
+        таблице расти. Строки корзины остаются: товар можно будет оформить, если он еще есть.
+        """
+        with self.transaction() as cursor:
+            cursor.execute("DELETE FROM reservations WHERE expires_at <= ? RETURNING product_id",
+                           (time.time() if now is None else now,))
+            rows = cursor.fetchall()
+        # Остаток в кэше мог быть прочитан, пока резерв еще действовал
+        self.cache.invalidate(*{('product', product_id) for (product_id,) in rows})
+        return len(rows)
+
+    def get_orders(self, user_id, archived=False):
+        """Возвращает заказы пользователя (Order), новые первыми; archived=True - заказы из архива"""
+        cursor = self.conn.cursor()
+        cursor.row_factory = Order.factory
+        if not archived:
+            cursor.execute('''
+                           SELECT id, created_at, status, total
+                           FROM orders
+                           WHERE user_id = ?
+                           ORDER BY created_at DESC, id DESC
+                           ''', (user_id,))
+            return cursor.fetchall()
+        if not self._attach_archive():
+            return []
+        cursor.execute(f'''
+                       SELECT id, created_at, status, total
+                       FROM archive.orders o
+                       WHERE user_id = ?{_archived_only('archive', 'o.id')}
+                       ORDER BY created_at DESC, id DESC
+                       ''', (user_id,))
+        return cursor.fetchall()
+
+    def get_order(self, order_id):
+        """Возвращает заказ (Order) по номеру или None; заказа нет в горячей базе - ищется в архиве"""
+        cursor = self.conn.cursor()
+        cursor.row_factory = Order.factory
+        cursor.execute("SELECT id, created_at, status, total FROM orders WHERE id = ?", (order_id,))
+        order = cursor.fetchone()
+        if order is None and self._attach_archive():
+            cursor.execute("SELECT id, created_at, status, total FROM archive.orders WHERE id = ?", (order_id,))
+            order = cursor.fetchone()
+        return order
+
+    def get_order_items(self, order_id):
+        """Возвращает позиции заказа (OrderLine) из горячей базы или, если их там нет, из архива"""
+        cursor = self.conn.cursor()
+        cursor.row_factory = OrderLine.factory
+        for schema in ('main', 'archive'):
+            if schema == 'archive' and not self._attach_archive():
+                break
+            cursor.execute(f'''
+                           SELECT p.name, i.quantity, i.price
+                           FROM {schema}.order_items i
+                                    JOIN products p ON p.id = i.product_id
+                           WHERE i.order_id = ?
+                           ORDER BY i.rowid
+                           ''', (order_id,))
+            items = cursor.fetchall()
+            if items:
+                break
+        return items
+
+    def _attach_archive(self, create=False):
+        """Подключает архив заказов к соединению под именем archive; без create - только если
+        файл архива уже есть. Возвращает True, если архив подключен.
+
+        ATTACH нельзя выполнить внутри транзакции, поэтому методы, которым нужен архив,
+        подключают его до нее.
+        """
+        if self.archive_attached:
+            return True
+        if not create and not os.path.exists(self.archive_path):
+            return False
+        cursor = self.conn.cursor()
+        cursor.execute("ATTACH DATABASE ? AS archive", (self.archive_path,))
+        cursor.execute("PRAGMA archive.journal_mode = WAL")
+        cursor.execute("PRAGMA archive.synchronous = NORMAL")
+        self.archive_attached = True
+        cursor.execute("SELECT 1 FROM archive.sqlite_master WHERE name = 'order_items'")
+        if cursor.fetchone() is None:
+            with self.transaction() as cursor:
+                for statement in ARCHIVE_SCHEMA:
+                    cursor.execute(statement)
+        return True
+
+    def _order_schemas(self):
+        """Схемы с историей заказов: горячая база и архив, если он есть"""
+        return ['main', 'archive'] if self._attach_archive() else ['main']
+
+    def archive_orders(self, older_than_days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH):
+        """Переносит заказы в ARCHIVE_STATUSES старше older_than_days дней в архив и возвращает
+        системе освободившееся место горячей базы; возвращает число перенесенных заказов.
 
-# При запуске проверяем и создаем БД
-db_path = resource_path('data/database.db')
-if not os.path.exists(db_path):
-    os.makedirs('data', exist_ok=True)
-    db = Database(db_path)
+        Каждый пакет - отдельная короткая транзакция, поэтому оформление заказов не ждет
+        архивации всей истории. Заказы, еще не досчитанные в сводки продаж, остаются на месте.
+        Перенос можно повторять: строки архива заменяются, а после сбоя между фиксацией архива
+        и горячей базы заказ читается из горячей базы, пока следующий запуск его не удалит.
+        Пока переносить нечего, архив не подключается и файл архива не создается.
+        """
+        statuses = ', '.join('?' * len(ARCHIVE_STATUSES))
+        candidates = f'''
+                     SELECT id
+                     FROM main.orders
+                     WHERE created_at < datetime('now', ?)
+                       AND status IN ({statuses})
+                       AND id < COALESCE((SELECT next_order_id FROM sales_backfill WHERE id = 1), id + 1)
+                     ORDER BY created_at
+                     LIMIT ?
+                     '''
+        params = (f"{-older_than_days} days", *ARCHIVE_STATUSES)
+        cursor = self.conn.cursor()
+        cursor.execute(candidates, (*params, 1))
+        if cursor.fetchone() is None:
+            return 0
+
+        self._attach_archive(create=True)
+        moved = 0
+        while True:
+            with self.transaction() as cursor:
+                cursor.execute(candidates, (*params, batch_size))
+                ids = [row[0] for row in cursor.fetchall()]
+                if not ids:
+                    break
+                marks = ', '.join('?' * len(ids))
+                cursor.execute(f'''
+                               INSERT OR REPLACE INTO archive.orders (id, user_id, status, total, created_at)
+                               SELECT id, user_id, status, total, created_at
+                               FROM main.orders
+                               WHERE id IN ({marks})
+                               ''', ids)
+                cursor.execute(f"DELETE FROM archive.order_items WHERE order_id IN ({marks})", ids)
+                cursor.execute(f'''
+                               INSERT INTO archive.order_items (order_id, product_id, quantity, price, total_price)
+                               SELECT order_id, product_id, quantity, price, total_price
+                               FROM main.order_items
+                               WHERE order_id IN ({marks})
+                               ORDER BY rowid
+                               ''', ids)
+                cursor.execute(f"DELETE FROM main.order_items WHERE order_id IN ({marks})", ids)
+                cursor.execute(f"DELETE FROM main.orders WHERE id IN ({marks})", ids)
+            moved += len(ids)
+            if len(ids) < batch_size:
+                break
+        if moved:
+            self.release_free_pages()
+        return moved
+
+    def release_free_pages(self, pages=VACUUM_PAGES):
+        """Возвращает системе свободные страницы горячей базы, по pages за транзакцию;
+        возвращает их число.
+
+        Работает, только если база в режиме auto_vacuum = INCREMENTAL; в остальных свободные
+        страницы лишь переиспользуются новыми строками (см. enable_incremental_vacuum).
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("PRAGMA main.auto_vacuum")
+        if cursor.fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+            return 0
+        released = 0
+        while True:
+            with self.transaction() as cursor:
+                cursor.execute("PRAGMA main.freelist_count")
+                free = cursor.fetchone()[0]
+                if not free:
+                    break
+                cursor.execute(f"PRAGMA main.incremental_vacuum({pages})")
+                cursor.fetchall()
+            released += min(free, pages)
+        return released
+
+    def enable_incremental_vacuum(self):
+        """Переводит базу, созданную прежней версией, в режим auto_vacuum = INCREMENTAL;
+        возвращает True, если понадобилась перестройка.
+
+        Это полный VACUUM: файл переписывается целиком и все это время база недоступна
+        другим копиям приложения, поэтому он выполняется только вручную и один раз.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("PRAGMA main.auto_vacuum")
+        if cursor.fetchone()[0] == AUTO_VACUUM_INCREMENTAL:
+            return False
+        cursor.execute(f"PRAGMA main.auto_vacuum = {AUTO_VACUUM_INCREMENTAL}")
+        cursor.execute("VACUUM main")
+        return True
+
+    def backfill_sales_summary(self, batch_size=SALES_BACKFILL_BATCH):
+        """Досчитывает в сводки продаж следующий пакет заказов, оформленных до появления
+        триггера; возвращает, сколько номеров заказов еще осталось (0 - сводки полные).
+
+        Каждый пакет - отдельная короткая транзакция, поэтому дозаполнение большой истории
+        не держит блокировку записи и продолжается с того же места после перезапуска.
+        Заказы пакета читаются и из архива (после rebuild_sales_summary там есть недосчитанные).
+        """
+        schemas = self._order_schemas()
+        with self.transaction() as cursor:
+            cursor.execute("SELECT next_order_id, last_order_id FROM sales_backfill WHERE id = 1")
+            row = cursor.fetchone()
+            if row is None:
+                return 0
+            first_id, last_id = row
+            end_id = min(first_id + batch_size, last_id + 1)
+
+            for schema in schemas:
+                cursor.execute(f'''
+                               INSERT INTO sales_daily_products (product_id, day, quantity, revenue, orders)
+                               SELECT i.product_id, date(o.created_at), SUM(i.quantity), SUM(i.total_price), COUNT(*)
+                               FROM {schema}.orders o
+                                        JOIN {schema}.order_items i ON i.order_id = o.id
+                               WHERE o.id >= ? AND o.id < ?{_archived_only(schema, 'o.id')}
+                               GROUP BY i.product_id, date(o.created_at)
+                               ON CONFLICT (product_id, day) DO UPDATE SET quantity = quantity + excluded.quantity,
+                                                                           revenue  = revenue + excluded.revenue,
+                                                                           orders   = orders + excluded.orders
+                               ''', (first_id, end_id))
+                cursor.execute(f'''
+                               INSERT INTO sales_daily_categories (seller_id, category_id, day, quantity, revenue)
+                               SELECT COALESCE(p.seller_id, 0), p.category_id, date(o.created_at),
+                                      SUM(i.quantity), SUM(i.total_price)
+                               FROM {schema}.orders o
+                                        JOIN {schema}.order_items i ON i.order_id = o.id
+                                        JOIN products p ON p.id = i.product_id
+                               WHERE o.id >= ? AND o.id < ?{_archived_only(schema, 'o.id')}
+                               GROUP BY 1, 2, 3
+                               ON CONFLICT (seller_id, category_id, day) DO UPDATE
+                                   SET quantity = quantity + excluded.quantity,
+                                       revenue  = revenue + excluded.revenue
+                               ''', (first_id, end_id))
+
+            if end_id > last_id:
+                cursor.execute("DELETE FROM sales_backfill WHERE id = 1")
+                return 0
+            cursor.execute("UPDATE sales_backfill SET next_order_id = ? WHERE id = 1", (end_id,))
+        return last_id - end_id + 1
+
+    def rebuild_sales_summary(self):
+        """Очищает сводки продаж и ставит всю историю заказов на дозаполнение заново
+        (после ручной правки заказов) вместе с архивом; возвращает, сколько номеров заказов пересчитать"""
+        schemas = self._order_schemas()
+        with self.transaction() as cursor:
+            cursor.execute("DELETE FROM sales_daily_products")
+            cursor.execute("DELETE FROM sales_daily_categories")
+            cursor.execute("DELETE FROM sales_backfill WHERE id = 1")
+            first_id, last_id = self._order_id_range(cursor, schemas)
+            if last_id is not None:
+                cursor.execute("INSERT INTO sales_backfill (id, next_order_id, last_order_id) VALUES (1, ?, ?)",
+                               (first_id, last_id))
+        return self.get_sales_backfill_remaining()
+
+    def get_sales_backfill_remaining(self):
+        """Сколько номеров заказов еще не попало в сводки продаж"""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT last_order_id - next_order_id + 1 FROM sales_backfill WHERE id = 1")
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def get_sales_by_day(self, seller_id, since):
+        """Продажи продавца по дням начиная с since ('ГГГГ-ММ-ДД'): (день, количество, выручка)"""
+        cursor = self.conn.cursor()
+        cursor.execute('''
+                       SELECT day, SUM(quantity), SUM(revenue)
+                       FROM sales_daily_categories
+                       WHERE seller_id = ?
+                         AND day >= ?
+                       GROUP BY day
+                       ORDER BY day DESC
+                       ''', (seller_id, since))
+        return cursor.fetchall()
+
+    def get_sales_by_product(self, seller_id, since, limit=100):
+        """Самые продаваемые товары продавца с since: (id, название, количество, выручка, заказов)"""
+        cursor = self.conn.cursor()
+        cursor.execute('''
+                       SELECT p.id, p.name, SUM(s.quantity), SUM(s.revenue), SUM(s.orders)
+                       FROM products p
+                                JOIN sales_daily_products s ON s.product_id = p.id
+                       WHERE p.seller_id = ?
+                         AND s.day >= ?
+                       GROUP BY p.id
+                       ORDER BY 4 DESC
+                       LIMIT ?
+                       ''', (seller_id, since, limit))
+        return cursor.fetchall()
+
+    def get_sales_by_category(self, seller_id, since):
+        """Продажи продавца с since по категориям: (id, название, количество, выручка)"""
+        cursor = self.conn.cursor()
+        cursor.execute('''
+                       SELECT s.category_id, c.name, SUM(s.quantity), SUM(s.revenue)
+                       FROM sales_daily_categories s
+                                LEFT JOIN categories c ON c.id = s.category_id
+                       WHERE s.seller_id = ?
+                         AND s.day >= ?
+                       GROUP BY s.category_id
+                       ORDER BY 4 DESC
+                       ''', (seller_id, since))
+        return cursor.fetchall()
+
+    def _add_order_to_recommendations(self, cursor, order_id):
+        """Добавляет пары товаров заказа в рекомендации и обрезает списки затронутых товаров.
+
+        Пара, не вошедшая в список, начинает счет заново, поэтому между полными пересборками
+        счетчики приблизительны; порядок частых пар от этого не меняется.
+        """
+        cursor.execute('''
+                       INSERT INTO product_recommendations (product_id, neighbour_id, score)
+                       SELECT a.product_id, b.product_id, 1
+                       FROM order_items a
+                                JOIN order_items b ON b.order_id = a.order_id AND b.product_id <> a.product_id
+                       WHERE a.order_id = ?
+                       ON CONFLICT (product_id, neighbour_id) DO UPDATE SET score = score + 1
+                       ''', (order_id,))
+        cursor.execute('''
+                       DELETE
+                       FROM product_recommendations
+                       WHERE (product_id, neighbour_id) IN (
+                           SELECT product_id, neighbour_id
+                           FROM (SELECT product_id, neighbour_id,
+                                        ROW_NUMBER() OVER (PARTITION BY product_id
+                                            ORDER BY score DESC, neighbour_id) AS position
+                                 FROM product_recommendations
+                                 WHERE product_id IN (SELECT product_id FROM order_items WHERE order_id = ?))
+                           WHERE position > ?)
+                       ''', (order_id, RECOMMENDATIONS_STORED))
+
+    def get_recommendations(self, product_id, limit=RECOMMENDATIONS_SHOWN):
+        """Товары (Product без описания), которые чаще всего покупают вместе с данным; читаются через кэш"""
+        def load():
+            cursor = self.conn.cursor()
+            cursor.execute(f'''
+                           SELECT {_product_columns(('name', 'price', 'image_path'), 'p.')}
+                           FROM product_recommendations r
+                                    JOIN products p ON p.id = r.neighbour_id
+                           WHERE r.product_id = ?
+                           ORDER BY r.score DESC, r.neighbour_id
+                           LIMIT ?
+                           ''', (product_id, limit))
+            return cursor.fetchall()
+
+        return [Product(*row) for row in self.cache.get(('recommendations', product_id, limit), load)]
+
+    def get_order_id_range(self):
+        """Первый и последний номер заказа вместе с архивом или (None, None), если заказов нет"""
+        return self._order_id_range(self.conn.cursor(), self._order_schemas())
+
+    @staticmethod
+    def _order_id_range(cursor, schemas):
+        ids = []
+        for schema in schemas:
+            cursor.execute(f"SELECT (SELECT MIN(id) FROM {schema}.orders), (SELECT MAX(id) FROM {schema}.orders)")
+            # fetchall, а не fetchone: внутри транзакции незавершенный запрос не дает ее зафиксировать
+            ids.extend(order_id for order_id in cursor.fetchall()[0] if order_id is not None)
+        return (min(ids), max(ids)) if ids else (None, None)
+
+    def get_max_product_id(self):
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT MAX(id) FROM products")
+        return cursor.fetchone()[0] or 0
+
+    def iter_order_lines(self, first_order_id, last_order_id, orders_per_batch=50_000):
+        """Позиции заказов с first_order_id по last_order_id (вместе с архивом) пакетами по номерам
+        заказов: списки (order_id, product_id), упорядоченные по номеру заказа"""
+        schemas = self._order_schemas()
+        query = ' UNION ALL '.join(f"SELECT order_id, product_id FROM {schema}.order_items i "
+                                   f"WHERE order_id >= ? AND order_id < ?{_archived_only(schema, 'i.order_id')}"
+                                   for schema in schemas)
+        cursor = self.conn.cursor()
+        start = first_order_id
+        while start <= last_order_id:
+            end = min(start + orders_per_batch, last_order_id + 1)
+            cursor.execute(f"{query} ORDER BY order_id", (start, end) * len(schemas))
+            yield cursor.fetchall()
+            start = end
+
+    def begin_recommendations_build(self):
+        """Создает пустую таблицу для полной пересборки рекомендаций"""
+        with self.transaction() as cursor:
+            cursor.execute("DROP TABLE IF EXISTS product_recommendations_build")
+            cursor.execute(RECOMMENDATIONS_TABLE.format(name='product_recommendations_build'))
+
+    def add_recommendations_build(self, rows):
+        """Пишет пакет (product_id, neighbour_id, score) в пересобираемую таблицу"""
+        with self.transaction() as cursor:
+            cursor.executemany(
+                "INSERT INTO product_recommendations_build (product_id, neighbour_id, score) VALUES (?, ?, ?)",
+                rows
+            )
 
+    def finish_recommendations_build(self, last_order_id):
+        """Подменяет рекомендации пересобранными по заказам до last_order_id включительно;
+        заказы, оформленные во время пересборки, добавляются поверх"""
+        with self.transaction() as cursor:
+            cursor.execute("DROP TABLE product_recommendations")
+            cursor.execute("ALTER TABLE product_recommendations_build RENAME TO product_recommendations")
+            cursor.execute("SELECT id FROM orders WHERE id > ? ORDER BY id", (last_order_id or 0,))
+            for (order_id,) in cursor.fetchall():
+                self._add_order_to_recommendations(cursor, order_id)
+        self.cache.invalidate_kind('recommendations')
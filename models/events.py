@@ -0,0 +1,41 @@
+import threading
+
+# Темы уведомлений об изменениях данных
+CART_ITEM_CHANGED = 'cart_item_changed'  # user_id, item_id
+CART_ITEM_REMOVED = 'cart_item_removed'  # user_id, item_id
+CART_CLEARED = 'cart_cleared'  # user_id
+ORDER_CREATED = 'order_created'  # user_id, order_id
+PRODUCT_ADDED = 'product_added'  # product_id, category_id
+PRODUCTS_UPDATED = 'products_updated'  # seller_id, count
+
+
+class ChangeBus:
+    """Уведомления об изменениях, сделанных через Database.
+
+    Database публикует событие после фиксации транзакции, в том потоке, где шла запись;
+    подписчик вызывается там же, поэтому GUI подписывается через ChangeNotifier из
+    models.async_database, который переносит событие в поток GUI. Событие содержит путь
+    к файлу БД, чтобы подписчик мог отличить свою базу от чужой.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = []
+
+    def subscribe(self, callback):
+        """callback(db_path, topic, payload)"""
+        with self.lock:
+            self.subscribers = self.subscribers + [callback]
+
+    def unsubscribe(self, callback):
+        # Сравнение по равенству: связанный метод (obj.method) при каждом обращении новый объект
+        with self.lock:
+            self.subscribers = [s for s in self.subscribers if s != callback]
+
+    def publish(self, db_path, topic, **payload):
+        # Список заменяется целиком при подписке, поэтому обходится без блокировки
+        for callback in self.subscribers:
+            callback(db_path, topic, payload)
+
+
+changes = ChangeBus()
@@ -0,0 +1,69 @@
+"""Потоковая выгрузка товаров продавца в CSV.
+
+Товары читаются страницами по первичному ключу (Database.iter_seller_products) и пишутся
+в файл по одной строке, поэтому память не зависит от размера каталога. Файл пишется под
+временным именем и переименовывается только после последней строки: оборванная выгрузка
+не оставляет неполный файл под нужным именем. Столбцы name, price, description и
+category понимает models.importer, поэтому выгрузку можно отредактировать и загрузить обратно.
+
+Запуск: python -m models.exporter +79161234567 products.csv
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+
+from models.database import Database
+
+COLUMNS = ('id', 'name', 'price', 'stock', 'category', 'description')
+# Через сколько строк сообщать о ходе выгрузки
+PROGRESS_EVERY = 5000
+
+
+def export_seller_products(db, seller_id, path, progress=None):
+    """Выгружает товары продавца в CSV; возвращает число строк. progress(строк) вызывается
+    каждые PROGRESS_EVERY строк"""
+    partial = path + '.part'
+    count = 0
+    try:
+        with open(partial, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            for product in db.iter_seller_products(seller_id):
+                writer.writerow((product.id, product.name, product.price,
+                                 '' if product.stock is None else product.stock,
+                                 product.category or '', product.description or ''))
+                count += 1
+                if progress is not None and count % PROGRESS_EVERY == 0:
+                    progress(count)
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Выгрузка товаров продавца в CSV")
+    parser.add_argument('phone', help="телефон продавца")
+    parser.add_argument('path', help="файл .csv")
+    parser.add_argument('--db', default='data/database.db', help="путь к базе данных")
+    args = parser.parse_args(argv)
+
+    db = Database(args.db)
+    seller = db.get_user(args.phone)
+    if seller is None:
+        print(f"Пользователь {args.phone} не найден", file=sys.stderr)
+        return 1
+
+    started = time.perf_counter()
+    count = export_seller_products(db, seller.id, args.path,
+                                   lambda done: print(f"\rВыгружено: {done}", end='', flush=True))
+    print(f"\rВыгружено: {count} за {time.perf_counter() - started:.1f} с")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,291 @@
+"""Потоковый импорт каталога товаров.
+
+Поддерживаются файлы вида items.txt (JSON-объект "название" -> [{"цена", "краткое описание"}]),
+CSV и JSONL. Файл читается порциями и никогда не загружается в память целиком; строки
+записываются пакетами через executemany, по одной транзакции на пакет, с обновлением
+существующих товаров по уникальному названию.
+
+Запуск: python -m models.importer items.txt [--default-category "Бытовые предметы"]
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+
+from models.database import Database
+
+# Ключевые слова (в названии или описании) -> категория. Проверяются по порядку,
+# поэтому более точные правила стоят раньше общих.
+DEFAULT_CATEGORY_RULES = [
+    ('компьютерн', 'Компьютерные игры'),
+    ('симулятор', 'Компьютерные игры'),
+    ('настольн', 'Настольные игры'),
+    ('детектив', 'Детектив'),
+    ('фантастич', 'Фантастика'),
+    ('комеди', 'Комедия'),
+    ('трагеди', 'Трагедия'),
+    ('пьес', 'Трагедия'),
+    ('повест', 'Повесть'),
+    ('стих', 'Поэзия'),
+    ('поэм', 'Поэзия'),
+    ('роман', 'Роман'),
+    ('детск', 'Детское'),
+    ('женщин', 'Женское'),
+    ('блузк', 'Женское'),
+    ('плать', 'Женское'),
+    ('шляпк', 'Женское'),
+    ('куртк', 'Мужское'),
+    ('шляп', 'Мужское'),
+    ('носк', 'Мужское'),
+    ('шорт', 'Мужское'),
+    ('футболк', 'Мужское'),
+    ('рубашк', 'Мужское'),
+    ('игр', 'Игры'),
+    ('утюг', 'Бытовые предметы'),
+    ('микроволнов', 'Бытовые предметы'),
+    ('фен', 'Бытовые предметы'),
+    ('холодильник', 'Бытовые предметы'),
+    ('прибор', 'Бытовые предметы'),
+]
+
+# Названия полей во входных файлах
+NAME_FIELDS = ('name', 'название')
+PRICE_FIELDS = ('price', 'цена')
+DESCRIPTION_FIELDS = ('description', 'краткое описание', 'описание')
+CATEGORY_FIELDS = ('category', 'категория')
+
+CHUNK_SIZE = 1 << 16
+
+
+def iter_items_json(path):
+    """Потоково разбирает JSON-объект вида {"название": [{...}], ...} и выдает словари товаров"""
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8') as f:
+        buffer = ''
+        pos = 0
+        eof = False
+
+        def refill():
+            nonlocal buffer, pos, eof
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                eof = True
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+        def skip_whitespace():
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos].isspace():
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    return
+                refill()
+
+        def expect(char):
+            nonlocal pos
+            skip_whitespace()
+            if pos >= len(buffer) or buffer[pos] != char:
+                raise ValueError(f"Ожидался символ {char!r} в {path}")
+            pos += 1
+
+        def decode():
+            nonlocal pos
+            skip_whitespace()
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    refill()
+                    continue
+                # Значение, упершееся в конец буфера, могло быть обрезано (например, число)
+                if end == len(buffer) and not eof:
+                    refill()
+                    continue
+                pos = end
+                return value
+
+        refill()
+        expect('{')
+        skip_whitespace()
+        if buffer[pos:pos + 1] == '}':
+            return
+        while True:
+            name = decode()
+            expect(':')
+            value = decode()
+            details = value[0] if isinstance(value, list) and value else value
+            if isinstance(details, dict):
+                yield dict(details, name=name)
+
+            skip_whitespace()
+            if buffer[pos:pos + 1] == ',':
+                pos += 1
+                continue
+            expect('}')
+            return
+
+
+def iter_csv(path):
+    with open(path, encoding='utf-8', newline='') as f:
+        yield from csv.DictReader(f)
+
+
+def iter_jsonl(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_records(path, file_format=None):
+    """Выбирает разборщик по формату или расширению файла"""
+    if file_format is None:
+        lower = path.lower()
+        if lower.endswith('.csv'):
+            file_format = 'csv'
+        elif lower.endswith(('.jsonl', '.ndjson')):
+            file_format = 'jsonl'
+        else:
+            file_format = 'json'
+    parsers = {'json': iter_items_json, 'csv': iter_csv, 'jsonl': iter_jsonl}
+    return parsers[file_format](path)
+
+
+def field(record, names):
+    for name in names:
+        value = record.get(name)
+        if value not in (None, ''):
+            return value
+    return None
+
+
+class CategoryMapper:
+    """Определяет категорию товара: по явному полю категории, по ключевым словам или по умолчанию"""
+
+    def __init__(self, tree, default_category=None, rules=DEFAULT_CATEGORY_RULES):
+        self.ids_by_name = {name.lower(): cat_id for cat_id, name, _ in tree.walk()}
+        self.ids = set(self.ids_by_name.values())
+        self.default_id = self.resolve(default_category) if default_category else None
+        self.rules = [(keyword, self.ids_by_name[name.lower()]) for keyword, name in rules
+                      if name.lower() in self.ids_by_name]
+
+    def resolve(self, category):
+        """Номер категории по номеру или названию; ValueError, если такой категории нет"""
+        category = str(category).strip()
+        if category.isdigit():
+            category_id = int(category)
+            if category_id not in self.ids:
+                raise ValueError(f"Неизвестная категория: {category}")
+            return category_id
+        category_id = self.ids_by_name.get(category.lower())
+        if category_id is None:
+            raise ValueError(f"Неизвестная категория: {category}")
+        return category_id
+
+    def category_id(self, record, name, description):
+        category = field(record, CATEGORY_FIELDS)
+        if category is not None:
+            try:
+                return self.resolve(category)
+            except ValueError:
+                return self.default_id
+
+        text = f"{name} {description}".lower()
+        for keyword, category_id in self.rules:
+            if keyword in text:
+                return category_id
+        return self.default_id
+
+
+class BulkImporter:
+    """Пакетная запись потока товаров в БД с подсчетом скорости"""
+
+    def __init__(self, db, default_category=None, batch_size=5000, progress=None, seller_id=None):
+        self.db = db
+        self.seller_id = seller_id
+        self.mapper = CategoryMapper(db.get_category_tree(), default_category)
+        self.batch_size = batch_size
+        self.progress = progress
+        self.imported = 0
+        self.skipped = 0
+        self.started = None
+
+    def to_row(self, record):
+        name = field(record, NAME_FIELDS)
+        price = field(record, PRICE_FIELDS)
+        description = field(record, DESCRIPTION_FIELDS) or ''
+        if not name or price is None:
+            return None
+        try:
+            price = float(price)
+        except (TypeError, ValueError):
+            return None
+        if price < 0:
+            return None
+
+        category_id = self.mapper.category_id(record, name, description)
+        if category_id is None:
+            return None
+        return str(name).strip(), price, str(description), category_id
+
+    def run(self, records):
+        """Импортирует записи; возвращает (импортировано, пропущено, строк в секунду)"""
+        self.started = time.perf_counter()
+        batch = []
+        for record in records:
+            row = self.to_row(record)
+            if row is None:
+                self.skipped += 1
+                continue
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = []
+        if batch:
+            self.flush(batch)
+        return self.imported, self.skipped, self.rate()
+
+    def flush(self, batch):
+        self.db.upsert_products(batch, self.seller_id)
+        self.imported += len(batch)
+        if self.progress is not None:
+            self.progress(self.imported, self.skipped, self.rate())
+
+    def rate(self):
+        elapsed = time.perf_counter() - self.started
+        return self.imported / elapsed if elapsed > 0 else 0.0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Импорт каталога товаров")
+    parser.add_argument('path', help="файл items.txt, .csv или .jsonl")
+    parser.add_argument('--format', choices=('json', 'csv', 'jsonl'), help="формат файла (по умолчанию по расширению)")
+    parser.add_argument('--db', default='data/database.db', help="путь к базе данных")
+    parser.add_argument('--default-category', help="категория для товаров, не подошедших ни под одно правило")
+    parser.add_argument('--batch-size', type=int, default=5000, help="строк в одной транзакции")
+    parser.add_argument('--seller', help="телефон продавца новых товаров (у существующих продавец не меняется)")
+    args = parser.parse_args(argv)
+
+    def report(imported, skipped, rate):
+        print(f"\rИмпортировано: {imported}, пропущено: {skipped}, {rate:,.0f} строк/с", end='', flush=True)
+
+    db = Database(args.db)
+    seller_id = None
+    if args.seller:
+        seller = db.get_user(args.seller)
+        if seller is None or not seller.is_seller:
+            print(f"Продавец {args.seller} не найден", file=sys.stderr)
+            return 1
+        seller_id = seller.id
+    importer = BulkImporter(db, args.default_category, args.batch_size, report, seller_id)
+    imported, skipped, rate = importer.run(iter_records(args.path, args.format))
+    print(f"\rИмпортировано: {imported}, пропущено: {skipped}, {rate:,.0f} строк/с")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
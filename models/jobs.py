@@ -0,0 +1,140 @@
+"""Фоновые задачи над базой данных.
+
+Приложение запускает их само; вручную, например после ручной правки заказов:
+    python -m models.jobs backfill-sales [--db data/database.db] [--rebuild]
+    python -m models.jobs sweep-reservations [--db data/database.db]
+    python -m models.jobs rebuild-recommendations [--db data/database.db]
+    python -m models.jobs archive-orders [--db data/database.db] [--days 180] [--enable-vacuum]
+"""
+import argparse
+import sys
+import threading
+import traceback
+
+from models.database import ARCHIVE_AFTER_DAYS, Database
+
+# Как часто снимаются истекшие резервы брошенных корзин, секунд
+RESERVATION_SWEEP_INTERVAL = 60
+# Пауза между пакетами дозаполнения сводок продаж, секунд: между пакетами пишут другие
+SALES_BACKFILL_INTERVAL = 0.2
+# Как часто старые заказы переносятся в архив, секунд
+ARCHIVE_INTERVAL = 24 * 60 * 60
+# Пауза перед первой архивацией после запуска, секунд: вход и первая страница каталога читают базу
+ARCHIVE_START_DELAY = 10 * 60
+# Сколько ждать выполняющийся запуск при выходе из приложения, секунд
+JOB_STOP_TIMEOUT = 2
+
+
+class PeriodicJob:
+    """Метод Database, вызываемый по расписанию в отдельном потоке со своим соединением.
+
+    Первый запуск - через delay секунд после start() (по умолчанию сразу), следующие - через interval секунд после окончания
+    предыдущего; until(результат) -> True завершает задачу. Ошибка одного запуска печатается
+    и запоминается в last_error, расписание продолжается. Поток фоновый и не мешает
+    завершению процесса.
+    """
+
+    def __init__(self, db_path, method, interval, *args, until=None, delay=0, **kwargs):
+        self.db_path = db_path
+        self.method = method
+        self.interval = interval
+        self.delay = delay
+        self.args = args
+        self.until = until
+        self.kwargs = kwargs
+        self.stopped = threading.Event()
+        self.thread = None
+        self.runs = 0
+        self.last_result = None
+        self.last_error = None
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self.loop, name=f"job-{self.method}", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=None):
+        """Останавливает расписание; выполняющийся запуск дорабатывает до конца"""
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def loop(self):
+        if self.stopped.wait(self.delay):
+            return
+        db = Database(self.db_path, setup=False)
+        try:
+            while not self.stopped.is_set():
+                self.run_once(db)
+                if self.until is not None and self.last_error is None and self.until(self.last_result):
+                    break
+                self.stopped.wait(self.interval)
+        finally:
+            db.conn.close()
+
+    def run_once(self, db):
+        try:
+            self.last_result = getattr(db, self.method)(*self.args, **self.kwargs)
+            self.last_error = None
+        except Exception as error:
+            self.last_error = error
+            traceback.print_exc()
+        self.runs += 1
+
+
+def reservation_sweeper(db_path, interval=RESERVATION_SWEEP_INTERVAL):
+    """Задача, снимающая истекшие резервы товаров"""
+    return PeriodicJob(db_path, 'release_expired_reservations', interval)
+
+
+def sales_backfill(db_path, interval=SALES_BACKFILL_INTERVAL):
+    """Задача, досчитывающая сводки продаж по заказам до их появления; завершается, когда досчитано"""
+    return PeriodicJob(db_path, 'backfill_sales_summary', interval, until=lambda remaining: remaining == 0)
+
+
+def order_archiver(db_path, interval=ARCHIVE_INTERVAL, delay=ARCHIVE_START_DELAY):
+    """Задача, переносящая старые заказы в архив; первый раз - через delay секунд после запуска"""
+    return PeriodicJob(db_path, 'archive_orders', interval, delay=delay)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Фоновые задачи над базой данных")
+    parser.add_argument('job', choices=['backfill-sales', 'sweep-reservations', 'rebuild-recommendations',
+                                        'archive-orders'])
+    parser.add_argument('--db', default='data/database.db', help="путь к базе данных")
+    parser.add_argument('--rebuild', action='store_true', help="пересчитать сводки продаж с нуля")
+    parser.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS, help="архивировать заказы старше, дней")
+    parser.add_argument('--enable-vacuum', action='store_true',
+                        help="однократно перестроить базу прежней версии (VACUUM), чтобы архивация уменьшала файл")
+    args = parser.parse_args(argv)
+
+    db = Database(args.db)
+    if args.job == 'sweep-reservations':
+        print(f"Снято резервов: {db.release_expired_reservations()}")
+        return 0
+    if args.job == 'rebuild-recommendations':
+        # NumPy нужен только пересборке, приложение его не загружает
+        from models.recommendations import rebuild
+        stats = rebuild(db)
+        print(f"Заказов: {stats['orders']}, позиций: {stats['lines']}, пар: {stats['pairs']}, "
+              f"разделов: {stats['partitions']}; записано рекомендаций: {stats['rows']}")
+        return 0
+    if args.job == 'archive-orders':
+        if args.enable_vacuum and db.enable_incremental_vacuum():
+            print("База перестроена: освобожденное место возвращается системе")
+        print(f"Перенесено в архив заказов: {db.archive_orders(args.days)}")
+        return 0
+
+    if args.rebuild:
+        db.rebuild_sales_summary()
+    remaining = db.get_sales_backfill_remaining()
+    while remaining:
+        remaining = db.backfill_sales_summary()
+        print(f"Осталось заказов: {remaining}")
+    print("Сводки продаж полные")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
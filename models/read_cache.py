@@ -0,0 +1,91 @@
+"""Кэш чтений по ключу сущности перед запросами Database.
+
+Ключ - кортеж (вид, идентификатор), например ('product', 42) или ('user', '+7...').
+Значение живет не дольше ttl секунд и вытесняется давно не читанным, когда записей больше
+max_entries. Методы записи Database сбрасывают ключи измененных сущностей после фиксации
+транзакции; ttl ограничивает, насколько устареет значение, измененное другой копией
+приложения или косвенно (например, резерв в чужой корзине истек).
+
+Кэш общий для всех соединений процесса с одним файлом БД, поэтому методы защищены
+блокировкой. Чтение, начавшееся до сброса ключа, свой результат в кэш не кладет: он мог
+быть прочитан до фиксации изменения.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+# Записей в кэше одной базы и время их жизни, с
+CACHE_MAX_ENTRIES = 10_000
+CACHE_TTL = 30.0
+
+
+class ReadCache:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.lock = threading.Lock()
+        # ключ -> (значение, момент устаревания) в порядке последнего чтения
+        self.entries = OrderedDict()
+        # Растет при каждом сбросе: по нему видно, что ключи сбрасывались, пока шло чтение
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def get(self, key, load):
+        """Значение по ключу; при промахе - load() с сохранением результата (и None)"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[1] > self.clock():
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self.entries[key]
+                self.expired += 1
+            self.misses += 1
+            generation = self.generation
+
+        value = load()
+        with self.lock:
+            if generation == self.generation:
+                self.entries[key] = (value, self.clock() + self.ttl)
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+                    self.evicted += 1
+        return value
+
+    def invalidate(self, *keys):
+        with self.lock:
+            self.generation += 1
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def invalidate_kind(self, kind):
+        """Сбрасывает все ключи одного вида (после пакетного изменения)"""
+        with self.lock:
+            self.generation += 1
+            for key in [key for key in self.entries if key[0] == kind]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+    def stats(self):
+        """Счетчики для подбора размера и времени жизни: попадания, промахи, устаревшие,
+        вытесненные записи, текущий размер и доля попаданий"""
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'evicted': self.evicted,
+                'size': len(self.entries),
+                'hit_rate': self.hits / requests if requests else 0.0,
+            }
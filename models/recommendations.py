@@ -0,0 +1,145 @@
+"""Полная пересборка рекомендаций "С этим товаром покупают" по истории заказов.
+
+Матрица совместных покупок разреженная: ключ пары - product_id * P + neighbour_id, где
+P больше любого номера товара, значение - число заказов, где товары куплены вместе.
+Память ограничена на всех шагах:
+  1. первый проход по позициям заказов считает число пар и выбирает, на сколько
+     разделов (по product_id) разбить матрицу, чтобы раздел помещался в MAX_PAIRS_IN_MEMORY;
+  2. второй проход порциями строит пары средствами NumPy, сворачивает повторы внутри
+     порции и дописывает их во временные файлы разделов;
+  3. каждый раздел по отдельности суммируется, от каждого товара остаются
+     RECOMMENDATIONS_STORED соседей с наибольшим счетом.
+Результат пишется в отдельную таблицу и одной транзакцией подменяет текущую; заказы,
+оформленные во время пересборки, добавляются в нее так же, как при оформлении.
+
+Запуск: python -m models.jobs rebuild-recommendations [--db data/database.db]
+"""
+import math
+import os
+import tempfile
+
+import numpy as np
+
+from models.database import RECOMMENDATIONS_STORED
+
+# Сколько пар держится в памяти при суммировании одного раздела (16 байт на пару)
+MAX_PAIRS_IN_MEMORY = 4_000_000
+# Сколько пар строится за раз из позиций заказов (около 50 байт временной памяти на пару)
+PAIRS_PER_CHUNK = 1_000_000
+# Сколько заказов читается из базы за один запрос
+ORDERS_PER_BATCH = 50_000
+# Сколько строк рекомендаций пишется за одну транзакцию
+WRITE_BATCH = 50_000
+
+PAIR_DTYPE = np.dtype([('key', '<i8'), ('count', '<i8')])
+
+
+def order_lines(rows, products):
+    """Позиции порции как массивы (order_id, product_id) без повторов товара в заказе,
+    упорядоченные по заказу"""
+    lines = np.array(rows, dtype=np.int64).reshape(-1, 2)
+    keys = np.unique(lines[:, 0] * products + lines[:, 1])
+    return keys // products, keys % products
+
+
+def order_groups(orders):
+    """Начало и длина каждого заказа в упорядоченном массиве номеров заказов"""
+    starts = np.flatnonzero(np.r_[True, orders[1:] != orders[:-1]])
+    lengths = np.diff(np.r_[starts, len(orders)])
+    return starts, lengths
+
+
+def count_pairs(orders):
+    _, lengths = order_groups(orders)
+    return int(np.sum(lengths * (lengths - 1)))
+
+
+def order_pairs(orders, items, products, max_pairs=PAIRS_PER_CHUNK):
+    """Ключи упорядоченных пар (a, b), a != b, товаров одного заказа порциями не больше
+    max_pairs пар (заказ крупнее лимита образует порцию сам)"""
+    starts, lengths = order_groups(orders)
+    squares = np.cumsum(lengths * lengths)
+    first = 0
+    while first < len(starts):
+        last = max(first + 1, int(np.searchsorted(squares, squares[first] - lengths[first] ** 2 + max_pairs,
+                                                  side='right')))
+        group_starts, group_lengths = starts[first:last], lengths[first:last]
+        # Каждая позиция заказа длины L повторяется L раз и сочетается со всеми позициями заказа
+        line_starts = np.repeat(group_starts, group_lengths)
+        line_lengths = np.repeat(group_lengths, group_lengths)
+        left = np.repeat(np.arange(group_starts[0], group_starts[-1] + group_lengths[-1]), line_lengths)
+        offsets = np.arange(len(left)) - np.repeat(np.cumsum(line_lengths) - line_lengths, line_lengths)
+        right = np.repeat(line_starts, line_lengths) + offsets
+        distinct = left != right
+        yield items[left[distinct]] * products + items[right[distinct]]
+        first = last
+
+
+def top_neighbours(keys, counts, products, limit):
+    """Строки (product_id, neighbour_id, score): не больше limit соседей с наибольшим счетом
+    на товар; при равном счете - с меньшим номером"""
+    product_ids, neighbour_ids = keys // products, keys % products
+    order = np.lexsort((neighbour_ids, -counts, product_ids))
+    product_ids, neighbour_ids, counts = product_ids[order], neighbour_ids[order], counts[order]
+    starts, lengths = order_groups(product_ids)
+    rank = np.arange(len(product_ids)) - np.repeat(starts, lengths)
+    keep = rank < limit
+    return np.column_stack((product_ids[keep], neighbour_ids[keep], counts[keep]))
+
+
+def rebuild(db, limit=RECOMMENDATIONS_STORED, max_pairs=MAX_PAIRS_IN_MEMORY, orders_per_batch=ORDERS_PER_BATCH):
+    """Пересобирает рекомендации по всем заказам; возвращает статистику пересборки"""
+    first_order_id, last_order_id = db.get_order_id_range()
+    products = db.get_max_product_id() + 1
+    stats = {'orders': 0, 'lines': 0, 'pairs': 0, 'partitions': 0, 'rows': 0}
+    db.begin_recommendations_build()
+    if last_order_id is None:
+        db.finish_recommendations_build(None)
+        return stats
+
+    # 1. Сколько пар даст история заказов
+    for rows in db.iter_order_lines(first_order_id, last_order_id, orders_per_batch):
+        if rows:
+            orders, _ = order_lines(rows, products)
+            stats['orders'] += len(order_groups(orders)[0])
+            stats['lines'] += len(orders)
+            stats['pairs'] += count_pairs(orders)
+    partitions = max(1, math.ceil(stats['pairs'] / max_pairs))
+    stats['partitions'] = partitions
+
+    with tempfile.TemporaryDirectory(prefix='eshop-recommendations-') as directory:
+        paths = [os.path.join(directory, f"{partition}.pairs") for partition in range(partitions)]
+        # 2. Пары порциями, свернутые внутри порции, раскладываются по разделам
+        files = [open(path, 'wb') for path in paths]
+        try:
+            for rows in db.iter_order_lines(first_order_id, last_order_id, orders_per_batch):
+                if not rows:
+                    continue
+                orders, items = order_lines(rows, products)
+                for keys in order_pairs(orders, items, products):
+                    keys, counts = np.unique(keys, return_counts=True)
+                    chunk = np.empty(len(keys), dtype=PAIR_DTYPE)
+                    chunk['key'], chunk['count'] = keys, counts
+                    partition_of = keys // products % partitions
+                    for partition in np.unique(partition_of):
+                        chunk[partition_of == partition].tofile(files[partition])
+        finally:
+            for file in files:
+                file.close()
+
+        # 3. Раздел суммируется целиком, от товара остаются лучшие соседи
+        for path in paths:
+            pairs = np.fromfile(path, dtype=PAIR_DTYPE)
+            os.remove(path)
+            if not len(pairs):
+                continue
+            keys, inverse = np.unique(pairs['key'], return_inverse=True)
+            counts = np.bincount(inverse, weights=pairs['count']).astype(np.int64)
+            del pairs, inverse
+            rows = top_neighbours(keys, counts, products, limit)
+            for start in range(0, len(rows), WRITE_BATCH):
+                db.add_recommendations_build(rows[start:start + WRITE_BATCH].tolist())
+            stats['rows'] += len(rows)
+
+    db.finish_recommendations_build(last_order_id)
+    return stats
@@ -0,0 +1,136 @@
+"""Строки, которые возвращают методы Database.
+
+Классы со __slots__ создаются прямо из строки курсора через row_factory: у объекта нет
+__dict__, поэтому он не тяжелее кортежа, а экраны обращаются к полям по именам, а не по
+позициям. Столбцы, не выбранные запросом (например, описание в списках товаров), равны None.
+Строки сравниваются и перебираются как кортежи своих полей - так они сохраняются в снимок.
+"""
+import sqlite3
+
+
+class Row:
+    __slots__ = ()
+
+    def __iter__(self):
+        return (getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        return type(other) is type(self) and tuple(self) == tuple(other)
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+    @classmethod
+    def factory(cls, cursor, row):
+        """row_factory: строка курсора -> объект класса"""
+        return cls(*row)
+
+
+class KeyedCursor(sqlite3.Cursor):
+    """Курсор постраничных запросов, см. keyed_factory"""
+
+    key = None
+
+
+def keyed_factory(cls):
+    """row_factory для KeyedCursor: последний столбец строки - ключ следующей страницы.
+
+    Ключ в объект строки не попадает; после выборки в cursor.key остается ключ последней строки.
+    """
+    def factory(cursor, row):
+        cursor.key = row[-1]
+        return cls(*row[:-1])
+    return factory
+
+
+class Product(Row):
+    """Товар; available - остаток за вычетом резервов (только в get_product), None - без ограничения"""
+
+    __slots__ = ('id', 'name', 'price', 'description', 'image_path', 'available')
+
+    def __init__(self, id, name, price, description=None, image_path=None, available=None):
+        self.id = id
+        self.name = name
+        self.price = price
+        self.description = description
+        self.image_path = image_path
+        self.available = available
+
+
+class SellerProduct(Row):
+    """Товар в таблице товаров продавца; category - название категории, description выбирается
+    только для выгрузки"""
+
+    __slots__ = ('id', 'name', 'price', 'stock', 'category_id', 'category', 'description')
+
+    def __init__(self, id, name, price, stock, category_id, category, description=None):
+        self.id = id
+        self.name = name
+        self.price = price
+        self.stock = stock
+        self.category_id = category_id
+        self.category = category
+        self.description = description
+
+
+class Category(Row):
+    __slots__ = ('id', 'name', 'parent_id')
+
+    def __init__(self, id, name, parent_id=None):
+        self.id = id
+        self.name = name
+        self.parent_id = parent_id
+
+
+class CartLine(Row):
+    """Строка корзины: сумма считается по текущей цене товара"""
+
+    __slots__ = ('id', 'name', 'quantity', 'price', 'total', 'product_id')
+
+    def __init__(self, id, name, quantity, price, total, product_id=None):
+        self.id = id
+        self.name = name
+        self.quantity = quantity
+        self.price = price
+        self.total = total
+        self.product_id = product_id
+
+
+class Order(Row):
+    __slots__ = ('id', 'created_at', 'status', 'total')
+
+    def __init__(self, id, created_at, status, total):
+        self.id = id
+        self.created_at = created_at
+        self.status = status
+        self.total = total
+
+
+class OrderLine(Row):
+    """Позиция заказа с ценой на момент оформления"""
+
+    __slots__ = ('name', 'quantity', 'price')
+
+    def __init__(self, name, quantity, price):
+        self.name = name
+        self.quantity = quantity
+        self.price = price
+
+
+class User(Row):
+    __slots__ = ('id', 'phone', 'password', 'role', 'name')
+
+    def __init__(self, id, phone, password, role, name):
+        self.id = id
+        self.phone = phone
+        self.password = password
+        self.role = role
+        self.name = name
+
+    @property
+    def is_seller(self):
+        return self.role == 'Продавец'
@@ -0,0 +1,38 @@
+"""Начальное наполнение базы.
+
+Приложение при запуске данные не добавляет: пустая база заполняется этой командой.
+Без аргументов добавляются тестовый продавец, дерево категорий и несколько товаров;
+с --items дополнительно импортируется каталог (например, items.txt). Новые товары
+каталога принадлежат тестовому продавцу.
+
+Запуск: python -m models.seed [--db data/database.db] [--items items.txt]
+"""
+import argparse
+import sys
+
+from models.database import SEED_SELLER_PHONE, Database
+from models.importer import BulkImporter, iter_records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Начальное наполнение базы данных")
+    parser.add_argument('--db', default='data/database.db', help="путь к базе данных")
+    parser.add_argument('--items', help="каталог товаров для импорта (items.txt, .csv или .jsonl)")
+    parser.add_argument('--default-category', default='Бытовые предметы',
+                        help="категория для импортируемых товаров, не подошедших ни под одно правило")
+    args = parser.parse_args(argv)
+
+    db = Database(args.db)
+    db.initialize_data()
+    print(f"База {db.db_path} готова")
+
+    if args.items:
+        seller = db.get_user(SEED_SELLER_PHONE)
+        importer = BulkImporter(db, args.default_category, seller_id=seller.id if seller else None)
+        imported, skipped, rate = importer.run(iter_records(args.items))
+        print(f"Импортировано: {imported}, пропущено: {skipped}, {rate:,.0f} строк/с")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
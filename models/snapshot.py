@@ -0,0 +1,55 @@
+"""Снимок первого экрана каталога.
+
+При запуске главное окно рисует корневой каталог из снимка, сделанного в прошлый раз,
+не дожидаясь SQL, а затем сверяет его с базой в фоне. Снимок лежит рядом с файлом БД:
+дерево категорий (id, name, parent_id) и первая страница товаров (поля Product) с курсором.
+"""
+import json
+import os
+import tempfile
+
+from models.database import SCHEMA_VERSION
+from models.rows import Product
+
+SNAPSHOT_NAME = 'startup_snapshot.json'
+
+
+def snapshot_path(db_path):
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), SNAPSHOT_NAME)
+
+
+def load_snapshot(db_path):
+    """Возвращает (строки дерева категорий, (строки первой страницы, курсор)) или None"""
+    try:
+        with open(snapshot_path(db_path), encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # Снимок другой базы или другой версии схемы не подходит
+    if data.get('schema') != SCHEMA_VERSION or data.get('db') != os.path.basename(db_path):
+        return None
+    cursor = data['cursor']
+    return ([tuple(row) for row in data['categories']],
+            ([Product(*row) for row in data['products']], tuple(cursor) if cursor is not None else None))
+
+
+def save_snapshot(db_path, category_rows, first_page):
+    rows, cursor = first_page
+    data = {
+        'schema': SCHEMA_VERSION,
+        'db': os.path.basename(db_path),
+        'categories': category_rows,
+        'products': [tuple(row) for row in rows],
+        'cursor': cursor,
+    }
+    path = snapshot_path(db_path)
+    # Запись во временный файл и переименование: при сбое останется прежний снимок
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,62 @@
+import hashlib
+import os
+import tempfile
+
+from PIL import Image, ImageOps
+
+# Наибольшая сторона сохраняемого изображения и качество JPEG
+MAX_IMAGE_SIZE = 1200
+JPEG_QUALITY = 85
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path):
+    """SHA-256 файла, читаемого потоково порциями по CHUNK_SIZE"""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def ingest_image(source_path, images_dir='data/images', max_size=MAX_IMAGE_SIZE):
+    """Сохраняет изображение товара в хранилище и возвращает (путь, ширина, высота).
+
+    Файл называется по хэшу содержимого оригинала, поэтому одинаковые фотографии хранятся
+    один раз, а имена не конфликтуют. Оригинал уменьшается до max_size по большей стороне
+    и перекодируется: JPEG, или PNG, если у изображения есть прозрачность.
+    """
+    digest = file_digest(source_path)
+    os.makedirs(images_dir, exist_ok=True)
+
+    for extension in ('.jpg', '.png'):
+        existing = os.path.join(images_dir, digest + extension)
+        if os.path.exists(existing):
+            with Image.open(existing) as image:
+                return existing, image.width, image.height
+
+    with Image.open(source_path) as image:
+        # Для JPEG декодер сразу уменьшает изображение в 2-8 раз - это во много раз быстрее
+        image.draft('RGB', (max_size, max_size))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        if has_alpha:
+            image = image.convert('RGBA')
+            extension, save_args = '.png', {'format': 'PNG', 'optimize': True}
+        else:
+            image = image.convert('RGB')
+            extension, save_args = '.jpg', {'format': 'JPEG', 'quality': JPEG_QUALITY, 'optimize': True}
+
+        target = os.path.join(images_dir, digest + extension)
+        # Запись во временный файл и атомарное переименование: недописанный файл не появится
+        fd, tmp_path = tempfile.mkstemp(dir=images_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                image.save(f, **save_args)
+            os.replace(tmp_path, target)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        return target, image.width, image.height
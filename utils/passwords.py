@@ -0,0 +1,89 @@
+"""Хэширование паролей scrypt.
+
+Пароль хранится строкой scrypt$N$r$p$соль$хэш (соль и хэш в hex). Стоимость проверки
+задается параметрами N (число блоков, степень двойки), r (размер блока) и p (число
+проходов): время и память растут пропорционально N * r, память - 128 * N * r байт.
+По умолчанию - SCRYPT_COST, на своей машине их подбирает benchmarks.passwords под нужное
+время входа; переменная окружения ESHOP_SCRYPT_COST задает их в виде "N,r,p".
+
+Строки без префикса scrypt$ - пароли открытым текстом из баз прежних версий: они
+проверяются сравнением, а needs_rehash() сообщает, что при входе пароль нужно
+перехэшировать (как и хэш со стоимостью, отличной от текущей).
+"""
+import hashlib
+import hmac
+import os
+
+SCRYPT_COST_ENV = 'ESHOP_SCRYPT_COST'
+# N, r, p: около 50 мс и 32 МБ на проверку на обычном настольном процессоре
+SCRYPT_COST = (2 ** 15, 8, 1)
+# Предел памяти одной проверки: хэш с большей стоимостью (например, подмененный в базе)
+# не проверяется вовсе, а не занимает процессор и память без ограничения
+MAX_MEMORY = 256 * 2 ** 20
+SALT_SIZE = 16
+HASH_SIZE = 32
+PREFIX = 'scrypt'
+
+
+def default_cost():
+    value = os.environ.get(SCRYPT_COST_ENV)
+    if not value:
+        return SCRYPT_COST
+    n, r, p = (int(part) for part in value.split(','))
+    return n, r, p
+
+
+def memory_needed(n, r, p):
+    """Память scrypt с параметрами N, r, p, байт"""
+    return 128 * r * (n + p + 2)
+
+
+def derive(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode('utf-8'), salt=salt, n=n, r=r, p=p,
+                          maxmem=memory_needed(n, r, p) + 2 ** 20, dklen=HASH_SIZE)
+
+
+def hash_password(password, cost=None):
+    """Хэш пароля для хранения в users.password"""
+    n, r, p = cost or default_cost()
+    salt = os.urandom(SALT_SIZE)
+    return f"{PREFIX}${n}${r}${p}${salt.hex()}${derive(password, salt, n, r, p).hex()}"
+
+
+def parse(stored):
+    """(N, r, p, соль, хэш) из хранимой строки или None, если это не хэш scrypt"""
+    parts = stored.split('$')
+    if len(parts) != 6 or parts[0] != PREFIX:
+        return None
+    try:
+        return int(parts[1]), int(parts[2]), int(parts[3]), bytes.fromhex(parts[4]), bytes.fromhex(parts[5])
+    except ValueError:
+        return None
+
+
+def is_hashed(stored):
+    return stored.startswith(PREFIX + '$')
+
+
+def verify_password(password, stored):
+    """Совпадает ли пароль с хранимым (хэшем или, в старой базе, открытым текстом)"""
+    if not is_hashed(stored):
+        return hmac.compare_digest(password.encode('utf-8'), stored.encode('utf-8'))
+    parsed = parse(stored)
+    if parsed is None:
+        return False
+    n, r, p, salt, expected = parsed
+    if memory_needed(n, r, p) > MAX_MEMORY:
+        return False
+    try:
+        actual = derive(password, salt, n, r, p)
+    except ValueError:
+        # Недопустимые параметры: N не степень двойки и т.п.
+        return False
+    return hmac.compare_digest(actual, expected)
+
+
+def needs_rehash(stored, cost=None):
+    """Пароль хранится открытым текстом или со стоимостью, отличной от текущей"""
+    parsed = parse(stored) if is_hashed(stored) else None
+    return parsed is None or parsed[:3] != tuple(cost or default_cost())
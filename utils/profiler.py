@@ -0,0 +1,305 @@
+"""Профилировщик запросов и отрисовки.
+
+Выключенный профилировщик ничего не стоит: методы классов оборачиваются только в enable()
+и восстанавливаются в disable(), там же с соединений снимается trace callback. Включенный
+записывает для каждого вызова длительность, поток, число возвращенных строк и SQL,
+выполненный внутри вызова (через trace callback соединения), и собирает по каждой
+операции гистограмму длительностей.
+
+    from utils.profiler import profiler
+    profiler.register(Database, category='sql')
+    profiler.enable()
+    with profiler.span('build_page', 'ui'):
+        ...
+    profiler.export_chrome_trace('trace.json')  # открыть в chrome://tracing или Perfetto
+"""
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import weakref
+from collections import deque
+
+# Переменная окружения, включающая профилировщик при запуске; значение, оканчивающееся
+# на .json, - путь, куда сохранить трассу при выходе
+PROFILE_ENV = 'ESHOP_PROFILE'
+# Сколько последних вызовов хранится для экспорта трассы
+MAX_SPANS = 100_000
+# Сколько SQL-запросов запоминается в одном вызове
+MAX_QUERIES_PER_SPAN = 50
+HISTOGRAM_BUCKETS = 40
+
+
+def public_methods(cls):
+    """Имена публичных методов, объявленных в самом классе"""
+    return [name for name, value in vars(cls).items()
+            if not name.startswith('_') and inspect.isfunction(value)]
+
+
+def count_rows(result):
+    """Число строк в результате метода: список строк или (строки, курсор) при постраничной выборке"""
+    if result is None:
+        return None
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, tuple) and result and isinstance(result[0], list):
+        return len(result[0])
+    return 1
+
+
+class Span:
+    """Один вызов: имя операции, категория, начало и длительность в наносекундах"""
+
+    def __init__(self, profiler, name, category, args):
+        self.profiler = profiler
+        self.name = name
+        self.category = category
+        self.args = args
+        self.thread_id = threading.get_ident()
+        self.queries = []
+        self.rows = None
+        self.start_ns = 0
+        self.duration_ns = 0
+
+    def __enter__(self):
+        self.profiler.push(self)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration_ns = time.perf_counter_ns() - self.start_ns
+        if exc_type is not None:
+            self.args = dict(self.args or {}, error=exc_type.__name__)
+        self.profiler.pop(self)
+        return False
+
+
+class NullSpan:
+    """Заглушка span() при выключенном профилировщике"""
+
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Histogram:
+    """Сводка по операции: число вызовов, суммарное и наибольшее время, строки и
+    логарифмическая гистограмма (корзина i - длительности от 2^(i-1) до 2^i микросекунд)"""
+
+    def __init__(self, name, category):
+        self.name = name
+        self.category = category
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.rows = 0
+        self.queries = 0
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+
+    def add(self, span):
+        self.count += 1
+        self.total_ns += span.duration_ns
+        self.max_ns = max(self.max_ns, span.duration_ns)
+        self.rows += span.rows or 0
+        self.queries += len(span.queries)
+        bucket = min((span.duration_ns // 1000).bit_length(), HISTOGRAM_BUCKETS - 1)
+        self.buckets[bucket] += 1
+
+    def percentile(self, fraction):
+        """Верхняя граница корзины, в которую попадает заданная доля вызовов, в миллисекундах"""
+        threshold = self.count * fraction
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= threshold:
+                return min((1 << bucket) / 1000, self.max_ns / 1e6)
+        return self.max_ns / 1e6
+
+    @property
+    def mean_ms(self):
+        return self.total_ns / self.count / 1e6 if self.count else 0.0
+
+
+class Profiler:
+    def __init__(self, max_spans=MAX_SPANS):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.targets = []
+        self.patched = []
+        self.spans = deque(maxlen=max_spans)
+        self.histograms = {}
+        self.origin_ns = time.perf_counter_ns()
+        # Объект с атрибутом conn -> (соединение с назначенным trace callback, поток соединения)
+        self.traced = weakref.WeakKeyDictionary()
+        # Соединения других потоков, с которых после disable() еще надо снять trace callback
+        self.stale = weakref.WeakKeyDictionary()
+
+    def register(self, cls, names=None, category='app'):
+        """Добавляет методы класса (по умолчанию все публичные) в список профилируемых"""
+        names = list(names) if names is not None else public_methods(cls)
+        self.targets.append((cls, names, category))
+        if self.enabled:
+            self.patch(cls, names, category)
+
+    def enable(self):
+        if self.enabled:
+            return
+        for cls, names, category in self.targets:
+            self.patch(cls, names, category)
+        self.enabled = True
+
+    def disable(self):
+        if not self.enabled:
+            return
+        self.enabled = False
+        for cls, name, original in reversed(self.patched):
+            setattr(cls, name, original)
+        self.patched = []
+        # Соединение принимает set_trace_callback только из своего потока: соединения
+        # других потоков освобождаются в release() при следующем обращении к ним
+        thread_id = threading.get_ident()
+        with self.lock:
+            traced, self.traced = self.traced, weakref.WeakKeyDictionary()
+            for owner, (conn, owner_thread) in list(traced.items()):
+                if owner_thread == thread_id:
+                    conn.set_trace_callback(None)
+                else:
+                    self.stale[owner] = conn
+
+    def reset(self):
+        with self.lock:
+            self.spans.clear()
+            self.histograms = {}
+
+    def patch(self, cls, names, category):
+        for name in names:
+            original = cls.__dict__.get(name)
+            if original is None:
+                continue
+            self.patched.append((cls, name, original))
+            setattr(cls, name, self.wrap(original, f"{cls.__name__}.{name}", category))
+
+    def wrap(self, function, name, category):
+        profiler = self
+
+        @functools.wraps(function)
+        def wrapper(obj, *args, **kwargs):
+            conn = getattr(obj, 'conn', None)
+            if conn is not None:
+                profiler.trace(obj, conn)
+            with Span(profiler, name, category, None) as span:
+                result = function(obj, *args, **kwargs)
+                span.rows = count_rows(result)
+            return result
+
+        return wrapper
+
+    def span(self, name, category='app', **args):
+        """Контекстный менеджер для произвольного участка кода"""
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, category, args or None)
+
+    def trace(self, owner, conn):
+        # Соединение используется только своим потоком, поэтому callback ставится из него же
+        traced = self.traced.get(owner)
+        if traced is not None and traced[0] is conn:
+            return
+        conn.set_trace_callback(self.on_statement)
+        with self.lock:
+            if self.enabled:
+                self.stale.pop(owner, None)
+                self.traced[owner] = (conn, threading.get_ident())
+            else:
+                # disable() прошел, пока вызов ставил callback
+                self.stale[owner] = conn
+
+    def release(self, owner):
+        """Снимает trace callback, оставшийся после disable(), с соединения owner.conn;
+        вызывается из потока этого соединения"""
+        if not self.stale:
+            return
+        with self.lock:
+            conn = self.stale.pop(owner, None)
+        if conn is not None:
+            conn.set_trace_callback(None)
+
+    def on_statement(self, statement):
+        stack = getattr(self.local, 'stack', None)
+        if self.enabled and stack:
+            queries = stack[-1].queries
+            if len(queries) < MAX_QUERIES_PER_SPAN:
+                queries.append(' '.join(statement.split()))
+
+    def push(self, span):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        stack.append(span)
+
+    def pop(self, span):
+        self.local.stack.pop()
+        with self.lock:
+            self.spans.append(span)
+            histogram = self.histograms.get(span.name)
+            if histogram is None:
+                histogram = self.histograms[span.name] = Histogram(span.name, span.category)
+            histogram.add(span)
+
+    def top(self, n=20, key='total'):
+        """Самые затратные операции: key - total (суммарное время), max или mean"""
+        keys = {
+            'total': lambda h: h.total_ns,
+            'max': lambda h: h.max_ns,
+            'mean': lambda h: h.mean_ms,
+        }
+        with self.lock:
+            histograms = list(self.histograms.values())
+        return sorted(histograms, key=keys[key], reverse=True)[:n]
+
+    def slowest(self, n=20):
+        """Самые долгие отдельные вызовы из сохраненных"""
+        with self.lock:
+            spans = list(self.spans)
+        return sorted(spans, key=lambda span: span.duration_ns, reverse=True)[:n]
+
+    def export_chrome_trace(self, path):
+        """Сохраняет вызовы в формате Chrome Trace Event (chrome://tracing, Perfetto)"""
+        with self.lock:
+            spans = list(self.spans)
+        pid = os.getpid()
+        events = []
+        for span in spans:
+            args = dict(span.args or {})
+            if span.rows is not None:
+                args['rows'] = span.rows
+            if span.queries:
+                args['queries'] = span.queries
+            events.append({
+                'name': span.name,
+                'cat': span.category,
+                'ph': 'X',
+                'ts': (span.start_ns - self.origin_ns) / 1000,
+                'dur': span.duration_ns / 1000,
+                'pid': pid,
+                'tid': span.thread_id,
+                'args': args,
+            })
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return len(events)
+
+
+profiler = Profiler()
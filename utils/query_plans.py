@@ -0,0 +1,228 @@
+"""Проверка планов запросов Database.
+
+Все публичные методы Database вызываются на временной копии базы, каждый выполненный
+запрос перехватывается через trace-callback и прогоняется через EXPLAIN QUERY PLAN.
+Проверка падает, если какой-либо запрос читает таблицу полным перебором (SCAN) или если
+появился публичный метод, который здесь не вызывается.
+
+Запуск: python -m utils.query_plans
+"""
+import re
+import sys
+import uuid
+import tempfile
+from pathlib import Path
+
+from models.database import Database
+from models.recommendations import rebuild as rebuild_recommendations
+
+# Методы, которые создают и настраивают базу, а не обслуживают экраны
+SETUP_METHODS = {'connect', 'transaction', 'schema_version', 'create_tables', 'apply_migrations',
+                 'initialize_data'}
+
+SCAN_RE = re.compile(r'^SCAN (?!\(|CONSTANT ROW)(\S+)')
+
+# Запросы, которым полный перебор нужен по смыслу: запрос -> причина
+ALLOWED_SCANS = {
+    "SELECT id, name, parent_id FROM categories": "дерево категорий читается целиком один раз на процесс",
+    "SELECT category_id, COUNT(*) FROM products GROUP BY category_id":
+        "число товаров по категориям всего каталога без фильтров: покрывающий индекс читается в фоне "
+        "после первой страницы",
+    "SELECT 1 FROM archive.sqlite_master WHERE name = 'order_items'":
+        "проверка схемы архива при его подключении: в каталоге схемы четыре строки",
+}
+
+
+def exercise(db):
+    """Вызывает все публичные методы Database с правдоподобными аргументами"""
+    # Уникальные значения позволяют проверять и копию рабочей базы
+    suffix = uuid.uuid4().hex[:8]
+    phone = f"+7-plan-{suffix}"
+
+    user_id = db.add_user('Проверка', phone, 'secret', 'Покупатель')
+    seller_id = db.add_user('Проверка', f"{phone}-seller", 'secret', 'Продавец')
+    db.get_user(phone)
+    db.update_user(user_id, 'Проверка', phone)
+    db.update_user(user_id, 'Проверка', phone, 'new-secret')
+    db.rehash_password(user_id, db.get_user(phone).password, 'scrypt$rehashed')
+
+    db.cache_stats()
+    db.clear_cache()
+    db.invalidate_category_tree()
+    db.get_category_tree()
+    db.get_categories()
+    db.get_categories(parent_id=3)
+    db.add_category(f"Проверочная категория {suffix}", 3)
+
+    product_id = db.add_product(f"Проверочный товар {suffix}", 100, 'Описание', None, 10, seller_id=seller_id)
+    db.get_product(product_id)
+    db.upsert_products([(f"Проверочный товар {suffix}", 120, 'Описание', 10)])
+    for sort in ('id', 'price', 'name', 'created_at'):
+        for category_id in (None, 10):
+            for descending in (False, True):
+                rows, cursor = db.get_products_page(category_id, sort, descending, limit=1)
+                db.get_products_page(category_id, sort, descending, cursor, limit=1)
+            for category_id in (3, 10):
+                rows, cursor = db.get_products_page(category_id, sort, limit=1, subtree=True)
+                db.get_products_page(category_id, sort, cursor=cursor, limit=1, subtree=True)
+    list(db.iter_products(10, page_size=2))
+    # Таблица товаров продавца и пакетные изменения
+    db.add_product(f"Проверочный товар {suffix} 2", 200, 'Описание', None, 10, seller_id=seller_id)
+    for sort in ('id', 'name', 'price'):
+        for descending in (False, True):
+            rows, cursor = db.get_seller_products_page(seller_id, sort, descending, limit=1)
+            db.get_seller_products_page(seller_id, sort, descending, cursor, limit=1)
+    list(db.iter_seller_products(seller_id, page_size=1))
+    db.count_seller_products(seller_id)
+    db.update_seller_products(seller_id, [product_id], price=150, category_id=10)
+    db.update_seller_products(seller_id, price_percent=-10)
+    db.get_products_page(limit=1, columns=('name', 'price'))
+    # Фильтры каталога: диапазон цен и бесплатные при каждом порядке, число товаров по подкатегориям
+    for sort, descending in (('id', False), ('price', False), ('price', True), ('name', False), ('created_at', True)):
+        for category_id in (None, 3):
+            for min_price, max_price in ((0, 0), (100, None), (None, 500), (100, 500)):
+                rows, cursor = db.get_products_page(category_id, sort, descending, limit=1, subtree=True,
+                                                    min_price=min_price, max_price=max_price)
+                db.get_products_page(category_id, sort, descending, cursor, limit=1, subtree=True,
+                                     min_price=min_price, max_price=max_price)
+    db.estimate_product_count(3, subtree=True, min_price=0, max_price=0)
+    db.get_category_facets()
+    db.get_category_facets(3, 100, 500)
+    db.get_category_facets(3, 0, 0)
+    db.search_products('вой', limit=1, min_price=0, max_price=1000)
+    list(db.iter_products(3, page_size=2, subtree=True))
+    db.estimate_product_count()
+    db.estimate_product_count(10)
+    db.estimate_product_count(3, subtree=True)
+    rows, cursor = db.search_products('война ми', limit=1)
+    db.search_products('война ми', limit=1, cursor=cursor)
+    db.search_products('война ', limit=1)
+    db.search_products('')
+
+    item_id = db.add_to_cart(user_id, product_id, 2)
+    db.add_to_cart(user_id, product_id, 1)
+    db.get_cart_items(user_id)
+    db.get_cart_item(item_id)
+    db.get_cart_total(user_id)
+    db.remove_from_cart(item_id)
+    db.add_to_cart(user_id, product_id, 1)
+    # Второй товар в заказе дает пару для рекомендаций
+    db.add_to_cart(user_id, db.add_product(f"Сопутствующий товар {suffix}", 50, 'Описание', None, 10), 1)
+    order_id = db.checkout(user_id)
+    db.checkout(user_id)
+
+    # Товар с ограниченным остатком: резерв при добавлении и списание при оформлении
+    db.set_stock(product_id, 5)
+    # Пакет изменений корзины: нехватка остатка уменьшает строку, 0 удаляет ее
+    db.apply_cart_changes(user_id, [(product_id, 9), (product_id, 0)])
+    db.add_to_cart(user_id, product_id, 2)
+    db.get_product(product_id)
+    db.checkout(user_id, (suffix, 3))
+    # Восстановление журнала корзины: строки до оформленного заказа пропускаются
+    db.apply_cart_changes(user_id, [(product_id, 1, 2), (product_id, 0, 4)], suffix)
+    db.release_expired_reservations()
+    db.get_orders(user_id)
+    db.get_order(order_id)
+    db.get_order_items(order_id)
+
+    # Сводки продаж: заказы проверки отдаются дозаполнению, как история до появления триггера
+    # (в копии базы они посчитаются дважды - на проверку планов это не влияет)
+    with db.transaction() as cursor:
+        cursor.execute("INSERT INTO sales_backfill (id, next_order_id, last_order_id) VALUES (1, ?, ?)",
+                       (order_id, order_id))
+    db.get_sales_backfill_remaining()
+    db.rebuild_sales_summary()
+    db.backfill_sales_summary(batch_size=1)
+    db.get_sales_by_day(seller_id, '2000-01-01')
+    db.get_sales_by_product(seller_id, '2000-01-01')
+    db.get_sales_by_category(seller_id, '2000-01-01')
+
+    # Архив заказов: переносятся все заказы (сводки досчитываются заранее - недосчитанные
+    # заказы остаются в горячей базе), после чего чтение заказов и истории идет и в архив
+    while db.backfill_sales_summary():
+        pass
+    db.archive_orders(older_than_days=-1)
+    db.get_orders(user_id)
+    db.get_orders(user_id, archived=True)
+    db.get_order(order_id)
+    db.get_order_items(order_id)
+    db.release_free_pages()
+    db.enable_incremental_vacuum()
+    db.rebuild_sales_summary()
+    db.backfill_sales_summary(batch_size=1)
+
+    # Рекомендации: оформление выше уже пополнило их, полная пересборка читает все заказы
+    db.get_recommendations(product_id)
+    rebuild_recommendations(db)
+    # Пересборка подменяет таблицу; пустая таблица пересборки нужна для разбора планов ее записи
+    db.begin_recommendations_build()
+
+
+def collect_queries(db):
+    """Возвращает запросы, выполненные методами Database, и список непроверенных методов"""
+    statements = []
+    called = set()
+
+    class Recorder:
+        def __getattr__(self, name):
+            called.add(name)
+            return getattr(db, name)
+
+    db.conn.set_trace_callback(statements.append)
+    try:
+        exercise(Recorder())
+    finally:
+        db.conn.set_trace_callback(None)
+
+    public = {name for name in dir(Database) if not name.startswith('_') and callable(getattr(Database, name))}
+    missed = sorted(public - SETUP_METHODS - called)
+    return list(dict.fromkeys(statements)), missed
+
+
+def find_scans(conn, statements):
+    """Возвращает [(запрос, строка плана)] для запросов с полным перебором таблицы.
+
+    Перебор допустим, только если запрос ограничен LIMIT и строки уже идут в нужном порядке
+    (без временного B-дерева): тогда чтение останавливается после первой страницы.
+    """
+    offenders = []
+    for statement in statements:
+        keyword = statement.lstrip().split(None, 1)[0].upper()
+        if keyword not in ('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'WITH'):
+            continue
+        if ' '.join(statement.split()) in ALLOWED_SCANS:
+            continue
+
+        plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {statement}")]
+        bounded = re.search(r'\bLIMIT\b', statement, re.IGNORECASE) is not None \
+            and not any('TEMP B-TREE' in detail for detail in plan)
+        for detail in plan:
+            if SCAN_RE.match(detail) and 'VIRTUAL TABLE' not in detail and not bounded:
+                offenders.append((statement, detail))
+    return offenders
+
+
+def check(source_path=None):
+    """Проверяет все запросы и возвращает список ошибок (пустой, если все хорошо)"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / 'plans.db'
+        if source_path:
+            db_path.write_bytes(Path(source_path).read_bytes())
+        db = Database(str(db_path))
+        db.initialize_data()
+        try:
+            statements, missed = collect_queries(db)
+            errors = [f"Метод не проверяется: Database.{name}" for name in missed]
+            for statement, detail in find_scans(db.conn, statements):
+                errors.append(f"{detail}\n    {' '.join(statement.split())}")
+        finally:
+            db.conn.close()
+    return errors
+
+
+if __name__ == '__main__':
+    problems = check(sys.argv[1] if len(sys.argv) > 1 else None)
+    for problem in problems:
+        print(problem)
+    print("OK" if not problems else f"Найдено проблем: {len(problems)}")
+    sys.exit(1 if problems else 0)
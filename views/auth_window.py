@@ -3,11 +3,23 @@ import sqlite3
 from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel, QLineEdit, QPushButton, QMessageBox, QComboBox
 from PyQt6.QtGui import QFont
 
+from controllers.auth_controller import AuthController
+from models.async_database import AsyncDatabase
+
+
+def async_db_for(main_app):
+    """Общий для окон авторизации фоновый доступ к БД приложения"""
+    if getattr(main_app, 'async_db', None) is None:
+        main_app.async_db = AsyncDatabase(main_app.db.db_path)
+    return main_app.async_db
+
 
 class AuthWindow(QWidget):
     def __init__(self, main_app):
         super().__init__()
         self.main_app = main_app
+        # Создается при первом входе вместе с фоновым доступом к БД
+        self.auth = None
         self.init_ui()
 
     def init_ui(self):
@@ -42,17 +54,23 @@ class AuthWindow(QWidget):
             QMessageBox.warning(self, "Ошибка", "Заполните все поля")
             return
 
-        user = self.main_app.db.get_user(phone)
-        if user and user[2] == password:
-            self.main_app.current_user = {
-                'id': user[0],
-                'phone': user[1],
-                'role': user[3],
-                'name': user[4]
-            }
-            self.main_app.show_main_window()
-        else:
-            QMessageBox.warning(self, "Ошибка", "Неверный телефон или пароль")
+        def check(user):
+            self.login_btn.setEnabled(True)
+            if user is not None:
+                self.main_app.current_user = user
+                self.main_app.show_main_window()
+            else:
+                QMessageBox.warning(self, "Ошибка", "Неверный телефон или пароль")
+
+        def failed(error):
+            self.login_btn.setEnabled(True)
+            QMessageBox.warning(self, "Ошибка", f"Не удалось выполнить запрос: {error}")
+
+        self.login_btn.setEnabled(False)
+        if self.auth is None:
+            self.auth = AuthController(async_db_for(self.main_app), parent=self)
+        # Пароль проверяется scrypt в рабочем потоке, окно на это время не замирает
+        self.auth.login(phone, password, on_result=check, on_error=failed)
 
     def show_register(self):
         self.main_app.stacked_widget.setCurrentIndex(1)
@@ -106,9 +124,17 @@ class RegisterWindow(QWidget):
             QMessageBox.warning(self, "Ошибка", "Заполните все поля")
             return
 
-        try:
-            self.main_app.db.add_user(name, phone, password, role)
+        def done(_):
+            self.register_btn.setEnabled(True)
             QMessageBox.information(self, "Успех", "Регистрация завершена")
             self.main_app.stacked_widget.setCurrentIndex(0)
-        except sqlite3.IntegrityError:
-            QMessageBox.warning(self, "Ошибка", "Пользователь с таким телефоном уже существует")
+
+        def failed(error):
+            self.register_btn.setEnabled(True)
+            if isinstance(error, sqlite3.IntegrityError):
+                QMessageBox.warning(self, "Ошибка", "Пользователь с таким телефоном уже существует")
+            else:
+                QMessageBox.warning(self, "Ошибка", f"Не удалось выполнить запрос: {error}")
+
+        self.register_btn.setEnabled(False)
+        async_db_for(self.main_app).write('add_user', name, phone, password, role, on_result=done, on_error=failed)
@@ -0,0 +1,381 @@
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex, QRect, QSize, QEvent, QTimer, pyqtSignal
+from PyQt6.QtGui import QDoubleValidator
+from PyQt6.QtWidgets import QListView, QStyledItemDelegate, QStyle, QStyleOptionButton, QApplication, QWidget, \
+    QHBoxLayout, QComboBox, QLineEdit, QCheckBox, QLabel
+
+# Роли модели каталога
+ProductIdRole = Qt.ItemDataRole.UserRole + 1
+PriceRole = Qt.ItemDataRole.UserRole + 2
+ImagePathRole = Qt.ItemDataRole.UserRole + 3
+
+ROW_HEIGHT = 120
+# Строк в одной подгружаемой странице
+PAGE_SIZE = 100
+# Столбцы товара, которые нужны карточке списка: описание читается только на странице товара
+LIST_COLUMNS = ('name', 'price', 'image_path')
+# Порядки сортировки каталога: (подпись, ключ, по убыванию)
+SORT_ORDERS = [
+    ("По умолчанию", 'id', False),
+    ("Сначала дешевые", 'price', False),
+    ("Сначала дорогие", 'price', True),
+    ("По названию", 'name', False),
+    ("Сначала новые", 'created_at', True),
+]
+# Фильтры каталога по умолчанию - аргументы get_products_page
+DEFAULT_FILTERS = {'sort': 'id', 'descending': False, 'min_price': None, 'max_price': None}
+# Пауза в наборе цены, после которой применяется фильтр
+PRICE_DELAY_MS = 300
+IMAGE_SIZE = 100
+MARGIN = 6
+BUTTON_WIDTH = 110
+BUTTON_HEIGHT = 30
+
+
+class ProductListModel(QAbstractListModel):
+    """Модель каталога: товары подгружаются страницами по мере прокрутки.
+
+    method - постраничный метод Database (get_products_page, search_products), который
+    принимает cursor и limit и возвращает (строки, курсор следующей страницы); params -
+    остальные его аргументы; выбираются только столбцы LIST_COLUMNS. Страницы запрашиваются
+    в фоне через AsyncDatabase; сигнал loaded приходит после каждой страницы, failed - при
+    ошибке запроса. initial_page - уже известная первая страница (строки, курсор), например
+    из снимка прошлого запуска.
+    """
+
+    loaded = pyqtSignal()
+    failed = pyqtSignal(object)
+
+    def __init__(self, async_db, method='get_products_page', params=None, page_size=PAGE_SIZE, initial_page=None,
+                 parent=None):
+        super().__init__(parent)
+        self.async_db = async_db
+        self.method = method
+        self.params = params or {}
+        self.page_size = page_size
+        self.products = []
+        self.cursor = None
+        self.exhausted = False
+        self.loading = False
+        self.handle = None
+        if initial_page is not None:
+            rows, self.cursor = initial_page
+            self.products = list(rows)
+            self.exhausted = self.cursor is None
+        else:
+            # Первая страница нужна сразу, чтобы понять, есть ли товары вообще
+            self.fetchMore(QModelIndex())
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.products)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+
+        product = self.products[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return product.name
+        if role == ProductIdRole:
+            return product.id
+        if role == PriceRole:
+            return product.price
+        if role == ImagePathRole:
+            return product.image_path
+        return None
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and not self.exhausted and not self.loading
+
+    def fetchMore(self, parent):
+        if not self.canFetchMore(parent):
+            return
+
+        self.loading = True
+        self.handle = self.async_db.read(
+            self.method,
+            cursor=self.cursor, limit=self.page_size, columns=LIST_COLUMNS, **self.params,
+            on_result=self.append_page,
+            on_error=self.fetch_failed
+        )
+
+    def cancel(self):
+        """Отменяет незавершенный запрос страницы - например, устаревший поиск"""
+        if self.handle is not None:
+            self.async_db.cancel(self.handle)
+            self.handle = None
+        self.loading = False
+
+    def resume(self):
+        """Разрешает догрузку после конца списка, например когда добавлен новый товар.
+
+        Догрузка продолжается после последней загруженной строки, поэтому работает только
+        для порядка по умолчанию (по возрастанию id), в котором новые товары идут в конце;
+        для остальных порядков возвращает False - список нужно перечитать (reload).
+        """
+        if self.method != 'get_products_page' \
+                or self.params.get('sort', 'id') != 'id' or self.params.get('descending'):
+            return False
+        if self.exhausted:
+            if self.products:
+                last_id = self.products[-1].id
+                self.cursor = (last_id, last_id)
+            self.exhausted = False
+        return True
+
+    def reload(self):
+        """Перечитывает уже загруженные строки тем же запросом, например когда изменились
+        цены или названия: строки заменяются на месте, и позиция прокрутки сохраняется"""
+        self.cancel()
+        self.loading = True
+        self.handle = self.async_db.read(
+            self.method,
+            cursor=None, limit=max(len(self.products), self.page_size), columns=LIST_COLUMNS, **self.params,
+            on_result=self.replace_rows,
+            on_error=self.fetch_failed
+        )
+
+    def replace_rows(self, page):
+        rows, self.cursor = page
+        self.handle = None
+        self.loading = False
+        self.exhausted = self.cursor is None
+
+        kept = min(len(rows), len(self.products))
+        if len(rows) < len(self.products):
+            self.beginRemoveRows(QModelIndex(), kept, len(self.products) - 1)
+            del self.products[kept:]
+            self.endRemoveRows()
+        self.products[:kept] = rows[:kept]
+        if kept:
+            self.dataChanged.emit(self.index(0), self.index(kept - 1))
+        if len(rows) > kept:
+            self.beginInsertRows(QModelIndex(), kept, len(rows) - 1)
+            self.products.extend(rows[kept:])
+            self.endInsertRows()
+        self.loaded.emit()
+
+    def append_page(self, page):
+        rows, self.cursor = page
+        self.handle = None
+        self.loading = False
+        if self.cursor is None:
+            self.exhausted = True
+
+        if rows:
+            first = len(self.products)
+            self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+            self.products.extend(rows)
+            self.endInsertRows()
+        self.loaded.emit()
+
+    def fetch_failed(self, error):
+        self.handle = None
+        self.loading = False
+        self.exhausted = True
+        self.failed.emit(error)
+
+
+class ProductDelegate(QStyledItemDelegate):
+    """Рисует карточку товара; отрисовываются только видимые строки"""
+
+    details_clicked = pyqtSignal(int)
+
+    def __init__(self, thumbnails, parent=None):
+        super().__init__(parent)
+        self.thumbnails = thumbnails
+
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(), ROW_HEIGHT)
+
+    def paint(self, painter, option, index):
+        painter.save()
+
+        card = option.rect.adjusted(MARGIN // 2, MARGIN // 2, -MARGIN // 2, -MARGIN // 2)
+        if option.state & QStyle.StateFlag.State_MouseOver:
+            painter.fillRect(card, option.palette.alternateBase())
+        painter.setPen(option.palette.mid().color())
+        painter.drawRect(card)
+
+        # Изображение товара
+        text_left = card.left() + MARGIN
+        pixmap = self.thumbnails.pixmap(index.data(ImagePathRole), IMAGE_SIZE)
+        if pixmap is not None:
+            top = card.top() + (card.height() - pixmap.height()) // 2
+            painter.drawPixmap(text_left, top, pixmap)
+            text_left += IMAGE_SIZE + MARGIN
+
+        # Информация о товаре
+        button_rect = self.button_rect(option.rect)
+        text_rect = QRect(text_left, card.top() + MARGIN,
+                          button_rect.left() - MARGIN - text_left, card.height() - 2 * MARGIN)
+        painter.setPen(option.palette.text().color())
+        painter.drawText(
+            text_rect,
+            Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter | Qt.TextFlag.TextWordWrap,
+            f"{index.data()}\nЦена: {index.data(PriceRole)} руб."
+        )
+
+        # Кнопка "Подробнее"
+        button = QStyleOptionButton()
+        button.rect = button_rect
+        button.text = "Подробнее"
+        button.state = QStyle.StateFlag.State_Enabled
+        QApplication.style().drawControl(QStyle.ControlElement.CE_PushButton, button, painter)
+
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.Type.MouseButtonRelease \
+                and self.button_rect(option.rect).contains(event.position().toPoint()):
+            self.details_clicked.emit(index.data(ProductIdRole))
+            return True
+        return super().editorEvent(event, model, option, index)
+
+    def button_rect(self, rect):
+        return QRect(rect.right() - MARGIN - BUTTON_WIDTH,
+                     rect.top() + (rect.height() - BUTTON_HEIGHT) // 2,
+                     BUTTON_WIDTH, BUTTON_HEIGHT)
+
+
+class CatalogView(QListView):
+    """Виртуализированный список товаров категории и всех ее подкатегорий.
+
+    set_query() подменяет источник строк, например на результаты поиска;
+    loaded и failed пересылаются от текущей модели.
+    """
+
+    product_selected = pyqtSignal(int)
+    loaded = pyqtSignal(int)
+    failed = pyqtSignal(object)
+
+    def __init__(self, async_db, thumbnails, category_id=None, initial_page=None, filters=None, parent=None):
+        super().__init__(parent)
+        self.async_db = async_db
+        self.setUniformItemSizes(True)
+        self.setVerticalScrollMode(QListView.ScrollMode.ScrollPerPixel)
+        self.setSelectionMode(QListView.SelectionMode.NoSelection)
+        self.setMouseTracking(True)
+
+        self.set_query('get_products_page', {'category_id': category_id, 'subtree': True, **(filters or {})},
+                       initial_page)
+
+        delegate = ProductDelegate(thumbnails, self)
+        delegate.details_clicked.connect(self.product_selected)
+        self.setItemDelegate(delegate)
+        # Готовое изображение перерисовывает только видимые строки
+        thumbnails.thumbnail_ready.connect(self.on_thumbnail_ready)
+
+        self.doubleClicked.connect(lambda index: self.product_selected.emit(index.data(ProductIdRole)))
+
+    def on_thumbnail_ready(self, image_path, size):
+        if size == IMAGE_SIZE:
+            self.viewport().update()
+
+    def set_query(self, method, params, initial_page=None):
+        old_model = self.model()
+        if old_model is not None:
+            old_model.cancel()
+
+        model = ProductListModel(self.async_db, method, params, initial_page=initial_page, parent=self)
+        model.loaded.connect(lambda: self.loaded.emit(model.rowCount()))
+        model.failed.connect(self.failed)
+        self.setModel(model)
+
+        if old_model is not None:
+            old_model.deleteLater()
+
+
+class CatalogFilters(QWidget):
+    """Панель фильтров каталога: порядок, диапазон цен и "только бесплатные".
+
+    values() - аргументы get_products_page (sort, descending, min_price, max_price);
+    changed приходит с ними сразу после выбора и после паузы в наборе цены.
+    """
+
+    changed = pyqtSignal(dict)
+
+    def __init__(self, values=None, parent=None):
+        super().__init__(parent)
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.sort_combo = QComboBox()
+        for text, sort, descending in SORT_ORDERS:
+            self.sort_combo.addItem(text, (sort, descending))
+        layout.addWidget(self.sort_combo)
+
+        layout.addWidget(QLabel("Цена:"))
+        validator = QDoubleValidator(0, 1e9, 2, self)
+        validator.setNotation(QDoubleValidator.Notation.StandardNotation)
+        self.min_price = QLineEdit()
+        self.min_price.setPlaceholderText("от")
+        self.max_price = QLineEdit()
+        self.max_price.setPlaceholderText("до")
+        for field in (self.min_price, self.max_price):
+            field.setValidator(validator)
+            field.setClearButtonEnabled(True)
+            layout.addWidget(field)
+
+        self.free_only = QCheckBox("Только бесплатные")
+        layout.addWidget(self.free_only)
+        layout.addStretch()
+
+        self.set_values(values or DEFAULT_FILTERS)
+
+        # Цена применяется после паузы в наборе, остальное - сразу
+        self.price_timer = QTimer(self)
+        self.price_timer.setSingleShot(True)
+        self.price_timer.setInterval(PRICE_DELAY_MS)
+        self.price_timer.timeout.connect(self.emit_changed)
+        self.min_price.textChanged.connect(self.price_timer.start)
+        self.max_price.textChanged.connect(self.price_timer.start)
+        self.sort_combo.currentIndexChanged.connect(self.emit_changed)
+        self.free_only.toggled.connect(self.on_free_toggled)
+
+    def values(self):
+        sort, descending = self.sort_combo.currentData()
+        if self.free_only.isChecked():
+            return {'sort': sort, 'descending': descending, 'min_price': 0, 'max_price': 0}
+        return {'sort': sort, 'descending': descending,
+                'min_price': parse_price(self.min_price.text()), 'max_price': parse_price(self.max_price.text())}
+
+    def set_values(self, values):
+        """Показывает фильтры без сигнала changed"""
+        widgets = (self.sort_combo, self.min_price, self.max_price, self.free_only)
+        for widget in widgets:
+            widget.blockSignals(True)
+        orders = [(sort, descending) for _, sort, descending in SORT_ORDERS]
+        order = (values['sort'], values['descending'])
+        self.sort_combo.setCurrentIndex(orders.index(order) if order in orders else 0)
+        free = values['min_price'] == 0 and values['max_price'] == 0
+        self.free_only.setChecked(free)
+        self.min_price.setText("" if free or values['min_price'] is None else f"{values['min_price']:g}")
+        self.max_price.setText("" if free or values['max_price'] is None else f"{values['max_price']:g}")
+        self.min_price.setEnabled(not free)
+        self.max_price.setEnabled(not free)
+        for widget in widgets:
+            widget.blockSignals(False)
+
+    def on_free_toggled(self, checked):
+        self.min_price.setEnabled(not checked)
+        self.max_price.setEnabled(not checked)
+        self.emit_changed()
+
+    def emit_changed(self):
+        self.price_timer.stop()
+        self.changed.emit(self.values())
+
+
+def parse_price(text):
+    """Цена из поля фильтра; пустое или некорректное поле - граница не задана"""
+    try:
+        return float(text.replace(',', '.'))
+    except ValueError:
+        return None
+
+
+def facet_prices(filters):
+    """Часть фильтров, от которой зависит число товаров в подкатегориях: (min_price, max_price)"""
+    return filters['min_price'], filters['max_price']
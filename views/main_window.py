@@ -1,18 +1,121 @@
 import os
-import shutil
 import sqlite3
+from collections import OrderedDict
 
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
 from PyQt6.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QFrame, QPushButton, QScrollArea, \
-    QMessageBox, QLineEdit, QComboBox, QFileDialog
-from PyQt6.QtGui import QFont, QPixmap
+    QMessageBox, QLineEdit, QComboBox, QFileDialog, QStackedWidget, QApplication
+from PyQt6.QtGui import QFont, QKeySequence, QShortcut
+
+from models.async_database import AsyncDatabase
+from models.category_tree import CategoryTree
+from models.database import Database, OutOfStockError
+from models.cart_buffer import CartBuffer
+from models.events import ORDER_CREATED, PRODUCT_ADDED, PRODUCTS_UPDATED
+from models.snapshot import load_snapshot, save_snapshot
+from views.catalog_view import DEFAULT_FILTERS, LIST_COLUMNS, PAGE_SIZE, CatalogFilters, CatalogView, facet_prices
+from utils.image_ingest import ingest_image
+from utils.profiler import PROFILE_ENV, profiler, public_methods
+from views.profiler_dock import ProfilerDock
+from views.sales_dashboard import SalesDashboard
+from views.seller_products import SellerProducts
+from views.thumbnails import ThumbnailCache, ThumbnailLabel, ThumbnailTask
+
+# Пауза в наборе, после которой запускается поиск
+SEARCH_DELAY_MS = 150
+# Сколько построенных экранов хранится для мгновенного возврата
+MAX_CACHED_PAGES = 8
+
+
+class ImageIngestSignals(QObject):
+    finished = pyqtSignal(str, int, int)
+    failed = pyqtSignal(str)
+
+
+class ImageIngestTask(QRunnable):
+    """Хэширует, уменьшает и сохраняет выбранное изображение в фоновом потоке"""
+
+    def __init__(self, source_path):
+        super().__init__()
+        self.source_path = source_path
+        self.signals = ImageIngestSignals()
+
+    def run(self):
+        try:
+            path, width, height = ingest_image(self.source_path)
+        except Exception as error:
+            self.signals.failed.emit(str(error))
+        else:
+            self.signals.finished.emit(path, width, height)
+
+
+class Page(QWidget):
+    """Экран правой панели. route - ключ в кэше экранов (None - экран не кэшируется),
+    ready - экран полностью построен"""
+
+    def __init__(self, route=None, parent=None):
+        super().__init__(parent)
+        self.route = route
+        self.ready = False
+        self.dropped = False
+        self.catalog = None
+        QVBoxLayout(self)
+
+    def add(self, widget):
+        self.layout().addWidget(widget)
+        return widget
+
+
+class CartRow(QFrame):
+    """Строка корзины (по номеру товара), которую можно обновить на месте"""
+
+    remove_clicked = pyqtSignal(int)
+
+    def __init__(self, product_id, parent=None):
+        super().__init__(parent)
+        layout = QHBoxLayout(self)
+        self.name_label = QLabel()
+        self.total_label = QLabel()
+        layout.addWidget(self.name_label)
+        layout.addWidget(self.total_label)
+
+        remove_btn = QPushButton("Удалить")
+        remove_btn.clicked.connect(lambda: self.remove_clicked.emit(product_id))
+        layout.addWidget(remove_btn)
+
+    def set_item(self, item):
+        self.name_label.setText(f"{item.name} x{item.quantity}")
+        self.total_label.setText(f"{item.total} руб.")
 
 
 class MainWindow(QMainWindow):
     def __init__(self, db):
         super().__init__()
         self.db = db
+        # Все запросы из окна выполняются в фоне, чтобы не блокировать цикл событий
+        self.async_db = AsyncDatabase(db.db_path, parent=self)
+        self.thumbnails = ThumbnailCache(parent=self)
+        self.placeholder = None
         self.current_user = None
+        # Корзина текущего пользователя в памяти, пишется в базу пакетами
+        self.cart = None
+        # Построенные экраны по маршрутам; текущий экран
+        self.page_cache = OrderedDict()
+        self.page = None
+        # Дерево категорий последнего построенного каталога и категория, к которой вернет "Назад"
+        self.category_tree = None
+        self.catalog_category = None
+        # Фильтры последнего измененного каталога: с ними открываются остальные категории
+        self.catalog_filters = dict(DEFAULT_FILTERS)
+        # Снимок корневого каталога с прошлого запуска: первый экран рисуется без SQL
+        self.snapshot = load_snapshot(db.db_path)
+        self.snapshot_checked = False
+        self.async_db.changed.connect(self.on_data_changed)
+        # ESHOP_PROFILE=1 включает профилировщик с запуска, ESHOP_PROFILE=trace.json еще и
+        # сохраняет трассу при выходе
+        self.profile_path = os.environ.get(PROFILE_ENV)
+        if self.profile_path:
+            profiler.enable()
         self.init_ui()
 
     def init_ui(self):
@@ -35,6 +138,16 @@ class MainWindow(QMainWindow):
         self.right_panel.setLayout(QVBoxLayout())
         self.main_layout.addWidget(self.right_panel)
 
+        # Экраны правой панели; построенные экраны остаются в стеке и показываются повторно
+        self.pages = QStackedWidget()
+        self.right_panel.layout().addWidget(self.pages)
+
+        # Отладочная панель профилировщика, открывается по Ctrl+Shift+P
+        self.profiler_dock = ProfilerDock(self, cache_stats=self.db.cache_stats)
+        self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.profiler_dock)
+        self.profiler_dock.hide()
+        QShortcut(QKeySequence("Ctrl+Shift+P"), self, activated=self.profiler_dock.toggle)
+
         # Инициализация интерфейса
         self.init_menu()
         self.show_catalog()
@@ -42,20 +155,28 @@ class MainWindow(QMainWindow):
     def init_menu(self):
         # Кнопки меню
         self.catalog_btn = QPushButton("Каталог")
-        self.catalog_btn.clicked.connect(self.show_catalog)
+        self.catalog_btn.clicked.connect(lambda: self.show_catalog())
 
         self.cart_btn = QPushButton("Корзина")
-        self.cart_btn.clicked.connect(self.show_cart)
+        self.cart_btn.clicked.connect(lambda: self.show_cart())
 
         self.orders_btn = QPushButton("Мои заказы")
-        self.orders_btn.clicked.connect(self.show_orders)
+        self.orders_btn.clicked.connect(lambda: self.show_orders())
 
         self.add_product_btn = QPushButton("Добавить товар")
-        self.add_product_btn.clicked.connect(self.show_add_product)
+        self.add_product_btn.clicked.connect(lambda: self.show_add_product())
         self.add_product_btn.setVisible(False)  # Только для продавцов
 
+        self.seller_products_btn = QPushButton("Мои товары")
+        self.seller_products_btn.clicked.connect(lambda: self.show_seller_products())
+        self.seller_products_btn.setVisible(False)  # Только для продавцов
+
+        self.analytics_btn = QPushButton("Аналитика")
+        self.analytics_btn.clicked.connect(lambda: self.show_analytics())
+        self.analytics_btn.setVisible(False)  # Только для продавцов
+
         self.settings_btn = QPushButton("Настройки")
-        self.settings_btn.clicked.connect(self.show_settings)
+        self.settings_btn.clicked.connect(lambda: self.show_settings())
 
         self.logout_btn = QPushButton("Выйти")
         self.logout_btn.clicked.connect(self.logout)
@@ -65,115 +186,269 @@ class MainWindow(QMainWindow):
         self.left_panel.layout().addWidget(self.cart_btn)
         self.left_panel.layout().addWidget(self.orders_btn)
         self.left_panel.layout().addWidget(self.add_product_btn)
+        self.left_panel.layout().addWidget(self.seller_products_btn)
+        self.left_panel.layout().addWidget(self.analytics_btn)
         self.left_panel.layout().addWidget(self.settings_btn)
         self.left_panel.layout().addWidget(self.logout_btn)
         self.left_panel.layout().addStretch()
 
+    def set_user(self, user):
+        """Начинает работу пользователя: корзина читается в память сразу после входа"""
+        self.current_user = user
+        self.cart = CartBuffer(self.async_db, self.db.db_path, user.id, parent=self)
+        self.cart.loaded.connect(self.on_cart_loaded)
+        self.cart.changed.connect(self.on_cart_changed)
+        self.cart.cleared.connect(self.on_cart_cleared)
+        self.cart.shortage.connect(self.on_cart_shortage)
+        self.cart.failed.connect(self.show_error)
+        self.update_menu()
+
     def update_menu(self):
-        # Показываем кнопку добавления товара только для продавцов
-        if self.current_user and self.current_user['role'] == 'Продавец':
-            self.add_product_btn.setVisible(True)
-        else:
-            self.add_product_btn.setVisible(False)
+        # Показываем кнопки добавления товара, своих товаров и аналитики только для продавцов
+        is_seller = self.current_user is not None and self.current_user.is_seller
+        self.add_product_btn.setVisible(is_seller)
+        self.seller_products_btn.setVisible(is_seller)
+        self.analytics_btn.setVisible(is_seller)
 
     def show_catalog(self, category_id=None):
-        # Очищаем правую панель
-        self.clear_right_panel()
+        # Уже построенный экран категории показывается из кэша без запросов
+        page, build = self.open_page(('catalog', category_id))
+        self.catalog_category = category_id
+        if not build:
+            if page.ready and page.filters != self.catalog_filters:
+                page.filter_bar.set_values(self.catalog_filters)
+                self.apply_filters(page, self.catalog_filters)
+            elif page.ready and page.facet_prices != facet_prices(page.filters):
+                self.load_facets(page)
+            return
 
         # Заголовок
         title = QLabel("Каталог товаров")
         title.setFont(QFont('Arial', 16))
-        self.right_panel.layout().addWidget(title)
-
-        # Получаем категории
-        categories = self.db.get_categories(parent_id=category_id)
-
-        if categories:
-            # Отображаем подкатегории
-            for cat_id, cat_name in categories:
-                btn = QPushButton(cat_name)
-                btn.clicked.connect(lambda _, cid=cat_id: self.show_catalog(cid))
-                self.right_panel.layout().addWidget(btn)
-
-        # Получаем товары в текущей категории
-        products = self.db.get_products(category_id)
-
-        if products:
-            scroll = QScrollArea()
-            scroll.setWidgetResizable(True)
-
-            products_widget = QWidget()
-            products_layout = QVBoxLayout(products_widget)
-
-            for prod_id, name, price, description, image_path in products:
-                product_frame = QFrame()
-                product_frame.setFrameShape(QFrame.Shape.Box)
-                product_layout = QHBoxLayout(product_frame)
-
-                # Изображение товара
-                if image_path and os.path.exists(image_path):
-                    pixmap = QPixmap(image_path).scaled(100, 100, Qt.AspectRatioMode.KeepAspectRatio)
-                    img_label = QLabel()
-                    img_label.setPixmap(pixmap)
-                    product_layout.addWidget(img_label)
-
-                # Информация о товаре
-                info_label = QLabel(f"{name}\nЦена: {price} руб.\n{description}")
-                product_layout.addWidget(info_label)
-
-                # Кнопка "Подробнее"
-                details_btn = QPushButton("Подробнее")
-                details_btn.clicked.connect(lambda _, pid=prod_id: self.show_product(pid))
-                product_layout.addWidget(details_btn)
-
-                products_layout.addWidget(product_frame)
-
-            scroll.setWidget(products_widget)
-            self.right_panel.layout().addWidget(scroll)
+        page.add(title)
+
+        if category_id is None and not self.snapshot_checked:
+            # Первый показ корня: рисуем снимок прошлого запуска, если он есть, и сверяем с базой
+            self.snapshot_checked = True
+            shown, self.snapshot = self.snapshot, None
+            if shown is not None:
+                category_rows, first_page = shown
+                self.render_catalog(page, CategoryTree(category_rows), None, first_page)
+            self.refresh_snapshot(page, shown)
+            if shown is not None:
+                return
+
+        self.show_placeholder()
+        # Дерево категорий загружается один раз: крошки и подкатегории строятся без SQL
+        self.async_db.read(
+            'get_category_tree',
+            on_result=lambda tree: self.render_catalog(page, tree, category_id),
+            on_error=self.show_error
+        )
+
+    def refresh_snapshot(self, page, shown):
+        """Читает корневой каталог, сохраняет снимок для следующего запуска и, если показан
+        устаревший снимок, обновляет экран"""
+        def compare(tree, first_page):
+            fresh = (tree.rows(), first_page)
+            if fresh == shown:
+                return
+            save_snapshot(self.db.db_path, *fresh)
+            if shown is None or page.dropped:
+                return
+            if fresh[0] != shown[0]:
+                # Изменились категории - экран проще построить заново
+                current = page is self.page
+                self.drop_page(page)
+                if current:
+                    self.page = None
+                    self.show_catalog()
+            elif page.filters == DEFAULT_FILTERS and not page.search_input.text().strip():
+                self.query_catalog(page)
+
+        self.async_db.read(
+            'get_category_tree', cancellable=False,
+            on_result=lambda tree: self.async_db.read(
+                'get_products_page', limit=PAGE_SIZE, subtree=True, columns=LIST_COLUMNS, cancellable=False,
+                on_result=lambda first_page: compare(tree, first_page),
+                on_error=self.show_error
+            ),
+            on_error=self.show_error
+        )
+
+    def render_catalog(self, page, tree, category_id, first_page=None):
+        self.remove_placeholder()
+        self.category_tree = tree
+
+        # Хлебные крошки
+        breadcrumbs = QHBoxLayout()
+        root_btn = QPushButton("Все товары")
+        root_btn.clicked.connect(lambda: self.show_catalog())
+        breadcrumbs.addWidget(root_btn)
+        for category in tree.path(category_id):
+            crumb_btn = QPushButton(category.name)
+            crumb_btn.setEnabled(category.id != category_id)
+            crumb_btn.clicked.connect(lambda _, cid=category.id: self.show_catalog(cid))
+            breadcrumbs.addWidget(QLabel("›"))
+            breadcrumbs.addWidget(crumb_btn)
+        breadcrumbs.addStretch()
+        breadcrumbs_widget = QWidget()
+        breadcrumbs_widget.setLayout(breadcrumbs)
+        page.add(breadcrumbs_widget)
+
+        # Подкатегории; число товаров в каждой при текущих фильтрах приходит отдельным запросом
+        page.category_id = category_id
+        page.category_buttons = {}
+        for category in tree.children(category_id):
+            btn = QPushButton(category.name)
+            btn.clicked.connect(lambda _, cid=category.id: self.show_catalog(cid))
+            page.category_buttons[category.id] = page.add(btn)
+
+        # Фильтры: порядок, диапазон цен, только бесплатные
+        page.filters = dict(self.catalog_filters)
+        page.facet_prices = None
+        page.filter_bar = page.add(CatalogFilters(page.filters))
+        page.filter_bar.changed.connect(lambda values: self.apply_filters(page, values))
+
+        # Поиск по мере ввода
+        search_input = QLineEdit()
+        search_input.setPlaceholderText("Поиск товаров")
+        search_input.setClearButtonEnabled(True)
+        page.search_input = page.add(search_input)
+
+        # Товары категории и всех подкатегорий: список виртуализирован и подгружается страницами
+        if page.filters != DEFAULT_FILTERS:
+            first_page = None
+        catalog = CatalogView(self.async_db, self.thumbnails, category_id, first_page, page.filters)
+        catalog.product_selected.connect(self.show_product)
+        catalog.failed.connect(self.show_error)
+        # Пока первая страница не пришла, список скрыт; пустой список так и не показывается
+        catalog.setVisible(catalog.model().rowCount() > 0)
+        catalog.loaded.connect(lambda count: catalog.setVisible(count > 0))
+        page.add(catalog)
+        page.catalog = catalog
+
+        # Запрос уходит после паузы в наборе; новый запрос отменяет предыдущий
+        search_timer = QTimer(catalog)
+        search_timer.setSingleShot(True)
+        search_timer.setInterval(SEARCH_DELAY_MS)
+        search_input.textChanged.connect(search_timer.start)
+        search_timer.timeout.connect(lambda: self.query_catalog(page))
+        self.load_facets(page)
+        page.ready = True
+
+    def query_catalog(self, page):
+        """Перезапрашивает список экрана каталога по строке поиска и фильтрам"""
+        text = page.search_input.text()
+        if text.strip():
+            # Поиск упорядочен по релевантности, из фильтров к нему применяется цена
+            page.catalog.set_query('search_products', {'query': text, 'min_price': page.filters['min_price'],
+                                                       'max_price': page.filters['max_price']})
+        else:
+            page.catalog.set_query('get_products_page',
+                                   {'category_id': page.category_id, 'subtree': True, **page.filters})
+
+    def apply_filters(self, page, values):
+        changed_prices = facet_prices(values) != facet_prices(page.filters)
+        page.filters = dict(values)
+        self.catalog_filters = dict(values)
+        self.query_catalog(page)
+        if changed_prices:
+            self.load_facets(page)
+
+    def load_facets(self, page):
+        if not page.category_buttons:
+            return
+        prices = facet_prices(page.filters)
+        self.async_db.read(
+            'get_category_facets', page.category_id, *prices,
+            on_result=lambda facets: self.show_facets(page, prices, facets),
+            on_error=self.show_error
+        )
+
+    def show_facets(self, page, prices, facets):
+        if page.dropped:
+            return
+        for category, count in facets:
+            button = page.category_buttons.get(category.id)
+            if button is not None:
+                button.setText(f"{category.name} ({count})")
+                button.setEnabled(count > 0)
+        page.facet_prices = prices
 
     def show_product(self, product_id):
-        self.clear_right_panel()
-
-        product = self.db.get_product(product_id)
+        page, _ = self.open_page()
+        self.show_placeholder()
+        self.async_db.read(
+            'get_product', product_id,
+            on_result=lambda product: self.render_product(page, product),
+            on_error=self.show_error
+        )
+
+    def render_product(self, page, product):
+        self.remove_placeholder()
         if not product:
             QMessageBox.warning(self, "Ошибка", "Товар не найден")
-            self.show_catalog()
+            self.show_catalog(self.catalog_category)
             return
 
-        prod_id, name, price, description, image_path = product
+        available = product.available
 
         # Основная информация
-        title = QLabel(name)
+        title = QLabel(product.name)
         title.setFont(QFont('Arial', 16))
-        self.right_panel.layout().addWidget(title)
+        page.add(title)
 
-        # Изображение
-        if image_path and os.path.exists(image_path):
-            pixmap = QPixmap(image_path).scaled(300, 300, Qt.AspectRatioMode.KeepAspectRatio)
-            img_label = QLabel()
-            img_label.setPixmap(pixmap)
-            self.right_panel.layout().addWidget(img_label)
+        # Изображение: уменьшенная копия из кэша, пока готовится - заглушка
+        if product.image_path:
+            page.add(ThumbnailLabel(self.thumbnails, product.image_path, 300))
 
         # Описание и цена
-        self.right_panel.layout().addWidget(QLabel(f"Цена: {price} руб."))
-        self.right_panel.layout().addWidget(QLabel(f"Описание: {description}"))
+        page.add(QLabel(f"Цена: {product.price} руб."))
+        page.add(QLabel(f"Описание: {product.description}"))
+        # Остаток за вычетом резервов в чужих корзинах; у товара без учета остатка не показывается
+        if available is not None:
+            page.add(QLabel(f"В наличии: {available} шт." if available > 0 else "Нет в наличии"))
 
         # Поле для количества
         self.quantity_input = QLineEdit()
         self.quantity_input.setPlaceholderText("Количество")
-        self.right_panel.layout().addWidget(self.quantity_input)
+        page.add(self.quantity_input)
 
         # Кнопка "Добавить в корзину"
         add_to_cart_btn = QPushButton("Добавить в корзину")
-        add_to_cart_btn.clicked.connect(lambda: self.add_to_cart(product_id))
-        self.right_panel.layout().addWidget(add_to_cart_btn)
-
-        # Кнопка "Назад"
+        add_to_cart_btn.clicked.connect(lambda: self.add_to_cart(product, available))
+        add_to_cart_btn.setEnabled(available is None or available > 0)
+        page.add(add_to_cart_btn)
+
+        # "С этим товаром покупают": готовый список соседей товара, одно чтение по ключу
+        recommendations = page.add(QFrame())
+        recommendations.setVisible(False)
+        self.async_db.read(
+            'get_recommendations', product.id,
+            on_result=lambda rows: self.render_recommendations(recommendations, rows),
+            on_error=self.show_error
+        )
+
+        # Кнопка "Назад" возвращает к той категории, из которой открыт товар, с прежней прокруткой
         back_btn = QPushButton("Назад")
-        back_btn.clicked.connect(self.show_catalog)
-        self.right_panel.layout().addWidget(back_btn)
+        back_btn.clicked.connect(lambda: self.show_catalog(self.catalog_category))
+        page.add(back_btn)
+        page.ready = True
 
-    def add_to_cart(self, product_id):
+    def render_recommendations(self, frame, rows):
+        if not rows:
+            return
+        layout = QVBoxLayout(frame)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(QLabel("С этим товаром покупают:"))
+        for product in rows:
+            button = QPushButton(f"{product.name} - {product.price} руб.")
+            button.clicked.connect(lambda _, product_id=product.id: self.show_product(product_id))
+            layout.addWidget(button)
+        frame.setVisible(True)
+
+    def add_to_cart(self, product, available):
         try:
             quantity = int(self.quantity_input.text())
             if quantity <= 0:
@@ -181,88 +456,209 @@ class MainWindow(QMainWindow):
         except ValueError:
             QMessageBox.warning(self, "Ошибка", "Введите корректное количество")
             return
+        # Остаток на экране товара проверяется сразу; окончательно его проверит запись в базу
+        if available is not None and self.cart.quantity(product.id) + quantity > available:
+            QMessageBox.warning(self, "Ошибка", f"Товара «{product.name}» недостаточно на складе: "
+                                                f"доступно {available} шт.")
+            return
 
-        product = self.db.get_product(product_id)
-        if product:
-            total_price = product[2] * quantity
-            self.db.add_to_cart(self.current_user['id'], product_id, quantity, total_price)
-            QMessageBox.information(self, "Успех", "Товар добавлен в корзину")
+        # Корзина меняется в памяти, в базу изменение уйдет пакетом; экран корзины, если он
+        # построен, обновит одну строку
+        self.cart.add(product, quantity)
+        QMessageBox.information(self, "Успех", "Товар добавлен в корзину")
 
     def show_cart(self):
-        self.clear_right_panel()
+        page, build = self.open_page(('cart',))
+        if not build:
+            return
 
         title = QLabel("Корзина")
         title.setFont(QFont('Arial', 16))
-        self.right_panel.layout().addWidget(title)
+        page.add(title)
 
-        cart_items = self.db.get_cart_items(self.current_user['id'])
-
-        if not cart_items:
-            self.right_panel.layout().addWidget(QLabel("Ваша корзина пуста"))
-            return
+        if self.cart.ready:
+            self.render_cart(page)
+        else:
+            # Корзина еще читается после входа; экран построится, когда она придет
+            self.show_placeholder()
 
-        total = 0
-        for item_id, product_name, quantity, price, total_price in cart_items:
-            item_frame = QFrame()
-            item_layout = QHBoxLayout(item_frame)
+    def on_cart_loaded(self):
+        page = self.page
+        if page is not None and page.route == ('cart',) and not page.ready:
+            self.render_cart(page)
 
-            item_layout.addWidget(QLabel(f"{product_name} x{quantity}"))
-            item_layout.addWidget(QLabel(f"{total_price} руб."))
+    def render_cart(self, page):
+        self.remove_placeholder()
 
-            remove_btn = QPushButton("Удалить")
-            remove_btn.clicked.connect(lambda _, iid=item_id: self.remove_from_cart(iid))
-            item_layout.addWidget(remove_btn)
+        page.cart_empty = page.add(QLabel("Ваша корзина пуста"))
+        page.cart_rows = {}
+        rows = QWidget()
+        page.cart_layout = QVBoxLayout(rows)
+        page.cart_layout.addStretch()
+        page.add(self.scroll_area(rows))
 
-            self.right_panel.layout().addWidget(item_frame)
-            total += total_price
+        for line in self.cart.lines.values():
+            self.put_cart_row(page, line)
 
-        self.right_panel.layout().addWidget(QLabel(f"Итого: {total} руб."))
+        page.cart_total = page.add(QLabel())
 
         checkout_btn = QPushButton("Оформить заказ")
         checkout_btn.clicked.connect(self.checkout)
-        self.right_panel.layout().addWidget(checkout_btn)
+        page.cart_checkout = page.add(checkout_btn)
+
+        self.update_cart_total(page)
+        page.ready = True
+
+    def put_cart_row(self, page, line):
+        """Добавляет строку корзины или обновляет уже показанную"""
+        row = page.cart_rows.get(line.product_id)
+        if row is None:
+            row = CartRow(line.product_id)
+            row.remove_clicked.connect(self.cart.remove)
+            page.cart_layout.insertWidget(page.cart_layout.count() - 1, row)
+            page.cart_rows[line.product_id] = row
+        row.set_item(line)
+
+    def update_cart_total(self, page):
+        empty = not page.cart_rows
+        page.cart_empty.setVisible(empty)
+        page.cart_total.setText(f"Итого: {self.cart.total()} руб.")
+        page.cart_total.setVisible(not empty)
+        page.cart_checkout.setVisible(not empty)
+
+    def on_cart_changed(self, product_id):
+        """Строка корзины изменилась в памяти: на экране корзины меняются она и итог"""
+        page = self.cached_page(('cart',))
+        if page is None:
+            return
+        line = self.cart.lines.get(product_id)
+        if line is not None:
+            self.put_cart_row(page, line)
+        else:
+            row = page.cart_rows.pop(product_id, None)
+            if row is not None:
+                row.deleteLater()
+        self.update_cart_total(page)
+
+    def on_cart_cleared(self):
+        page = self.cached_page(('cart',))
+        if page is None:
+            return
+        for product_id in [product_id for product_id in page.cart_rows if product_id not in self.cart.lines]:
+            page.cart_rows.pop(product_id).deleteLater()
+        self.update_cart_total(page)
 
-    def remove_from_cart(self, item_id):
-        self.db.remove_from_cart(item_id)
-        self.show_cart()
+    def on_cart_shortage(self, name, available):
+        QMessageBox.warning(self, "Ошибка", f"Товара «{name}» недостаточно на складе: доступно {available} шт. "
+                                            f"Количество в корзине уменьшено")
 
     def checkout(self):
-        self.db.checkout(self.current_user['id'])
-        QMessageBox.information(self, "Успех", "Заказ оформлен")
-        self.show_catalog()
+        def done(order_id):
+            if order_id is None:
+                QMessageBox.warning(self, "Ошибка", "Ваша корзина пуста")
+                return
+            self.cart.clear_ordered()
+            QMessageBox.information(self, "Успех", f"Заказ #{order_id} оформлен")
+            self.show_catalog()
+
+        # Записи идут по очереди: заказ оформится из корзины вместе с последними изменениями
+        self.cart.checkout(on_result=done, on_error=self.show_error)
 
     def show_orders(self):
-        self.clear_right_panel()
+        page, build = self.open_page(('orders',))
+        if not build:
+            return
 
         title = QLabel("Мои заказы")
         title.setFont(QFont('Arial', 16))
-        self.right_panel.layout().addWidget(title)
-
-        orders = self.db.get_orders(self.current_user['id'])
-
-        if not orders:
-            self.right_panel.layout().addWidget(QLabel("У вас нет заказов"))
-            return
-
-        for order_id, order_date, status, total in orders:
-            order_frame = QFrame()
-            order_layout = QVBoxLayout(order_frame)
+        page.add(title)
+
+        self.show_placeholder()
+        self.async_db.read(
+            'get_orders', self.current_user.id,
+            on_result=lambda orders: self.render_orders(page, orders),
+            on_error=self.show_error
+        )
+
+    def render_orders(self, page, orders):
+        self.remove_placeholder()
+
+        page.orders_empty = page.add(QLabel("У вас нет заказов"))
+        page.orders_empty.setVisible(not orders)
+        rows = QWidget()
+        page.orders_layout = QVBoxLayout(rows)
+        page.orders_layout.addStretch()
+        page.add(self.scroll_area(rows))
+
+        for order in orders:
+            page.orders_layout.insertWidget(page.orders_layout.count() - 1, self.order_frame(order))
+
+        # Старые заказы лежат в архиве и читаются, только если их попросили
+        archive_btn = QPushButton("Показать старые заказы")
+        archive_btn.clicked.connect(lambda: self.load_archived_orders(page, archive_btn))
+        page.orders_layout.insertWidget(page.orders_layout.count() - 1, archive_btn)
+        page.ready = True
+
+    def load_archived_orders(self, page, archive_btn):
+        archive_btn.setEnabled(False)
+
+        def render(orders):
+            if page.dropped:
+                return
+            index = page.orders_layout.indexOf(archive_btn)
+            archive_btn.deleteLater()
+            if not orders:
+                page.orders_layout.insertWidget(index, QLabel("Старых заказов нет"))
+                return
+            page.orders_empty.setVisible(False)
+            for offset, order in enumerate(orders):
+                page.orders_layout.insertWidget(index + offset, self.order_frame(order))
+
+        # Экран заказов остается в кэше: чтение не отменяется при уходе с него
+        self.async_db.read('get_orders', self.current_user.id, archived=True, cancellable=False,
+                           on_result=render, on_error=self.show_error)
+
+    def scroll_area(self, widget):
+        # Длинный список прокручивается внутри экрана, а не растягивает окно: кэшированный
+        # экран задавал бы минимальный размер всем остальным
+        scroll = QScrollArea()
+        scroll.setWidgetResizable(True)
+        scroll.setFrameShape(QFrame.Shape.NoFrame)
+        scroll.setWidget(widget)
+        return scroll
 
-            order_layout.addWidget(QLabel(f"Заказ #{order_id}"))
-            order_layout.addWidget(QLabel(f"Дата: {order_date}"))
-            order_layout.addWidget(QLabel(f"Статус: {status}"))
-            order_layout.addWidget(QLabel(f"Сумма: {total} руб."))
+    def order_frame(self, order):
+        order_frame = QFrame()
+        order_layout = QVBoxLayout(order_frame)
 
-            details_btn = QPushButton("Подробнее")
-            details_btn.clicked.connect(lambda _, oid=order_id: self.show_order_details(oid))
-            order_layout.addWidget(details_btn)
+        order_layout.addWidget(QLabel(f"Заказ #{order.id}"))
+        order_layout.addWidget(QLabel(f"Дата: {order.created_at}"))
+        order_layout.addWidget(QLabel(f"Статус: {order.status}"))
+        order_layout.addWidget(QLabel(f"Сумма: {order.total} руб."))
 
-            self.right_panel.layout().addWidget(order_frame)
+        details_btn = QPushButton("Подробнее")
+        details_btn.clicked.connect(lambda: self.show_order_details(order.id))
+        order_layout.addWidget(details_btn)
+        return order_frame
 
     def show_order_details(self, order_id):
-        self.clear_right_panel()
-
-        order = self.db.get_order(order_id)
+        page, _ = self.open_page()
+        self.show_placeholder()
+
+        def load_items(order):
+            if not order:
+                self.render_order_details(page, order_id, None, [])
+                return
+            self.async_db.read(
+                'get_order_items', order_id,
+                on_result=lambda items: self.render_order_details(page, order_id, order, items),
+                on_error=self.show_error
+            )
+
+        self.async_db.read('get_order', order_id, on_result=load_items, on_error=self.show_error)
+
+    def render_order_details(self, page, order_id, order, items):
+        self.remove_placeholder()
         if not order:
             QMessageBox.warning(self, "Ошибка", "Заказ не найден")
             self.show_orders()
@@ -270,26 +666,26 @@ class MainWindow(QMainWindow):
 
         title = QLabel(f"Заказ #{order_id}")
         title.setFont(QFont('Arial', 16))
-        self.right_panel.layout().addWidget(title)
+        page.add(title)
 
-        self.right_panel.layout().addWidget(QLabel(f"Дата: {order[1]}"))
-        self.right_panel.layout().addWidget(QLabel(f"Статус: {order[2]}"))
-        self.right_panel.layout().addWidget(QLabel(f"Сумма: {order[3]} руб."))
+        page.add(QLabel(f"Дата: {order.created_at}"))
+        page.add(QLabel(f"Статус: {order.status}"))
+        page.add(QLabel(f"Сумма: {order.total} руб."))
 
-        items = self.db.get_order_items(order_id)
-        for product_name, quantity, price in items:
-            self.right_panel.layout().addWidget(QLabel(f"{product_name} - {quantity} x {price} руб."))
+        for item in items:
+            page.add(QLabel(f"{item.name} - {item.quantity} x {item.price} руб."))
 
         back_btn = QPushButton("Назад")
-        back_btn.clicked.connect(self.show_orders)
-        self.right_panel.layout().addWidget(back_btn)
+        back_btn.clicked.connect(lambda: self.show_orders())
+        page.add(back_btn)
+        page.ready = True
 
     def show_add_product(self):
-        self.clear_right_panel()
+        page, _ = self.open_page()
 
         title = QLabel("Добавить товар")
         title.setFont(QFont('Arial', 16))
-        self.right_panel.layout().addWidget(title)
+        page.add(title)
 
         form = QWidget()
         form_layout = QVBoxLayout(form)
@@ -303,22 +699,27 @@ class MainWindow(QMainWindow):
         self.product_desc = QLineEdit()
         self.product_desc.setPlaceholderText("Описание")
 
+        self.product_stock = QLineEdit()
+        self.product_stock.setPlaceholderText("Пусто - без ограничения")
+
         self.product_image = QLineEdit()
         self.product_image.setPlaceholderText("Путь к изображению")
+        # Путь заполняется только после обработки выбранного файла
+        self.product_image.setReadOnly(True)
+        self.product_image_size = (None, None)
 
         self.browse_btn = QPushButton("Выбрать изображение")
         self.browse_btn.clicked.connect(self.browse_image)
 
         self.category_combo = QComboBox()
-        categories = self.db.get_categories()
-        for cat_id, cat_name in categories:
-            self.category_combo.addItem(cat_name, cat_id)
+        self.category_combo.setEnabled(False)
+        self.async_db.read('get_category_tree', on_result=self.fill_category_combo, on_error=self.show_error)
 
-        submit_btn = QPushButton("Добавить")
-        submit_btn.clicked.connect(self.submit_product)
+        self.submit_btn = QPushButton("Добавить")
+        self.submit_btn.clicked.connect(self.submit_product)
 
         back_btn = QPushButton("Назад")
-        back_btn.clicked.connect(self.show_catalog)
+        back_btn.clicked.connect(lambda: self.show_catalog())
 
         form_layout.addWidget(QLabel("Название:"))
         form_layout.addWidget(self.product_name)
@@ -326,30 +727,54 @@ class MainWindow(QMainWindow):
         form_layout.addWidget(self.product_price)
         form_layout.addWidget(QLabel("Описание:"))
         form_layout.addWidget(self.product_desc)
+        form_layout.addWidget(QLabel("Остаток на складе:"))
+        form_layout.addWidget(self.product_stock)
         form_layout.addWidget(QLabel("Изображение:"))
         form_layout.addWidget(self.product_image)
         form_layout.addWidget(self.browse_btn)
         form_layout.addWidget(QLabel("Категория:"))
         form_layout.addWidget(self.category_combo)
-        form_layout.addWidget(submit_btn)
+        form_layout.addWidget(self.submit_btn)
         form_layout.addWidget(back_btn)
 
         scroll = QScrollArea()
         scroll.setWidgetResizable(True)
         scroll.setWidget(form)
 
-        self.right_panel.layout().addWidget(scroll)
+        page.add(scroll)
+        page.ready = True
+
+    def fill_category_combo(self, tree):
+        for cat_id, cat_name, depth in tree.walk():
+            self.category_combo.addItem("    " * depth + cat_name, cat_id)
+        self.category_combo.setEnabled(True)
 
     def browse_image(self):
         file_path, _ = QFileDialog.getOpenFileName(self, "Выберите изображение", "", "Images (*.png *.jpg *.jpeg)")
         if file_path:
-            # Копируем изображение в папку data/images
-            if not os.path.exists('data/images'):
-                os.makedirs('data/images')
-
-            new_path = f"data/images/{os.path.basename(file_path)}"
-            shutil.copy(file_path, new_path)
-            self.product_image.setText(new_path)
+            # Уменьшенная копия сохраняется в data/images под именем-хэшем в фоне
+            self.product_image.setText("Обработка изображения...")
+            self.browse_btn.setEnabled(False)
+            self.submit_btn.setEnabled(False)
+
+            task = ImageIngestTask(file_path)
+            task.signals.finished.connect(self.on_image_ingested)
+            task.signals.failed.connect(self.on_image_failed)
+            self.ingest_signals = task.signals
+            QThreadPool.globalInstance().start(task)
+
+    def on_image_ingested(self, path, width, height):
+        self.product_image.setText(path)
+        self.product_image_size = (width, height)
+        self.browse_btn.setEnabled(True)
+        self.submit_btn.setEnabled(True)
+
+    def on_image_failed(self, message):
+        self.product_image.clear()
+        self.product_image_size = (None, None)
+        self.browse_btn.setEnabled(True)
+        self.submit_btn.setEnabled(True)
+        QMessageBox.warning(self, "Ошибка", f"Не удалось обработать изображение: {message}")
 
     def submit_product(self):
         name = self.product_name.text()
@@ -370,27 +795,72 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Ошибка", "Введите корректную цену")
             return
 
-        try:
-            self.db.add_product(name, price, description, image_path, category_id)
+        stock = self.product_stock.text().strip() or None
+        if stock is not None:
+            try:
+                stock = int(stock)
+                if stock < 0:
+                    raise ValueError
+            except ValueError:
+                QMessageBox.warning(self, "Ошибка", "Введите корректный остаток")
+                return
+
+        def done(_):
             QMessageBox.information(self, "Успех", "Товар добавлен")
             self.show_catalog()
-        except sqlite3.IntegrityError:
-            QMessageBox.warning(self, "Ошибка", "Товар с таким названием уже существует")
+
+        def failed(error):
+            if isinstance(error, sqlite3.IntegrityError):
+                QMessageBox.warning(self, "Ошибка", "Товар с таким названием уже существует")
+            else:
+                self.show_error(error)
+
+        image_width, image_height = self.product_image_size
+        self.async_db.write(
+            'add_product', name, price, description, image_path, category_id, image_width, image_height, stock,
+            self.current_user.id,
+            on_result=done,
+            on_error=failed
+        )
+
+    def show_seller_products(self):
+        page, _ = self.open_page()
+
+        title = QLabel("Мои товары")
+        title.setFont(QFont('Arial', 16))
+        page.add(title)
+
+        products = SellerProducts(self.async_db, self.db.db_path, self.current_user.id)
+        products.failed.connect(self.show_error)
+        page.add(products)
+        page.ready = True
+
+    def show_analytics(self):
+        page, _ = self.open_page()
+
+        title = QLabel("Аналитика продаж")
+        title.setFont(QFont('Arial', 16))
+        page.add(title)
+
+        dashboard = SalesDashboard(self.async_db, self.current_user.id)
+        dashboard.failed.connect(self.show_error)
+        page.add(dashboard)
+        page.ready = True
 
     def show_settings(self):
-        self.clear_right_panel()
+        page, _ = self.open_page()
 
         title = QLabel("Настройки")
         title.setFont(QFont('Arial', 16))
-        self.right_panel.layout().addWidget(title)
+        page.add(title)
 
         form = QWidget()
         form_layout = QVBoxLayout(form)
 
-        self.settings_name = QLineEdit(self.current_user.get('name', ''))
+        self.settings_name = QLineEdit(self.current_user.name)
         self.settings_name.setPlaceholderText("Имя")
 
-        self.settings_phone = QLineEdit(self.current_user.get('phone', ''))
+        self.settings_phone = QLineEdit(self.current_user.phone)
         self.settings_phone.setPlaceholderText("Телефон")
 
         self.settings_password = QLineEdit()
@@ -401,7 +871,7 @@ class MainWindow(QMainWindow):
         save_btn.clicked.connect(self.save_settings)
 
         back_btn = QPushButton("Назад")
-        back_btn.clicked.connect(self.show_catalog)
+        back_btn.clicked.connect(lambda: self.show_catalog())
 
         form_layout.addWidget(QLabel("Имя:"))
         form_layout.addWidget(self.settings_name)
@@ -412,7 +882,8 @@ class MainWindow(QMainWindow):
         form_layout.addWidget(save_btn)
         form_layout.addWidget(back_btn)
 
-        self.right_panel.layout().addWidget(form)
+        page.add(form)
+        page.ready = True
 
     def save_settings(self):
         name = self.settings_name.text()
@@ -423,21 +894,175 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Ошибка", "Заполните обязательные поля")
             return
 
-        try:
-            self.db.update_user(self.current_user['id'], name, phone, password)
-            self.current_user['name'] = name
-            self.current_user['phone'] = phone
+        def done(_):
+            self.current_user.name = name
+            self.current_user.phone = phone
             QMessageBox.information(self, "Успех", "Настройки сохранены")
-        except sqlite3.IntegrityError:
-            QMessageBox.warning(self, "Ошибка", "Пользователь с таким телефоном уже существует")
+
+        def failed(error):
+            if isinstance(error, sqlite3.IntegrityError):
+                QMessageBox.warning(self, "Ошибка", "Пользователь с таким телефоном уже существует")
+            else:
+                self.show_error(error)
+
+        self.async_db.write(
+            'update_user', self.current_user.id, name, phone, password,
+            on_result=done,
+            on_error=failed
+        )
 
     def logout(self):
+        self.cart.close()
+        self.cart = None
         self.current_user = None
+        # Экраны корзины и заказов принадлежали прежнему пользователю
+        self.reset_pages()
         self.main_app.show_auth_window()
 
-    def clear_right_panel(self):
-        # Очищаем правую панель
-        while self.right_panel.layout().count():
-            item = self.right_panel.layout().takeAt(0)
-            if item.widget():
-                item.widget().deleteLater()
\ No newline at end of file
+    def show_placeholder(self):
+        # Заглушка, пока данные экрана загружаются в фоне
+        self.placeholder = self.page.add(QLabel("Загрузка..."))
+
+    def remove_placeholder(self):
+        if self.placeholder is not None:
+            self.page.layout().removeWidget(self.placeholder)
+            self.placeholder.deleteLater()
+            self.placeholder = None
+
+    def show_error(self, error):
+        self.remove_placeholder()
+        if isinstance(error, OutOfStockError):
+            QMessageBox.warning(self, "Ошибка", str(error))
+            return
+        QMessageBox.warning(self, "Ошибка", f"Не удалось выполнить запрос: {error}")
+
+    def closeEvent(self, event):
+        # Дожидаемся незавершенных записей, чтобы не потерять их при выходе; результат
+        # записи корзины доставляется до выхода, чтобы ее журнал очистился
+        if self.cart is not None:
+            self.cart.close()
+        self.async_db.cancel_reads()
+        self.async_db.wait()
+        QApplication.processEvents()
+        if self.profile_path and self.profile_path.endswith('.json'):
+            profiler.export_chrome_trace(self.profile_path)
+        super().closeEvent(event)
+
+    def open_page(self, route=None):
+        """Переключает правую панель на экран и возвращает (экран, нужно ли его построить).
+
+        Экран с маршрутом берется из кэша, если он уже построен; экран без маршрута
+        (товар, форма, детали заказа) создается заново и удаляется при уходе с него.
+        """
+        self.leave_page()
+        page = self.page_cache.get(route) if route is not None else None
+        build = page is None
+        if build:
+            page = Page(route)
+            self.pages.addWidget(page)
+            if route is not None:
+                self.page_cache[route] = page
+        else:
+            self.page_cache.move_to_end(route)
+        self.pages.setCurrentWidget(page)
+        self.page = page
+        self.evict_pages()
+        return page, build
+
+    def leave_page(self):
+        # Результаты запросов прежнего экрана больше не нужны
+        self.async_db.cancel_reads()
+        self.placeholder = None
+
+        page, self.page = self.page, None
+        if page is None:
+            return
+        if page.catalog is not None:
+            # Прерванная подгрузка списка повторится, когда к нему вернутся
+            page.catalog.model().cancel()
+        # Недостроенный экран не кэшируется: его запросы только что отменены
+        if page.route is None or not page.ready:
+            self.drop_page(page)
+
+    def drop_page(self, page):
+        if self.page_cache.get(page.route) is page:
+            del self.page_cache[page.route]
+        page.dropped = True
+        self.pages.removeWidget(page)
+        page.deleteLater()
+
+    def evict_pages(self):
+        # Давно не открывавшиеся экраны вытесняются, чтобы кэш не рос без предела
+        while len(self.page_cache) > MAX_CACHED_PAGES:
+            route = next(iter(self.page_cache))
+            self.drop_page(self.page_cache[route])
+
+    def reset_pages(self):
+        """Удаляет все экраны, например при смене пользователя"""
+        self.leave_page()
+        for page in list(self.page_cache.values()):
+            self.drop_page(page)
+
+    def cached_page(self, route):
+        page = self.page_cache.get(route)
+        return page if page is not None and page.ready else None
+
+    def on_data_changed(self, topic, payload):
+        """Обновляет в кэшированных экранах только затронутые строки; корзину экран берет
+        из CartBuffer, поэтому ее уведомления здесь не нужны"""
+        if topic == PRODUCT_ADDED:
+            self.patch_catalogs(payload['category_id'])
+            return
+        if topic == PRODUCTS_UPDATED:
+            # Цены и категории могли измениться в любом списке: скрытые экраны каталога
+            # строятся заново при следующем открытии, видимый список перечитывается
+            for page in [page for route, page in self.page_cache.items() if route[0] == 'catalog']:
+                if page is not self.page:
+                    self.drop_page(page)
+                elif page.ready:
+                    page.catalog.model().reload()
+            return
+        if self.current_user is None or payload.get('user_id') != self.current_user.id:
+            return
+
+        if topic == ORDER_CREATED:
+            orders = self.cached_page(('orders',))
+            if orders is not None:
+                self.async_db.read(
+                    'get_order', payload['order_id'], cancellable=False,
+                    on_result=lambda order: self.patch_orders(orders, order),
+                    on_error=self.show_error
+                )
+
+    def patch_orders(self, page, order):
+        if page.dropped or order is None:
+            return
+        page.orders_empty.setVisible(False)
+        page.orders_layout.insertWidget(0, self.order_frame(order))
+
+    def patch_catalogs(self, category_id):
+        """Новый товар попадает в списки категорий, в поддерево которых он входит: в порядке
+        по умолчанию - догрузкой в конец, в остальных порядках и в поиске видимый список
+        перечитывается, а скрытый экран строится заново при следующем открытии"""
+        for route, page in list(self.page_cache.items()):
+            if route[0] != 'catalog' or not page.ready or self.category_tree is None:
+                continue
+            if not self.category_tree.contains(route[1], category_id):
+                continue
+            model = page.catalog.model()
+            # Пустой список скрыт и сам не догрузится
+            if model.rowCount() > 0 and model.resume():
+                continue
+            if page is self.page:
+                model.reload()
+            else:
+                self.drop_page(page)
+
+
+# Что измеряет профилировщик: SQL - все методы Database, отрисовка - экраны окна,
+# декодирование - фоновые задачи с изображениями
+profiler.register(Database, category='sql')
+profiler.register(MainWindow, [name for name in public_methods(MainWindow)
+                               if name.startswith(('show_', 'render_'))], 'ui')
+profiler.register(ThumbnailTask, ['run'], 'image')
+profiler.register(ImageIngestTask, ['run'], 'image')
@@ -0,0 +1,119 @@
+import time
+
+from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtWidgets import QDockWidget, QWidget, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem, \
+    QPushButton, QComboBox, QLabel, QFileDialog, QHeaderView
+
+from utils.profiler import profiler
+
+REFRESH_MS = 1000
+TOP_N = 30
+COLUMNS = ["Операция", "Вызовов", "Всего, мс", "Среднее, мс", "p95, мс", "Макс, мс", "Строк", "SQL"]
+
+
+class ProfilerDock(QDockWidget):
+    """Отладочная панель: самые затратные операции по данным профилировщика.
+
+    Пока панель открыта, профилировщик включен и таблица обновляется раз в секунду;
+    при закрытии профилировщик выключается, если его включила сама панель, а собранные
+    данные сохраняются до сброса. cache_stats - функция счетчиков кэша чтений
+    (Database.cache_stats): они выводятся под таблицей.
+    """
+
+    def __init__(self, parent=None, cache_stats=None):
+        super().__init__("Профилировщик", parent)
+        self.setObjectName('profiler_dock')
+        self.cache_stats = cache_stats
+
+        widget = QWidget()
+        layout = QVBoxLayout(widget)
+
+        controls = QHBoxLayout()
+        self.sort_combo = QComboBox()
+        self.sort_combo.addItem("По суммарному времени", 'total')
+        self.sort_combo.addItem("По самому долгому вызову", 'max')
+        self.sort_combo.addItem("По среднему времени", 'mean')
+        self.sort_combo.currentIndexChanged.connect(self.refresh)
+        controls.addWidget(self.sort_combo)
+
+        reset_btn = QPushButton("Сбросить")
+        reset_btn.clicked.connect(self.reset)
+        controls.addWidget(reset_btn)
+
+        export_btn = QPushButton("Экспорт трассы")
+        export_btn.clicked.connect(self.export_trace)
+        controls.addWidget(export_btn)
+        layout.addLayout(controls)
+
+        self.table = QTableWidget(0, len(COLUMNS))
+        self.table.setHorizontalHeaderLabels(COLUMNS)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        layout.addWidget(self.table)
+
+        self.status = QLabel()
+        layout.addWidget(self.status)
+        self.setWidget(widget)
+
+        self.enabled_here = False
+        self.timer = QTimer(self)
+        self.timer.setInterval(REFRESH_MS)
+        self.timer.timeout.connect(self.refresh)
+        self.visibilityChanged.connect(self.on_visibility_changed)
+
+    def toggle(self):
+        self.setVisible(not self.isVisible())
+
+    def on_visibility_changed(self, visible):
+        if visible:
+            if not profiler.enabled:
+                profiler.enable()
+                self.enabled_here = True
+            self.refresh()
+            self.timer.start()
+        else:
+            self.timer.stop()
+            if self.enabled_here:
+                profiler.disable()
+                self.enabled_here = False
+
+    def refresh(self):
+        histograms = profiler.top(TOP_N, self.sort_combo.currentData())
+        self.table.setRowCount(len(histograms))
+        for row, histogram in enumerate(histograms):
+            values = [
+                histogram.name,
+                histogram.count,
+                histogram.total_ns / 1e6,
+                histogram.mean_ms,
+                histogram.percentile(0.95),
+                histogram.max_ns / 1e6,
+                histogram.rows,
+                histogram.queries,
+            ]
+            for column, value in enumerate(values):
+                text = f"{value:.2f}" if isinstance(value, float) else str(value)
+                item = QTableWidgetItem(text)
+                if column:
+                    item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                self.table.setItem(row, column, item)
+        status = f"Вызовов сохранено: {len(profiler.spans)}"
+        if self.cache_stats is not None:
+            stats = self.cache_stats()
+            status += (f"; кэш чтений: {stats['size']} записей, попаданий {stats['hits']}, "
+                       f"промахов {stats['misses']} ({stats['hit_rate']:.0%}), устарело {stats['expired']}, "
+                       f"вытеснено {stats['evicted']}")
+        self.status.setText(status)
+
+    def reset(self):
+        profiler.reset()
+        self.refresh()
+
+    def export_trace(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Экспорт трассы", f"trace-{time.strftime('%Y%m%d-%H%M%S')}.json", "Chrome Trace (*.json)"
+        )
+        if path:
+            count = profiler.export_chrome_trace(path)
+            self.status.setText(f"Сохранено вызовов: {count} в {path}")
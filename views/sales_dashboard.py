@@ -0,0 +1,112 @@
+import datetime
+
+from PyQt6.QtCore import Qt, pyqtSignal
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QTabWidget, QTableWidget, \
+    QTableWidgetItem, QHeaderView
+
+# Периоды отчета: (дней, подпись)
+PERIODS = [(7, "7 дней"), (30, "30 дней"), (90, "90 дней"), (365, "Год")]
+DEFAULT_PERIOD = 30
+TOP_PRODUCTS = 100
+
+
+def period_start(days):
+    """Первый день периода в формате сводок продаж: даты заказов хранятся в UTC"""
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    return (today - datetime.timedelta(days=days - 1)).isoformat()
+
+
+def sales_table(columns):
+    table = QTableWidget(0, len(columns))
+    table.setHorizontalHeaderLabels(columns)
+    table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+    table.verticalHeader().setVisible(False)
+    table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+    return table
+
+
+def fill_table(table, rows):
+    table.setRowCount(len(rows))
+    for row, values in enumerate(rows):
+        for column, value in enumerate(values):
+            text = f"{value:,.2f}".replace(',', ' ') if isinstance(value, float) else str(value)
+            item = QTableWidgetItem(text)
+            if column:
+                item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+            table.setItem(row, column, item)
+
+
+class SalesDashboard(QWidget):
+    """Экран аналитики продавца: продажи за период по дням, товарам и категориям.
+
+    Данные читаются из ежедневных сводок продаж (sales_daily_*), поэтому отчет за год
+    стоит O(дней x товаров) строк независимо от длины истории заказов. Пока сводки
+    досчитываются по старым заказам, над таблицами показывается предупреждение.
+    """
+
+    failed = pyqtSignal(object)
+
+    def __init__(self, async_db, seller_id, parent=None):
+        super().__init__(parent)
+        self.async_db = async_db
+        self.seller_id = seller_id
+
+        layout = QVBoxLayout(self)
+        controls = QHBoxLayout()
+        controls.addWidget(QLabel("Период:"))
+        self.period_combo = QComboBox()
+        for days, text in PERIODS:
+            self.period_combo.addItem(text, days)
+        self.period_combo.setCurrentIndex(self.period_combo.findData(DEFAULT_PERIOD))
+        self.period_combo.currentIndexChanged.connect(self.reload)
+        controls.addWidget(self.period_combo)
+        controls.addStretch()
+        layout.addLayout(controls)
+
+        self.summary = QLabel()
+        layout.addWidget(self.summary)
+        self.backfill_note = QLabel()
+        self.backfill_note.setVisible(False)
+        layout.addWidget(self.backfill_note)
+
+        self.by_day = sales_table(["День", "Продано, шт.", "Выручка, руб."])
+        self.by_product = sales_table(["Товар", "Продано, шт.", "Выручка, руб.", "Заказов"])
+        self.by_category = sales_table(["Категория", "Продано, шт.", "Выручка, руб."])
+        tabs = QTabWidget()
+        tabs.addTab(self.by_day, "По дням")
+        tabs.addTab(self.by_product, "По товарам")
+        tabs.addTab(self.by_category, "По категориям")
+        layout.addWidget(tabs)
+
+        self.reload()
+
+    def reload(self):
+        since = period_start(self.period_combo.currentData())
+        self.summary.setText("Загрузка...")
+        self.async_db.read('get_sales_by_day', self.seller_id, since,
+                           on_result=self.show_days, on_error=self.failed.emit)
+        self.async_db.read('get_sales_by_product', self.seller_id, since, TOP_PRODUCTS,
+                           on_result=self.show_products, on_error=self.failed.emit)
+        self.async_db.read('get_sales_by_category', self.seller_id, since,
+                           on_result=self.show_categories, on_error=self.failed.emit)
+        self.async_db.read('get_sales_backfill_remaining',
+                           on_result=self.show_backfill, on_error=self.failed.emit)
+
+    def show_days(self, rows):
+        fill_table(self.by_day, rows)
+        quantity = sum(row[1] for row in rows)
+        revenue = sum(row[2] for row in rows)
+        self.summary.setText(f"Продано: {quantity} шт. на {revenue:,.2f} руб.".replace(',', ' '))
+
+    def show_products(self, rows):
+        fill_table(self.by_product, [(name, quantity, revenue, orders)
+                                     for _, name, quantity, revenue, orders in rows])
+
+    def show_categories(self, rows):
+        fill_table(self.by_category, [(name or "Без категории", quantity, revenue)
+                                      for _, name, quantity, revenue in rows])
+
+    def show_backfill(self, remaining):
+        self.backfill_note.setText(f"История заказов еще пересчитывается (осталось номеров: {remaining}), "
+                                   f"итоги за прошлые дни неполные")
+        self.backfill_note.setVisible(remaining > 0)
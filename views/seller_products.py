@@ -0,0 +1,333 @@
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QObject, QRunnable, QThreadPool, pyqtSignal
+from PyQt6.QtGui import QDoubleValidator
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QLineEdit, QPushButton, \
+    QCheckBox, QTableView, QHeaderView, QAbstractItemView, QFileDialog, QMessageBox
+
+from models.database import Database
+from models.exporter import export_seller_products
+
+# Строк в одной подгружаемой странице таблицы
+PAGE_SIZE = 200
+ROW_HEIGHT = 24
+# Столбцы таблицы: (заголовок, ключ сортировки или None, если по столбцу не сортируется)
+COLUMNS = [
+    ("№", 'id'),
+    ("Название", 'name'),
+    ("Цена, руб.", 'price'),
+    ("Остаток", None),
+    ("Категория", None),
+]
+# Способы изменить цену: (подпись, аргумент update_seller_products)
+PRICE_MODES = [("Новая цена, руб.", 'price'), ("Изменить на %", 'price_percent')]
+
+
+class SellerProductsModel(QAbstractTableModel):
+    """Товары продавца для таблицы: строки подгружаются страницами по мере прокрутки.
+
+    Страницы читаются get_seller_products_page в порядке ключа сортировки столбца, поэтому
+    смена сортировки перечитывает таблицу с первой страницы, а не сортирует загруженное.
+    """
+
+    loaded = pyqtSignal()
+    failed = pyqtSignal(object)
+
+    def __init__(self, async_db, seller_id, page_size=PAGE_SIZE, parent=None):
+        super().__init__(parent)
+        self.async_db = async_db
+        self.seller_id = seller_id
+        self.page_size = page_size
+        self.sort_key = 'id'
+        self.descending = False
+        self.products = []
+        self.cursor = None
+        self.exhausted = False
+        self.loading = False
+        self.handle = None
+        self.fetchMore(QModelIndex())
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.products)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(COLUMNS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+
+        product = self.products[index.row()]
+        column = index.column()
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == 0:
+                return str(product.id)
+            if column == 1:
+                return product.name
+            if column == 2:
+                return f"{product.price:.2f}"
+            if column == 3:
+                return "-" if product.stock is None else str(product.stock)
+            return product.category or "Без категории"
+        if role == Qt.ItemDataRole.TextAlignmentRole and column in (0, 2, 3):
+            return Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return COLUMNS[section][0]
+        return None
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        key = COLUMNS[column][1]
+        descending = order == Qt.SortOrder.DescendingOrder
+        if key is None or (key, descending) == (self.sort_key, self.descending):
+            return
+        self.sort_key = key
+        self.descending = descending
+        self.reload()
+
+    def reload(self):
+        """Перечитывает таблицу с первой страницы, например после пакетного изменения"""
+        if self.handle is not None:
+            self.async_db.cancel(self.handle)
+            self.handle = None
+        self.beginResetModel()
+        self.products = []
+        self.cursor = None
+        self.exhausted = False
+        self.loading = False
+        self.endResetModel()
+        self.fetchMore(QModelIndex())
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and not self.exhausted and not self.loading
+
+    def fetchMore(self, parent):
+        if not self.canFetchMore(parent):
+            return
+
+        self.loading = True
+        self.handle = self.async_db.read(
+            'get_seller_products_page', self.seller_id, self.sort_key, self.descending, self.cursor, self.page_size,
+            on_result=self.append_page,
+            on_error=self.fetch_failed
+        )
+
+    def append_page(self, page):
+        rows, self.cursor = page
+        self.handle = None
+        self.loading = False
+        if self.cursor is None:
+            self.exhausted = True
+
+        if rows:
+            first = len(self.products)
+            self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+            self.products.extend(rows)
+            self.endInsertRows()
+        self.loaded.emit()
+
+    def fetch_failed(self, error):
+        self.handle = None
+        self.loading = False
+        self.exhausted = True
+        self.failed.emit(error)
+
+    def product_ids(self, rows):
+        return [self.products[row].id for row in rows]
+
+
+class ExportSignals(QObject):
+    progress = pyqtSignal(int)
+    finished = pyqtSignal(int)
+    failed = pyqtSignal(str)
+
+
+class ExportTask(QRunnable):
+    """Выгружает товары продавца в CSV в фоновом потоке со своим соединением с базой"""
+
+    def __init__(self, db_path, seller_id, path):
+        super().__init__()
+        self.db_path = db_path
+        self.seller_id = seller_id
+        self.path = path
+        self.signals = ExportSignals()
+
+    def run(self):
+        db = Database(self.db_path, setup=False)
+        try:
+            count = export_seller_products(db, self.seller_id, self.path, self.signals.progress.emit)
+        except Exception as error:
+            self.signals.failed.emit(str(error))
+        else:
+            self.signals.finished.emit(count)
+        finally:
+            db.conn.close()
+
+
+class SellerProducts(QWidget):
+    """Экран "Мои товары": таблица товаров продавца, пакетное изменение цены и категории
+    выделенных (или всех) товаров одной транзакцией и выгрузка каталога в CSV.
+
+    Таблица виртуальная: QTableView рисует только видимые строки, а модель подгружает
+    страницы по мере прокрутки, поэтому экран открывается одинаково быстро при любом
+    числе товаров.
+    """
+
+    failed = pyqtSignal(object)
+
+    def __init__(self, async_db, db_path, seller_id, parent=None):
+        super().__init__(parent)
+        self.async_db = async_db
+        self.db_path = db_path
+        self.seller_id = seller_id
+        self.export_signals = None
+
+        layout = QVBoxLayout(self)
+        self.summary = QLabel()
+        layout.addWidget(self.summary)
+
+        self.model = SellerProductsModel(async_db, seller_id, parent=self)
+        self.model.failed.connect(self.failed)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.table.verticalHeader().setVisible(False)
+        # Строки одной высоты: представлению не нужно измерять каждую
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.table.verticalHeader().setDefaultSectionSize(ROW_HEIGHT)
+        self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        self.table.horizontalHeader().setSortIndicator(0, Qt.SortOrder.AscendingOrder)
+        self.table.horizontalHeader().sortIndicatorChanged.connect(self.on_sort_changed)
+        self.table.setSortingEnabled(True)
+        self.table.selectionModel().selectionChanged.connect(self.update_summary)
+        layout.addWidget(self.table)
+
+        self.all_check = QCheckBox("Применять ко всем товарам, а не только к выделенным")
+        self.all_check.toggled.connect(self.update_summary)
+        layout.addWidget(self.all_check)
+
+        price_row = QHBoxLayout()
+        self.price_mode = QComboBox()
+        for text, mode in PRICE_MODES:
+            self.price_mode.addItem(text, mode)
+        price_row.addWidget(self.price_mode)
+        self.price_input = QLineEdit()
+        self.price_input.setValidator(QDoubleValidator())
+        price_row.addWidget(self.price_input)
+        price_btn = QPushButton("Изменить цену")
+        price_btn.clicked.connect(self.apply_price)
+        price_row.addWidget(price_btn)
+        layout.addLayout(price_row)
+
+        category_row = QHBoxLayout()
+        self.category_combo = QComboBox()
+        self.category_combo.setEnabled(False)
+        category_row.addWidget(self.category_combo, 1)
+        category_btn = QPushButton("Перенести в категорию")
+        category_btn.clicked.connect(self.apply_category)
+        category_row.addWidget(category_btn)
+        layout.addLayout(category_row)
+
+        self.export_btn = QPushButton("Выгрузить в CSV")
+        self.export_btn.clicked.connect(self.export_csv)
+        layout.addWidget(self.export_btn)
+
+        self.total = 0
+        self.async_db.read('get_category_tree', on_result=self.fill_categories, on_error=self.failed.emit)
+        self.load_count()
+
+    def load_count(self):
+        self.async_db.read('count_seller_products', self.seller_id,
+                           on_result=self.show_count, on_error=self.failed.emit)
+
+    def show_count(self, total):
+        self.total = total
+        self.update_summary()
+
+    def update_summary(self):
+        selected = self.total if self.all_check.isChecked() else len(self.table.selectionModel().selectedRows())
+        self.summary.setText(f"Товаров: {self.total}, будет изменено: {selected}")
+
+    def fill_categories(self, tree):
+        for cat_id, cat_name, depth in tree.walk():
+            self.category_combo.addItem("    " * depth + cat_name, cat_id)
+        self.category_combo.setEnabled(True)
+
+    def on_sort_changed(self, column, order):
+        # По остатку и категории таблица не сортируется: индикатор возвращается к текущему столбцу
+        if COLUMNS[column][1] is None:
+            current = [key for _, key in COLUMNS].index(self.model.sort_key)
+            descending = Qt.SortOrder.DescendingOrder if self.model.descending else Qt.SortOrder.AscendingOrder
+            header = self.table.horizontalHeader()
+            header.blockSignals(True)
+            header.setSortIndicator(current, descending)
+            header.blockSignals(False)
+
+    def target_ids(self):
+        """Номера изменяемых товаров: None - все товары продавца, [] - ничего не выделено"""
+        if self.all_check.isChecked():
+            return None
+        return self.model.product_ids(sorted(index.row() for index in self.table.selectionModel().selectedRows()))
+
+    def apply_price(self):
+        try:
+            value = float(self.price_input.text().replace(',', '.'))
+        except ValueError:
+            QMessageBox.warning(self, "Ошибка", "Введите цену или процент")
+            return
+        mode = self.price_mode.currentData()
+        if (mode == 'price' and value < 0) or (mode == 'price_percent' and value <= -100):
+            QMessageBox.warning(self, "Ошибка", "Цена не может быть отрицательной")
+            return
+        self.apply(**{mode: value})
+
+    def apply_category(self):
+        category_id = self.category_combo.currentData()
+        if category_id is not None:
+            self.apply(category_id=category_id)
+
+    def apply(self, **changes):
+        product_ids = self.target_ids()
+        if product_ids is not None and not product_ids:
+            QMessageBox.warning(self, "Ошибка", "Выделите товары в таблице")
+            return
+        if product_ids is None:
+            answer = QMessageBox.question(self, "Подтверждение", f"Изменить все товары ({self.total})?")
+            if answer != QMessageBox.StandardButton.Yes:
+                return
+
+        def done(count):
+            QMessageBox.information(self, "Успех", f"Изменено товаров: {count}")
+            self.model.reload()
+            self.load_count()
+
+        # Все изменения - одна транзакция в потоке записи, окно не ждет ее
+        self.async_db.write('update_seller_products', self.seller_id, product_ids, **changes,
+                            on_result=done, on_error=self.failed.emit)
+
+    def export_csv(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Выгрузка товаров", "products.csv", "CSV (*.csv)")
+        if not path:
+            return
+        self.export_btn.setEnabled(False)
+        task = ExportTask(self.db_path, self.seller_id, path)
+        task.signals.progress.connect(lambda count: self.export_btn.setText(f"Выгружено: {count}..."))
+        task.signals.finished.connect(self.on_exported)
+        task.signals.failed.connect(self.on_export_failed)
+        self.export_signals = task.signals
+        QThreadPool.globalInstance().start(task)
+
+    def on_exported(self, count):
+        self.export_btn.setText("Выгрузить в CSV")
+        self.export_btn.setEnabled(True)
+        QMessageBox.information(self, "Успех", f"Выгружено товаров: {count}")
+
+    def on_export_failed(self, message):
+        self.export_btn.setText("Выгрузить в CSV")
+        self.export_btn.setEnabled(True)
+        QMessageBox.warning(self, "Ошибка", f"Не удалось выгрузить товары: {message}")
@@ -0,0 +1,162 @@
+import hashlib
+import os
+import threading
+
+from PyQt6.QtCore import Qt, QObject, QRunnable, QThreadPool, pyqtSignal
+from PyQt6.QtGui import QColor, QImage, QPixmap, QPixmapCache
+from PyQt6.QtWidgets import QLabel
+
+# Размеры уменьшенных копий: 100 - карточка каталога, 300 - страница товара
+THUMBNAIL_SIZES = (100, 300)
+# Бюджет QPixmapCache в килобайтах: вытесняются давно не показанные изображения
+MEMORY_BUDGET_KB = 64 * 1024
+
+
+class ThumbnailSignals(QObject):
+    loaded = pyqtSignal(str, int, QImage)
+
+
+class ThumbnailTask(QRunnable):
+    """Готовит уменьшенную копию в фоне: берет ее из дискового кэша или делает из оригинала"""
+
+    def __init__(self, cache, image_path, size):
+        super().__init__()
+        self.cache = cache
+        self.image_path = image_path
+        self.size = size
+        self.signals = cache.signals
+
+    def run(self):
+        image = QImage()
+        try:
+            digest = self.cache.digest(self.image_path)
+            thumbnail_path = self.cache.thumbnail_path(digest, self.size)
+            if os.path.exists(thumbnail_path):
+                image = QImage(thumbnail_path)
+            if image.isNull():
+                image = self.build_variants(digest)
+        except OSError:
+            pass
+        self.signals.loaded.emit(self.image_path, self.size, image)
+
+    def build_variants(self, digest):
+        """Декодирует оригинал один раз и сохраняет все размеры; возвращает нужный"""
+        original = QImage(self.image_path)
+        if original.isNull():
+            return original
+
+        result = QImage()
+        for size in THUMBNAIL_SIZES:
+            variant = original.scaled(size, size, Qt.AspectRatioMode.KeepAspectRatio,
+                                      Qt.TransformationMode.SmoothTransformation)
+            path = self.cache.thumbnail_path(digest, size)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Пишем во временный файл и переименовываем, чтобы не оставить недописанную копию
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            if variant.save(tmp_path, 'PNG'):
+                os.replace(tmp_path, path)
+            if size == self.size:
+                result = variant
+        return result
+
+
+class ThumbnailCache(QObject):
+    """Кэш уменьшенных изображений товаров.
+
+    Три уровня: QPixmapCache в памяти (LRU с бюджетом в байтах), файлы на диске,
+    названные по хэшу содержимого оригинала, и фоновое декодирование оригинала.
+    Пока изображение готовится, возвращается заглушка, а после готовности
+    испускается thumbnail_ready.
+    """
+
+    thumbnail_ready = pyqtSignal(str, int)
+
+    def __init__(self, cache_dir='data/thumbnails', memory_budget_kb=MEMORY_BUDGET_KB, parent=None):
+        super().__init__(parent)
+        self.cache_dir = cache_dir
+        QPixmapCache.setCacheLimit(memory_budget_kb)
+
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(2)
+        self.signals = ThumbnailSignals(self)
+        self.signals.loaded.connect(self.on_loaded)
+
+        self.pending = set()
+        self.missing = set()
+        self.placeholders = {}
+        # (путь, mtime, размер файла) -> хэш содержимого; заполняется рабочими потоками
+        self.digests = {}
+        self.digests_lock = threading.Lock()
+
+    def pixmap(self, image_path, size):
+        """Возвращает готовую копию, заглушку (копия готовится) или None (изображения нет)"""
+        if not image_path or image_path in self.missing:
+            return None
+
+        pixmap = QPixmapCache.find(self.key(image_path, size))
+        if pixmap is not None:
+            return pixmap
+
+        if (image_path, size) not in self.pending:
+            self.pending.add((image_path, size))
+            self.pool.start(ThumbnailTask(self, image_path, size))
+        return self.placeholder(size)
+
+    def on_loaded(self, image_path, size, image):
+        self.pending.discard((image_path, size))
+        if image.isNull():
+            self.missing.add(image_path)
+        else:
+            QPixmapCache.insert(self.key(image_path, size), QPixmap.fromImage(image))
+        self.thumbnail_ready.emit(image_path, size)
+
+    def placeholder(self, size):
+        if size not in self.placeholders:
+            pixmap = QPixmap(size, size)
+            pixmap.fill(QColor(230, 230, 230))
+            self.placeholders[size] = pixmap
+        return self.placeholders[size]
+
+    def digest(self, image_path):
+        """Хэш содержимого файла; пересчитывается, только если файл изменился"""
+        stat = os.stat(image_path)
+        file_key = (image_path, stat.st_mtime_ns, stat.st_size)
+        with self.digests_lock:
+            digest = self.digests.get(file_key)
+        if digest is None:
+            sha = hashlib.sha256()
+            with open(image_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    sha.update(chunk)
+            digest = sha.hexdigest()
+            with self.digests_lock:
+                self.digests[file_key] = digest
+        return digest
+
+    def thumbnail_path(self, digest, size):
+        return os.path.join(self.cache_dir, str(size), digest[:2], f"{digest}.png")
+
+    def key(self, image_path, size):
+        return f"thumb:{size}:{image_path}"
+
+
+class ThumbnailLabel(QLabel):
+    """QLabel с изображением товара, который сам подменяет заглушку готовой копией"""
+
+    def __init__(self, thumbnails, image_path, size, parent=None):
+        super().__init__(parent)
+        self.thumbnails = thumbnails
+        self.image_path = image_path
+        self.thumbnail_size = size
+        thumbnails.thumbnail_ready.connect(self.on_thumbnail_ready)
+        self.refresh()
+
+    def refresh(self):
+        pixmap = self.thumbnails.pixmap(self.image_path, self.thumbnail_size)
+        self.setVisible(pixmap is not None)
+        if pixmap is not None:
+            self.setPixmap(pixmap)
+
+    def on_thumbnail_ready(self, image_path, size):
+        if image_path == self.image_path and size == self.thumbnail_size:
+            self.refresh()